@@ -0,0 +1 @@
+"""Icon mapping and navigation scripts - importable as the Changes package, runnable as scripts"""
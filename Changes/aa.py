@@ -5,27 +5,47 @@ Mapuje zasoby z azure_resources_formatted.json na ikony z folderów
 Dodaje pole 'icon' do każdego zasobu w JSON
 """
 
+import argparse
+import hashlib
 import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from difflib import SequenceMatcher
-from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 import logging
 
+if __package__:
+    from .icon_catalog import IconCatalog, IconFile, icon_service_name, normalizer_signature
+    from .icon_similarity import NgramSimilarity, char_ngrams, np, quick_ratio_bounds, substring_incidence
+else:
+    # Uruchomione jako skrypt (python aa.py) - katalog skryptu jest już na sys.path
+    from icon_catalog import IconCatalog, IconFile, icon_service_name, normalizer_signature
+    from icon_similarity import NgramSimilarity, char_ngrams, np, quick_ratio_bounds, substring_incidence
+
 # Konfiguracja logowania
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
-class IconFile:
-    filename: str
-    full_path: str
-    relative_path: str  # ścieżka relatywna od folderu icons
-    folder_category: str
-    normalized_name: str
-    service_keywords: List[str]
+# Podbij przy zmianie formatu pliku cache wyników
+MAPPING_CACHE_VERSION = 1
+
+# Zakres ikon, od którego zależy wynik dopasowania rozmytego - cały katalog
+ALL_ICONS_SCOPE = '*'
+
+# Ile najlepszych wg TF-IDF ikon liczyć dokładnie przed przeglądem wg górnego ograniczenia
+FUZZY_SEEDS = 8
+# Waga SequenceMatcher w fuzzy_score - ikona bez wspólnego słowa kluczowego nie przekroczy tego wyniku
+FUZZY_TEXT_WEIGHT = 0.3
+# Zapas na różnice zaokrągleń między numpy a wynikiem liczonym w Pythonie
+FUZZY_BOUND_EPSILON = 1e-9
+
+
+def fingerprint(value) -> str:
+    """Krótki, stabilny skrót wartości JSON"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
 
 class AzureIconMapper:
     def __init__(self, json_path="azure_resources_formatted.json", icons_path="icons", output_path="azure_resources_with_icons.json"):
@@ -33,6 +53,13 @@ class AzureIconMapper:
         self.icons_path = Path(icons_path)
         self.output_path = Path(output_path)
         self.icons_cache = []
+        self.icon_catalog: Optional[IconCatalog] = None
+        self.cache_path = self.output_path.with_name('.icon_mapping_cache.json')
+        
+        # Plany wyszukiwania rozmytego (prepare_fuzzy_plans) i silnik TF-IDF dla bieżącego zestawu ikon
+        self.fuzzy_plans: Dict[str, Tuple[List[int], List[int], List[float]]] = {}
+        self._similarity: Optional[NgramSimilarity] = None
+        self._similarity_documents: Optional[List[str]] = None
         
         # Specjalne mapowania dla dokładnych dopasowań
         self.exact_mappings = {
@@ -97,6 +124,12 @@ class AzureIconMapper:
             'azurerm_management_group': 'general/',
         }
         
+    def __getstate__(self):
+        # Do procesów roboczych bez silnika TF-IDF i planów - każdy proces liczy je dla swojej paczki
+        state = self.__dict__.copy()
+        state.update(fuzzy_plans={}, _similarity=None, _similarity_documents=None)
+        return state
+    
     def normalize_name(self, name: str) -> str:
         """Normalizuje nazwę do porównywania"""
         if not name:
@@ -119,13 +152,7 @@ class AzureIconMapper:
     def extract_service_name_from_icon(self, filename: str) -> str:
         """Wyciąga nazwę usługi z nazwy pliku ikony"""
         # Format: NUMER-icon-service-NAZWA-USLUGI.svg
-        match = re.match(r'^\d+-icon-service-(.+)\.svg$', filename, re.IGNORECASE)
-        if match:
-            service_part = match.group(1)
-            # Zamień myślniki na spacje i normalizuj
-            service_name = service_part.replace('-', ' ')
-            return self.normalize_name(service_name)
-        return self.normalize_name(filename.replace('.svg', ''))
+        return self.normalize_name(icon_service_name(filename))
     
     def extract_keywords_from_resource_name(self, resource_name: str) -> List[str]:
         """Wyciąga kluczowe słowa z nazwy zasobu Terraform"""
@@ -135,40 +162,22 @@ class AzureIconMapper:
         # Dodaj też oryginalne słowa przed normalizacją
         original_words = resource_name.replace('azurerm_', '').split('_')
         
-        all_words = list(set(words + original_words))
+        # Kolejność pierwszego wystąpienia - set() dawał kolejność zależną od PYTHONHASHSEED,
+        # więc tekst do SequenceMatcher (i confidence) różnił się między procesami
+        all_words = list(dict.fromkeys(words + original_words))
         
         # Usuń bardzo krótkie słowa i popularne stopwords
         filtered_words = [w for w in all_words if len(w) > 2 and w not in ['the', 'and', 'for', 'with']]
         
         return filtered_words
     
-    def scan_icons(self) -> List[IconFile]:
-        """Skanuje wszystkie ikony i tworzy cache"""
+    def scan_icons(self, manifest_path=None, save_manifest: bool = True) -> List[IconFile]:
+        """Skanuje wszystkie ikony i tworzy cache (niezmienione pliki z manifestu IconCatalog)"""
         logger.info("Skanowanie ikon...")
-        icons = []
-        
-        for folder in self.icons_path.iterdir():
-            if not folder.is_dir():
-                continue
-                
-            folder_name = folder.name
-            logger.info(f"Skanowanie folderu: {folder_name}")
-            
-            for svg_file in folder.glob("*.svg"):
-                relative_path = f"{folder_name}/{svg_file.name}"
-                
-                icon = IconFile(
-                    filename=svg_file.name,
-                    full_path=str(svg_file.absolute()),
-                    relative_path=relative_path,
-                    folder_category=folder_name,
-                    normalized_name=self.extract_service_name_from_icon(svg_file.name),
-                    service_keywords=self.extract_service_name_from_icon(svg_file.name).split()
-                )
-                icons.append(icon)
-        
-        logger.info(f"Znaleziono {len(icons)} ikon")
-        return icons
+        self.icon_catalog = IconCatalog(
+            self.icons_path, self.normalize_name, name='mapper', manifest_path=manifest_path
+        ).scan(save_manifest=save_manifest)
+        return self.icon_catalog.icons
     
     def calculate_similarity(self, str1: str, str2: str) -> float:
         """Oblicza podobieństwo między stringami (0-1)"""
@@ -183,9 +192,9 @@ class AzureIconMapper:
             
             # Jeśli to pełna ścieżka do pliku
             if mapping.endswith('.svg'):
-                for icon in self.icons_cache:
-                    if icon.relative_path == mapping:
-                        return icon
+                icon = self.icon_catalog.get(mapping)
+                if icon:
+                    return icon
             
             # Jeśli to tylko folder - szukaj najlepszego dopasowania w tym folderze
             else:
@@ -195,29 +204,97 @@ class AzureIconMapper:
                 best_match = None
                 best_score = 0
                 
-                for icon in self.icons_cache:
-                    if icon.folder_category == folder_name:
-                        # Sprawdź podobieństwo na poziomie słów kluczowych
-                        score = 0
-                        for keyword in resource_keywords:
-                            if keyword in icon.normalized_name:
-                                score += 1
-                        
-                        # Dodaj podobieństwo tekstowe
-                        text_similarity = self.calculate_similarity(
-                            ' '.join(resource_keywords), 
-                            icon.normalized_name
-                        )
-                        score += text_similarity
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_match = icon
+                for icon in self.icon_catalog.in_folder(folder_name):
+                    # Sprawdź podobieństwo na poziomie słów kluczowych
+                    score = 0
+                    for keyword in resource_keywords:
+                        if keyword in icon.normalized_name:
+                            score += 1
+                    
+                    # Dodaj podobieństwo tekstowe
+                    text_similarity = self.calculate_similarity(
+                        ' '.join(resource_keywords), 
+                        icon.normalized_name
+                    )
+                    score += text_similarity
+                    
+                    if score > best_score:
+                        best_score = score
+                        best_match = icon
                 
                 return best_match
         
         return None
     
+    def fuzzy_score(self, resource_keywords: List[str], resource_text: str, icon: IconFile) -> float:
+        """Kombinowany wynik wyszukiwania rozmytego dla jednej ikony"""
+        # Metoda 1: Keyword matching
+        keyword_matches = 0
+        for keyword in resource_keywords:
+            if keyword in icon.normalized_name:
+                keyword_matches += 1
+        
+        keyword_score = keyword_matches / max(len(resource_keywords), 1)
+        
+        # Metoda 2: Text similarity
+        text_score = self.calculate_similarity(resource_text, icon.normalized_name)
+        
+        # Metoda 3: Sprawdź czy nazwa zasobu jest w nazwie ikony
+        partial_score = 0
+        for keyword in resource_keywords:
+            if len(keyword) > 3:  # tylko dłuższe słowa
+                if keyword in icon.normalized_name:
+                    partial_score += 0.3
+        
+        # Kombinowany wynik
+        return (keyword_score * 0.5) + (text_score * FUZZY_TEXT_WEIGHT) + (partial_score * 0.2)
+    
+    def fuzzy_candidates(self, resource_keywords: List[str]) -> List[int]:
+        """Pozycje ikon, w których nazwie występuje któreś ze słów kluczowych (indeks tokenów katalogu)"""
+        if self.icon_catalog is None or self.icon_catalog.icons is not self.icons_cache \
+                or any(not keyword or keyword.split() != [keyword] for keyword in resource_keywords):
+            return []
+        return self.icon_catalog.candidate_positions(resource_keywords, substring=True)
+    
+    def prepare_fuzzy_plans(self, resource_names: List[str]) -> None:
+        """Plany wyszukiwania rozmytego dla wielu zasobów naraz (numpy)
+        
+        Część słów kluczowych wyniku liczona dokładnie macierzowo, SequenceMatcher ograniczony z góry przez
+        quick_ratio - ikony, które nie mogą wygrać, w ogóle nie są liczone. Kandydaci startowi z TF-IDF
+        n-gramów szybko podnoszą próg odcięcia. Wynik identyczny z pełnym przeglądem wszystkich ikon.
+        """
+        self.fuzzy_plans = {}
+        if np is None or not self.icons_cache or not resource_names:
+            return
+        
+        documents = [icon.normalized_name for icon in self.icons_cache]
+        if self._similarity is None or self._similarity_documents != documents:
+            self._similarity = NgramSimilarity(documents)
+            self._similarity_documents = documents
+        
+        keywords = [self.extract_keywords_from_resource_name(name) for name in resource_names]
+        texts = [' '.join(resource_keywords) for resource_keywords in keywords]
+        terms = sorted({keyword for resource_keywords in keywords for keyword in resource_keywords})
+        term_index = {term: index for index, term in enumerate(terms)}
+        incidence = substring_incidence(terms, documents)
+        long_terms = np.array([len(term) > 3 for term in terms], dtype=bool)
+        
+        ratio_bounds = quick_ratio_bounds([text.lower() for text in texts], [document.lower() for document in documents])
+        cosine = self._similarity.scores(texts)
+        
+        for row, name in enumerate(resource_names):
+            ids = [term_index[keyword] for keyword in keywords[row]]
+            rows = incidence[ids]
+            exact_part = (rows.sum(axis=0) / max(len(ids), 1)) * 0.5 + rows[long_terms[ids]].sum(axis=0) * 0.3 * 0.2
+            upper = exact_part + FUZZY_TEXT_WEIGHT * ratio_bounds[row] + FUZZY_BOUND_EPSILON
+            # Najlepszy wynik >= max(exact_part); poniżej 0.1 i tak brak dopasowania
+            threshold = max(float(exact_part.max()) - FUZZY_BOUND_EPSILON, 0.1 - FUZZY_BOUND_EPSILON)
+            keep = np.flatnonzero(upper >= threshold)
+            order = keep[np.argsort(-upper[keep], kind='stable')]
+            estimate = exact_part[keep] + 0.3 * cosine[row, keep]
+            seeds = keep[np.argsort(-estimate, kind='stable')[:FUZZY_SEEDS]]
+            self.fuzzy_plans[name] = (seeds.tolist(), order.tolist(), upper[order].tolist())
+    
     def find_icon_by_fuzzy_search(self, resource_name: str) -> Optional[Tuple[IconFile, float]]:
         """Szuka ikony przez wyszukiwanie rozmyte"""
         resource_keywords = self.extract_keywords_from_resource_name(resource_name)
@@ -226,31 +303,58 @@ class AzureIconMapper:
         best_match = None
         best_score = 0
         
-        for icon in self.icons_cache:
-            # Metoda 1: Keyword matching
-            keyword_matches = 0
-            for keyword in resource_keywords:
-                if keyword in icon.normalized_name:
-                    keyword_matches += 1
-            
-            keyword_score = keyword_matches / max(len(resource_keywords), 1)
-            
-            # Metoda 2: Text similarity
-            text_score = self.calculate_similarity(resource_text, icon.normalized_name)
-            
-            # Metoda 3: Sprawdź czy nazwa zasobu jest w nazwie ikony
-            partial_score = 0
-            for keyword in resource_keywords:
-                if len(keyword) > 3:  # tylko dłuższe słowa
-                    if keyword in icon.normalized_name:
-                        partial_score += 0.3
-            
-            # Kombinowany wynik
-            combined_score = (keyword_score * 0.5) + (text_score * 0.3) + (partial_score * 0.2)
-            
-            if combined_score > best_score:
-                best_score = combined_score
-                best_match = icon
+        plan = self.fuzzy_plans.get(resource_name)
+        candidates = self.fuzzy_candidates(resource_keywords) if plan is None else None
+        if plan is None and not candidates:
+            for icon in self.icons_cache:
+                combined_score = self.fuzzy_score(resource_keywords, resource_text, icon)
+                if combined_score > best_score:
+                    best_score = combined_score
+                    best_match = icon
+        elif plan is None:
+            # Najpierw ikony ze wspólnym słowem kluczowym (indeks tokenów); pozostałe dostają tylko
+            # 0.3 * SequenceMatcher, więc liczymy je jedynie gdy quick_ratio pozwala dogonić najlepszy wynik
+            best_index = None
+            for index in candidates:
+                combined_score = self.fuzzy_score(resource_keywords, resource_text, self.icons_cache[index])
+                if combined_score > best_score:
+                    best_score = combined_score
+                    best_index = index
+            if best_score <= FUZZY_TEXT_WEIGHT:
+                matcher = SequenceMatcher(None, '', resource_text.lower())
+                candidate_set = set(candidates)
+                for index, icon in enumerate(self.icons_cache):
+                    if index in candidate_set:
+                        continue
+                    matcher.set_seq1(icon.normalized_name.lower())
+                    if FUZZY_TEXT_WEIGHT * matcher.real_quick_ratio() < best_score \
+                            or FUZZY_TEXT_WEIGHT * matcher.quick_ratio() < best_score:
+                        continue
+                    combined_score = self.fuzzy_score(resource_keywords, resource_text, icon)
+                    if combined_score > best_score or (combined_score == best_score and best_index is not None
+                                                       and index < best_index):
+                        best_score = combined_score
+                        best_index = index
+            if best_index is not None:
+                best_match = self.icons_cache[best_index]
+        else:
+            # Jak pełna pętla: najwyższy wynik, przy remisie ikona wcześniejsza w katalogu
+            seeds, order, bounds = plan
+            best_index = None
+            scored = set()
+            candidates = [(index, None) for index in seeds] + list(zip(order, bounds))
+            for index, bound in candidates:
+                if bound is not None and bound < best_score:
+                    break
+                if index in scored:
+                    continue
+                scored.add(index)
+                combined_score = self.fuzzy_score(resource_keywords, resource_text, self.icons_cache[index])
+                if combined_score > best_score or (combined_score == best_score and best_index is not None
+                                                   and index < best_index):
+                    best_score = combined_score
+                    best_index = index
+                    best_match = self.icons_cache[index]
         
         return (best_match, best_score) if best_match and best_score > 0.1 else None
     
@@ -285,7 +389,114 @@ class AzureIconMapper:
             'method': 'no_match'
         }
     
-    def process_resources(self, use_sample=False) -> Dict:
+    def map_resources(self, resource_names: List[str], workers: int = 1) -> List[Dict[str, any]]:
+        """Wyniki find_icon_for_resource w kolejności resource_names, równolegle dla workers > 1"""
+        if workers <= 1 or len(resource_names) < 2:
+            self.prepare_fuzzy_plans(resource_names)
+            return [self.find_icon_for_resource(name) for name in resource_names]
+        
+        # Kilka paczek na proces - równoważy nierówny koszt zasobów
+        chunk_size = max(1, -(-len(resource_names) // (workers * 4)))
+        chunks = [resource_names[i:i + chunk_size] for i in range(0, len(resource_names), chunk_size)]
+        logger.info(f"Mapowanie równoległe: {workers} procesów, {len(chunks)} paczek po {chunk_size}")
+        
+        # Mapper (z katalogiem ikon) trafia do każdego procesu raz, przez initializer
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+            for chunk_results in executor.map(_map_chunk, chunks):
+                results.extend(chunk_results)
+        return results
+    
+    def code_fingerprint(self) -> str:
+        """Odcisk kodu dopasowania - zmiana algorytmu unieważnia cały cache"""
+        return fingerprint([
+            normalizer_signature(function) for function in (
+                self.normalize_name, self.extract_keywords_from_resource_name, self.calculate_similarity,
+                self.find_icon_by_exact_mapping, self.fuzzy_score, self.fuzzy_candidates,
+                self.prepare_fuzzy_plans, self.find_icon_by_fuzzy_search, self.find_icon_for_resource,
+                # Plany rozmyte (prepare_fuzzy_plans) wybierają kandydatów przez TF-IDF i ograniczenia quick_ratio
+                char_ngrams, NgramSimilarity.__init__, NgramSimilarity._encode, NgramSimilarity.transform,
+                NgramSimilarity.scores, substring_incidence, quick_ratio_bounds
+            )
+        ] + [FUZZY_TEXT_WEIGHT, FUZZY_BOUND_EPSILON])
+    
+    def mapping_fingerprint(self, resource_name: str) -> str:
+        """Tylko wpisy mapowań, które dotyczą tego zasobu"""
+        return fingerprint([self.exact_mappings.get(resource_name)])
+    
+    def icon_scopes(self, resource_name: str, icon_info: Dict[str, any]) -> List[str]:
+        """Zakresy katalogu ikon, które sprawdziło dopasowanie (folder:... albo cały katalog)"""
+        if icon_info['method'] in ('fuzzy_search', 'no_match'):
+            return [ALL_ICONS_SCOPE]
+        scopes = []
+        mapping = self.exact_mappings.get(resource_name)
+        if mapping:
+            scopes.append(f"folder:{mapping.split('/')[0]}")
+        return scopes
+    
+    def scope_fingerprints(self) -> Dict[str, str]:
+        """Skróty folderów katalogu ikon + skrót całości"""
+        by_folder = {
+            f'folder:{folder}': fingerprint([[icon.relative_path, icon.normalized_name] for icon in icons])
+            for folder, icons in self.icon_catalog.by_folder.items()
+        }
+        return {**by_folder, ALL_ICONS_SCOPE: fingerprint(sorted(by_folder.items()))}
+    
+    def load_mapping_cache(self, code: str) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get('version') != MAPPING_CACHE_VERSION or cache.get('code') != code:
+            return {}
+        return cache.get('entries', {})
+    
+    def save_mapping_cache(self, code: str, entries: Dict[str, Dict]) -> None:
+        # Zapis atomowy; brak uprawnień do katalogu nie jest błędem
+        tmp_path = self.cache_path.with_name(f'{self.cache_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': MAPPING_CACHE_VERSION, 'code': code, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać cache mapowania: {e}")
+    
+    def map_resources_incremental(self, resource_names: List[str], workers: int = 1) -> List[Dict[str, any]]:
+        """map_resources z trwałym cache - liczone są tylko wpisy, których zależności się zmieniły"""
+        code = self.code_fingerprint()
+        entries = self.load_mapping_cache(code)
+        scopes = self.scope_fingerprints()
+        
+        def is_valid(name, entry):
+            return (entry is not None
+                    and entry['mapping'] == self.mapping_fingerprint(name)
+                    and all(scopes.get(scope) == digest for scope, digest in entry['scopes'].items()))
+        
+        results = {}
+        stale = []
+        for name in resource_names:
+            entry = entries.get(name)
+            if is_valid(name, entry):
+                results[name] = entry['result']
+            else:
+                stale.append(name)
+        
+        logger.info(f"Cache mapowania: {len(results)} aktualnych, {len(stale)} do przeliczenia")
+        
+        if stale:
+            for name, icon_info in zip(stale, self.map_resources(stale, workers=workers)):
+                results[name] = icon_info
+                entries[name] = {
+                    'mapping': self.mapping_fingerprint(name),
+                    'scopes': {scope: scopes.get(scope) for scope in self.icon_scopes(name, icon_info)},
+                    'result': icon_info
+                }
+            self.save_mapping_cache(code, entries)
+        
+        return [results[name] for name in resource_names]
+    
+    def process_resources(self, use_sample=False, workers: int = 1, use_cache: bool = True) -> Dict:
         """Przetwarza zasoby i dodaje ikony"""
         # Wybierz plik do przetwarzania
         input_file = "sample_azure_resources.json" if use_sample else self.json_path
@@ -316,10 +527,14 @@ class AzureIconMapper:
             'fuzzy_mappings': 0
         }
         
+        # Mapowanie (szeregowe lub w puli procesów) - scalanie zawsze w kolejności z JSON
+        if use_cache:
+            icon_infos = self.map_resources_incremental(list(resources), workers=workers)
+        else:
+            icon_infos = self.map_resources(list(resources), workers=workers)
+        
         # Przetwarzanie każdego zasobu
-        for resource_name, resource_data in resources.items():
-            icon_info = self.find_icon_for_resource(resource_name)
-            
+        for (resource_name, resource_data), icon_info in zip(resources.items(), icon_infos):
             # Dodaj informacje o ikonie do zasobu
             resource_data['icon'] = {
                 'path': icon_info['icon_path'],
@@ -413,7 +628,7 @@ class AzureIconMapper:
         
         logger.info(f"Wygenerowano raport: {output_file}")
     
-    def run(self, use_sample=False):
+    def run(self, use_sample=False, workers: int = 1, use_cache: bool = True):
         """Główna funkcja uruchamiająca mapowanie"""
         logger.info("=== ROZPOCZYNANIE MAPOWANIA IKON ===")
         
@@ -424,7 +639,7 @@ class AzureIconMapper:
             return
         
         # Przetwórz zasoby
-        processed_data = self.process_resources(use_sample=use_sample)
+        processed_data = self.process_resources(use_sample=use_sample, workers=workers, use_cache=use_cache)
         if not processed_data:
             logger.error("Nie udało się przetworzyć zasobów!")
             return
@@ -442,8 +657,30 @@ class AzureIconMapper:
         
         return output_file
 
+# Mapper procesu roboczego - ustawiany raz przez initializer puli
+_worker_mapper: Optional[AzureIconMapper] = None
+
+
+def _init_worker(mapper: AzureIconMapper):
+    global _worker_mapper
+    _worker_mapper = mapper
+
+
+def _map_chunk(resource_names: List[str]) -> List[Dict[str, any]]:
+    _worker_mapper.prepare_fuzzy_plans(resource_names)
+    return [_worker_mapper.find_icon_for_resource(name) for name in resource_names]
+
+
 def main():
     """Główna funkcja"""
+    parser = argparse.ArgumentParser(description="Azure Icon Mapper")
+    # Domyślnie szeregowo - przy ~1 s pracy start procesów i kopiowanie mappera zjadają zysk
+    parser.add_argument('--workers', type=int, default=1,
+                        help="liczba procesów do mapowania (domyślnie 1 = szeregowo)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="przelicz wszystkie mapowania, bez cache wyników")
+    args = parser.parse_args()
+    
     mapper = AzureIconMapper()
     
     # Sprawdź czy pliki istnieją
@@ -463,10 +700,10 @@ def main():
     
     if choice == "1":
         logger.info("Uruchamianie testu na próbce...")
-        result = mapper.run(use_sample=True)
+        result = mapper.run(use_sample=True, workers=args.workers, use_cache=not args.no_cache)
     elif choice == "2":
         logger.info("Uruchamianie pełnego mapowania...")
-        result = mapper.run(use_sample=False)
+        result = mapper.run(use_sample=False, workers=args.workers, use_cache=not args.no_cache)
     else:
         print("Nieprawidłowy wybór")
         return
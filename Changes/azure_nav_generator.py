@@ -15,17 +15,16 @@ from dataclasses import dataclass
 from typing import List, Dict, Optional
 import logging
 
+if __package__:
+    from .icon_catalog import IconCatalog, IconFile, icon_service_name
+else:
+    # Uruchomione jako skrypt (python azure_nav_generator.py) - katalog skryptu jest już na sys.path
+    from icon_catalog import IconCatalog, IconFile, icon_service_name
+
 # Konfiguracja logowania
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
-class IconFile:
-    filename: str
-    relative_path: str
-    folder_category: str
-    normalized_name: str
-
 @dataclass
 class AzureService:
     resource_type: str
@@ -39,6 +38,7 @@ class AzureNavigationGenerator:
         self.icons_path = Path(icons_path)
         self.output_path = Path(output_path)
         self.icons_cache = []
+        self.icon_catalog: Optional[IconCatalog] = None
         
     def normalize_name(self, name: str) -> str:
         """Normalizuje nazwę do porównywania"""
@@ -59,42 +59,13 @@ class AzureNavigationGenerator:
     def extract_service_name_from_icon(self, filename: str) -> str:
         """Wyciąga nazwę usługi z nazwy pliku ikony"""
         # Format: NUMER-icon-service-NAZWA-USLUGI.svg
-        match = re.match(r'^\d+-icon-service-(.+)\.svg$', filename, re.IGNORECASE)
-        if match:
-            service_part = match.group(1)
-            # Zamień myślniki na spacje i normalizuj
-            service_name = service_part.replace('-', ' ')
-            return self.normalize_name(service_name)
-        return self.normalize_name(filename.replace('.svg', ''))
+        return self.normalize_name(icon_service_name(filename))
     
     def scan_icons(self) -> List[IconFile]:
-        """Skanuje wszystkie ikony"""
+        """Skanuje wszystkie ikony (niezmienione pliki z manifestu IconCatalog)"""
         logger.info("Skanowanie ikon...")
-        icons = []
-        
-        if not self.icons_path.exists():
-            logger.error(f"Folder ikon nie istnieje: {self.icons_path}")
-            return icons
-        
-        for folder in self.icons_path.iterdir():
-            if not folder.is_dir():
-                continue
-                
-            folder_name = folder.name
-            
-            for svg_file in folder.glob("*.svg"):
-                relative_path = f"{folder_name}/{svg_file.name}"
-                
-                icon = IconFile(
-                    filename=svg_file.name,
-                    relative_path=relative_path,
-                    folder_category=folder_name,
-                    normalized_name=self.extract_service_name_from_icon(svg_file.name)
-                )
-                icons.append(icon)
-        
-        logger.info(f"Znaleziono {len(icons)} ikon w {len(set(icon.folder_category for icon in icons))} folderach")
-        return icons
+        self.icon_catalog = IconCatalog(self.icons_path, self.normalize_name, name='navigation').scan()
+        return self.icon_catalog.icons
     
     def load_services_from_csv(self) -> List[AzureService]:
         """Ładuje usługi z CSV i grupuje je"""
@@ -164,8 +135,12 @@ class AzureNavigationGenerator:
         best_score = 0.0
         best_method = ""
         
-        # Metoda 1: Exact match w nazwie ikony
-        for icon in self.icons_cache:
+        # Indeks tokenów katalogu: ikony, w których nazwie występuje któreś słowo usługi
+        service_words = service_normalized.split()
+        candidates = self.icon_catalog.candidates(service_words, substring=True) if self.icon_catalog else []
+        
+        # Metoda 1: Exact match w nazwie ikony - fraza zawiera słowo usługi, więc tylko kandydaci
+        for icon in candidates or self.icons_cache:
             if service_normalized in icon.normalized_name:
                 score = self.calculate_similarity(service_normalized, icon.normalized_name)
                 if score > best_score:
@@ -175,7 +150,13 @@ class AzureNavigationGenerator:
         
         # Metoda 2: Fuzzy match z wysokim progiem
         if best_score < 0.8:
+            # Jak difflib.get_close_matches: tanie górne ograniczenia ratio() odrzucają większość ikon
+            matcher = SequenceMatcher(None, '', service_normalized.lower())
             for icon in self.icons_cache:
+                threshold = max(best_score, 0.6)
+                matcher.set_seq1(icon.normalized_name.lower())
+                if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                    continue
                 score = self.calculate_similarity(service_normalized, icon.normalized_name)
                 if score > best_score and score > 0.6:
                     best_match = icon
@@ -184,8 +165,10 @@ class AzureNavigationGenerator:
         
         # Metoda 3: Keyword matching - szukaj kluczowych słów
         if best_score < 0.6:
-            service_words = set(service_normalized.split())
-            for icon in self.icons_cache:
+            service_words = set(service_words)
+            # Bez wspólnego słowa wynik 0 - wystarczą ikony z indeksu tokenów
+            keyword_candidates = self.icon_catalog.candidates(service_words) if self.icon_catalog else self.icons_cache
+            for icon in keyword_candidates:
                 if icon.normalized_name:
                     icon_words = set(icon.normalized_name.split())
                     common_words = service_words.intersection(icon_words)
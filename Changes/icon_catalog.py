@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Icon Catalog
+Wspólny skan folderu icons dla aa.py i azure_nav_generator.py
+Indeksy po ścieżce, folderze, znormalizowanej nazwie i tokenach nazwy + manifest skanu po mtime plików
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Podbij przy zmianie formatu manifestu
+MANIFEST_VERSION = 1
+
+ICON_FILENAME_RE = re.compile(r'^\d+-icon-service-(.+)\.svg$', re.IGNORECASE)
+
+
+@dataclass
+class IconFile:
+    filename: str
+    full_path: str
+    relative_path: str  # ścieżka relatywna od folderu icons
+    folder_category: str
+    normalized_name: str
+    service_keywords: List[str]
+
+
+def icon_service_name(filename: str) -> str:
+    """Surowa nazwa usługi z nazwy pliku: NUMER-icon-service-NAZWA-USLUGI.svg -> NAZWA USLUGI"""
+    match = ICON_FILENAME_RE.match(filename)
+    if match:
+        # Zamień myślniki na spacje
+        return match.group(1).replace('-', ' ')
+    return filename.replace('.svg', '')
+
+
+def normalizer_signature(normalize: Callable[[str], str]) -> str:
+    """Odcisk kodu funkcji normalizującej - zmiana normalizacji unieważnia manifest"""
+    function = getattr(normalize, '__func__', normalize)
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return getattr(function, '__qualname__', repr(function))
+    digest = hashlib.sha1()
+    _hash_code(digest, code)
+    return f'{function.__qualname__}:{digest.hexdigest()[:16]}'
+
+
+def _hash_code(digest, code) -> None:
+    # Zagnieżdżone code objects (listcomp, lambda) mają w repr adres pamięci - haszujemy je rekurencyjnie
+    digest.update(code.co_code)
+    # co_code trzyma tylko indeksy nazw - wywołanie innej funkcji czy atrybutu zmienia dopiero co_names
+    digest.update(repr((code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars)).encode('utf-8'))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _hash_code(digest, const)
+        else:
+            digest.update(repr(const).encode('utf-8'))
+
+
+class IconCatalog:
+    """Ikony z folderu icons z indeksami po ścieżce, folderze i znormalizowanej nazwie"""
+
+    def __init__(self, icons_path, normalize: Callable[[str], str], name: str = 'default', manifest_path=None):
+        self.icons_path = Path(icons_path)
+        self.normalize = normalize
+        self.signature = normalizer_signature(normalize)
+        # Osobny manifest per normalizacja - aa.py i nawigacja normalizują inaczej
+        self.manifest_path = Path(manifest_path) if manifest_path else self.icons_path.with_name(
+            f'.icon_manifest_{name}.json'
+        )
+
+        self.icons: List[IconFile] = []
+        self.by_path: Dict[str, IconFile] = {}
+        self.by_folder: Dict[str, List[IconFile]] = {}
+        self.by_name: Dict[str, List[IconFile]] = {}
+        # Indeks odwrotny: token znormalizowanej nazwy -> pozycje ikon w self.icons (rosnąco)
+        self.by_token: Dict[str, List[int]] = {}
+        self._containing: Dict[str, List[int]] = {}
+        self.stats = {'total': 0, 'reused': 0, 'processed': 0, 'removed': 0}
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('normalizer') != self.signature:
+            return {}
+        return manifest.get('files', {})
+
+    def _save_manifest(self, files: Dict[str, Dict]) -> None:
+        # Zapis atomowy; brak uprawnień do katalogu nie jest błędem
+        tmp_path = self.manifest_path.with_name(f'{self.manifest_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'normalizer': self.signature, 'files': files},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać manifestu ikon: {e}")
+
+    def scan(self, save_manifest: bool = True) -> 'IconCatalog':
+        """Skanuje ikony; pliki z niezmienionym mtime i rozmiarem biorą nazwę z manifestu
+
+        save_manifest=False tylko czyta manifest (np. w procesie serwera WWW).
+        """
+        previous = self._load_manifest()
+        files = {}
+        icons = []
+
+        if not self.icons_path.exists():
+            logger.error(f"Folder ikon nie istnieje: {self.icons_path}")
+        else:
+            # Ścieżka bezwzględna liczona raz - Path.absolute() per plik dominował czas skanu
+            root = str(self.icons_path.absolute())
+            with os.scandir(self.icons_path) as entries:
+                folders = [entry for entry in entries if entry.is_dir()]
+            # Stała kolejność (folder, plik) - wyniki nie zależą od kolejności w systemie plików
+            for folder in sorted(folders, key=lambda entry: entry.name):
+                with os.scandir(folder.path) as entries:
+                    svg_files = sorted(
+                        (entry for entry in entries if entry.name.endswith('.svg') and entry.is_file()),
+                        key=lambda entry: entry.name
+                    )
+                for svg_file in svg_files:
+                    relative_path = f"{folder.name}/{svg_file.name}"
+                    stat = svg_file.stat()
+                    entry = previous.get(relative_path)
+                    if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                        normalized_name = entry['normalized_name']
+                        self.stats['reused'] += 1
+                    else:
+                        normalized_name = self.normalize(icon_service_name(svg_file.name))
+                        self.stats['processed'] += 1
+                    files[relative_path] = {
+                        'mtime_ns': stat.st_mtime_ns,
+                        'size': stat.st_size,
+                        'normalized_name': normalized_name
+                    }
+                    icons.append(IconFile(
+                        filename=svg_file.name,
+                        full_path=os.path.join(root, folder.name, svg_file.name),
+                        relative_path=relative_path,
+                        folder_category=folder.name,
+                        normalized_name=normalized_name,
+                        service_keywords=normalized_name.split()
+                    ))
+
+        self.stats['removed'] = len(previous.keys() - files.keys())
+        self.stats['total'] = len(icons)
+        if save_manifest and (self.stats['processed'] or self.stats['removed'] or len(previous) != len(files)):
+            self._save_manifest(files)
+
+        self._index(icons)
+        logger.info(f"Znaleziono {len(icons)} ikon w {len(self.by_folder)} folderach "
+                    f"(przetworzone: {self.stats['processed']}, z manifestu: {self.stats['reused']})")
+        return self
+
+    def _index(self, icons: List[IconFile]) -> None:
+        by_folder = defaultdict(list)
+        by_name = defaultdict(list)
+        by_token = defaultdict(list)
+        for position, icon in enumerate(icons):
+            by_folder[icon.folder_category].append(icon)
+            by_name[icon.normalized_name].append(icon)
+            for token in dict.fromkeys(icon.service_keywords):
+                by_token[token].append(position)
+        self.icons = icons
+        self.by_path = {icon.relative_path: icon for icon in icons}
+        self.by_folder = dict(by_folder)
+        self.by_name = dict(by_name)
+        self.by_token = dict(by_token)
+        self._containing = {}
+
+    def get(self, relative_path: str) -> Optional[IconFile]:
+        return self.by_path.get(relative_path)
+
+    def in_folder(self, folder: str) -> List[IconFile]:
+        return self.by_folder.get(folder, [])
+
+    def with_name(self, normalized_name: str) -> List[IconFile]:
+        return self.by_name.get(normalized_name, [])
+
+    def token_positions(self, token: str, substring: bool = False) -> List[int]:
+        """Pozycje ikon z tokenem; substring=True - token jako podciąg tokenu ikony"""
+        if not substring:
+            return self.by_token.get(token, [])
+        positions = self._containing.get(token)
+        if positions is None:
+            # Przegląd słownika tokenów (rzędu tysiąca), nie wszystkich ikon; wynik zapamiętany
+            positions = sorted({
+                position
+                for icon_token, token_positions in self.by_token.items() if token in icon_token
+                for position in token_positions
+            })
+            self._containing[token] = positions
+        return positions
+
+    def candidate_positions(self, tokens: Iterable[str], substring: bool = False) -> List[int]:
+        """Pozycje ikon mających co najmniej jeden token z tokens, w kolejności katalogu
+
+        substring=True odpowiada sprawdzeniu `token in icon.normalized_name` dla tokenów bez spacji -
+        nazwa to tokeny złączone spacją, więc taki token musi być podciągiem jednego z nich.
+        """
+        positions = set()
+        for token in tokens:
+            if token:
+                positions.update(self.token_positions(token, substring))
+        return sorted(positions)
+
+    def candidates(self, tokens: Iterable[str], substring: bool = False) -> List[IconFile]:
+        return [self.icons[position] for position in self.candidate_positions(tokens, substring)]
+
+    def __iter__(self) -> Iterator[IconFile]:
+        return iter(self.icons)
+
+    def __len__(self) -> int:
+        return len(self.icons)
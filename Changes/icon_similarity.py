@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Icon Similarity
+Wektory TF-IDF n-gramów znakowych dla nazw zasobów i ikon
+Wszystkie zapytania kontra wszystkie ikony jednym mnożeniem macierzy, top-k kandydatów na zapytanie
+"""
+
+import math
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+# Opcjonalne - bez numpy skrypty liczą dopasowania rozmyte po wszystkich ikonach
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NGRAM_RANGE = (2, 4)
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Counter:
+    """Licznik n-gramów znakowych; spacje na brzegach zaznaczają początek i koniec słowa"""
+    padded = f' {" ".join(text.lower().split())} '
+    grams = Counter()
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for start in range(len(padded) - n + 1):
+            grams[padded[start:start + n]] += 1
+    return grams
+
+
+class NgramSimilarity:
+    """TF-IDF nad n-gramami znakowymi dokumentów (nazw ikon), podobieństwo kosinusowe"""
+
+    def __init__(self, documents: Sequence[str], ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        if np is None:
+            raise RuntimeError('numpy is required for NgramSimilarity')
+        self.ngram_range = ngram_range
+        self.size = len(documents)
+
+        counts = [char_ngrams(document, ngram_range) for document in documents]
+        document_frequency = Counter()
+        for grams in counts:
+            document_frequency.update(grams.keys())
+
+        # Słownik tylko z n-gramów dokumentów - n-gram spoza niego i tak daje 0 w iloczynie
+        self.vocabulary: Dict[str, int] = {gram: index for index, gram in enumerate(sorted(document_frequency))}
+        self.idf = np.array(
+            [math.log((1 + self.size) / (1 + document_frequency[gram])) + 1 for gram in self.vocabulary],
+            dtype=np.float32
+        )
+        self.matrix = self._encode(counts)
+
+    def _encode(self, counts: List[Counter]):
+        """Wiersze L2-znormalizowane; dla zapytań norma liczy też n-gramy spoza słownika (idf jak dla df=0)"""
+        rows, columns, weights = [], [], []
+        unseen = np.zeros(len(counts), dtype=np.float32)
+        unseen_idf = math.log(1 + self.size) + 1
+        for row, grams in enumerate(counts):
+            for gram, count in grams.items():
+                column = self.vocabulary.get(gram)
+                if column is None:
+                    unseen[row] += ((1 + math.log(count)) * unseen_idf) ** 2
+                else:
+                    rows.append(row)
+                    columns.append(column)
+                    weights.append(1 + math.log(count))
+
+        # Jedno przypisanie dla całej macierzy zamiast zapisu element po elemencie
+        matrix = np.zeros((len(counts), len(self.vocabulary)), dtype=np.float32)
+        columns = np.asarray(columns, dtype=np.intp)
+        matrix[np.asarray(rows, dtype=np.intp), columns] = np.asarray(weights, dtype=np.float32) * self.idf[columns]
+        norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix) + unseen)
+        norms[norms == 0] = 1
+        matrix /= norms[:, None]
+        return matrix
+
+    def transform(self, queries: Sequence[str]):
+        return self._encode([char_ngrams(query, self.ngram_range) for query in queries])
+
+    def scores(self, queries: Sequence[str]):
+        """Macierz podobieństw queries x documents"""
+        encoded = self.transform(queries)
+        # Tylko kolumny, które występują w zapytaniach - reszta słownika nie wnosi nic do iloczynu
+        used = np.flatnonzero(encoded.any(axis=0))
+        return encoded[:, used] @ self.matrix[:, used].T
+
+
+def substring_incidence(terms: Sequence[str], documents: Sequence[str]):
+    """Macierz bool terms x documents: czy term występuje w dokumencie jako podciąg (jak `term in doc`)"""
+    incidence = np.zeros((len(terms), len(documents)), dtype=bool)
+    # Jeden napis ze wszystkimi dokumentami - str.find zamiast terms x documents operacji `in`
+    starts = []
+    offset = 0
+    for document in documents:
+        starts.append(offset)
+        offset += len(document) + 1
+    haystack = '\n'.join(documents)
+    for row, term in enumerate(terms):
+        if not term:
+            incidence[row] = True
+            continue
+        position = haystack.find(term)
+        while position != -1:
+            column = bisect_right(starts, position) - 1
+            incidence[row, column] = True
+            # Następny dokument - każdy liczony raz
+            next_start = starts[column + 1] if column + 1 < len(starts) else len(haystack)
+            position = haystack.find(term, next_start)
+    return incidence
+
+
+def quick_ratio_bounds(queries: Sequence[str], documents: Sequence[str], batch_size: int = 64):
+    """Górne ograniczenie SequenceMatcher(None, q, d).ratio() dla wszystkich par (quick_ratio, wektorowo)
+
+    ratio() <= quick_ratio() = 2 * |wspólny multizbiór znaków| / (len(q) + len(d))
+    """
+    alphabet = {char: index for index, char in enumerate(sorted(set(''.join(queries)) | set(''.join(documents))))}
+
+    def char_counts(texts):
+        counts = np.zeros((len(texts), max(len(alphabet), 1)), dtype=np.int16)
+        for row, text in enumerate(texts):
+            for char, count in Counter(text).items():
+                counts[row, alphabet[char]] = count
+        return counts
+
+    query_counts = char_counts(queries)
+    document_counts = char_counts(documents)
+    query_lengths = query_counts.sum(axis=1, dtype=np.float64)
+    document_lengths = document_counts.sum(axis=1, dtype=np.float64)
+
+    bounds = np.zeros((len(queries), len(documents)), dtype=np.float64)
+    for start in range(0, len(queries), batch_size):
+        chunk = query_counts[start:start + batch_size]
+        common = np.minimum(chunk[:, None, :], document_counts[None, :, :]).sum(axis=2, dtype=np.float64)
+        total = query_lengths[start:start + batch_size, None] + document_lengths[None, :]
+        np.divide(2.0 * common, total, out=bounds[start:start + batch_size], where=total > 0)
+    return bounds
@@ -0,0 +1,133 @@
+"""
+Async GitHub client and catalog crawl for ASGI deployments
+httpx.AsyncClient when installed, otherwise the blocking requests session runs in worker threads
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from .github_terraform_fetcher import ANONYMOUS_SERVICE_LIMIT, RateLimitExhausted, TerraformResourceFetcher
+from .metrics import phase
+
+# Opcjonalne - bez httpx requesty idą przez requests w puli wątków (nadal bez blokowania pętli)
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+TRANSPORT_ERRORS: Tuple[type, ...] = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+class AsyncGitHubClient:
+    """GET do GitHub API bez blokowania pętli zdarzeń; odpowiedź ma status_code, headers i json()"""
+
+    def __init__(self, headers: Dict[str, str], max_connections: int = 8):
+        self.max_connections = max(max_connections, 1)
+        if httpx is not None:
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                limits=httpx.Limits(max_connections=self.max_connections),
+                follow_redirects=True
+            )
+            self._session = None
+        else:
+            self._client = None
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+            self._session.mount('https://', adapter)
+            self._session.headers.update(headers)
+
+    async def get(self, url: str, timeout: float):
+        if self._client is not None:
+            return await self._client.get(url, timeout=timeout)
+        return await asyncio.to_thread(self._session.get, url, timeout=timeout)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        else:
+            self._session.close()
+
+    async def __aenter__(self) -> 'AsyncGitHubClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class AsyncTerraformResourceFetcher:
+    """crawl_catalog TerraformResourceFetchera na korutynach - parsowanie, budżet i scalanie wspólne"""
+
+    def __init__(self, fetcher: Optional[TerraformResourceFetcher] = None):
+        self.fetcher = fetcher or TerraformResourceFetcher()
+
+    async def _request(self, client: AsyncGitHubClient, url: str, timeout: float):
+        await self.fetcher.budget.acquire_async()
+        with phase('fetch'):
+            response = await client.get(url, timeout=timeout)
+        self.fetcher.budget.update(response.headers)
+        return response
+
+    async def _get_all_service_directories(self, client: AsyncGitHubClient) -> List[Dict]:
+        url = f"{self.fetcher.base_url}/repos/{self.fetcher.repo}/contents/internal/services"
+        try:
+            response = await self._request(client, url, timeout=15)
+            if response.status_code != 200:
+                print(f"GitHub API returned {response.status_code}")
+                return []
+            return self.fetcher._parse_service_directories(response.json())
+        except TRANSPORT_ERRORS as e:
+            print(f"Error fetching service directories: {e}")
+            return []
+
+    async def _get_resources_from_service(self, client: AsyncGitHubClient, service_name: str) -> Optional[List[Dict]]:
+        url = f"{self.fetcher.base_url}/repos/{self.fetcher.repo}/contents/internal/services/{service_name}"
+        try:
+            response = await self._request(client, url, timeout=10)
+            if response.status_code != 200:
+                return None
+            return self.fetcher._parse_service_files(service_name, response.json())
+        except TRANSPORT_ERRORS:
+            return None
+
+    async def crawl_catalog(self, previous=None) -> Optional[Tuple[List[Dict], Dict]]:
+        """Jak TerraformResourceFetcher.crawl_catalog; listingi usług współbieżnie (max_workers naraz)"""
+        print("Fetching all Terraform resources from GitHub (async)...")
+        async with AsyncGitHubClient(self.fetcher.headers, self.fetcher.max_workers) as client:
+            service_dirs = await self._get_all_service_directories(client)
+            if not service_dirs:
+                print("No service directories found")
+                return None
+
+            changed_dirs = self.fetcher._changed_service_dirs(service_dirs, previous)
+            print(f"Found {len(service_dirs)} service directories, {len(changed_dirs)} changed")
+            if not self.fetcher.token:
+                changed_dirs = changed_dirs[:ANONYMOUS_SERVICE_LIMIT]
+
+            semaphore = asyncio.Semaphore(client.max_connections)
+
+            async def crawl(service_name: str):
+                async with semaphore:
+                    try:
+                        return service_name, await self._get_resources_from_service(client, service_name)
+                    except RateLimitExhausted:
+                        return service_name, None
+
+            results = dict(await asyncio.gather(*(crawl(service_dir['name']) for service_dir in changed_dirs)))
+
+        skipped = [name for name, resources in results.items() if resources is None]
+        if skipped:
+            print(f"Rate limit budget exhausted or request failed, skipped {len(skipped)} services")
+        return self.fetcher._merge_crawl(service_dirs, results, previous, listed=len(changed_dirs))
+
+
+def crawl_catalog_async(previous=None) -> Optional[Tuple[List[Dict], Dict]]:
+    """Synchroniczne wejście dla CatalogRefresher - własna pętla zdarzeń w wątku refreshera"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(AsyncTerraformResourceFetcher().crawl_catalog(previous))
+    # Wywołane z pętli zdarzeń (np. refresh() z widoku async) - asyncio.run niedozwolone
+    return TerraformResourceFetcher().crawl_catalog(previous)
@@ -0,0 +1,49 @@
+"""
+Async variants of the catalog, search and template views for ASGI deployments (BUILDER_ASYNC_VIEWS = True)
+Responses are identical to builder.views; nothing here blocks the event loop once the snapshot and index are built
+"""
+
+from django.http import JsonResponse
+
+from .catalog import get_catalog_snapshot_async
+from .search import get_search_index_async
+from .views import RESOURCE_TEMPLATES, _catalog_response, _flat_resources_page, _search_response
+
+
+async def get_resources(request):
+    """API endpoint zwracający hierarchiczne zasoby Azure"""
+    format_type = request.GET.get('format', 'hierarchical')  # hierarchical lub flat
+    
+    # Pierwszy request na proces buduje snapshot w wątku; pozostałe czekają na ten sam build
+    snapshot = await get_catalog_snapshot_async()
+    
+    if format_type != 'hierarchical' and any(param in request.GET for param in ('limit', 'cursor', 'fields')):
+        return _flat_resources_page(request, snapshot)
+    
+    return _catalog_response(request, snapshot.get(format_type))
+
+
+async def search_resources(request):
+    """Wyszukiwanie pełnotekstowe; zapytanie po gotowym indeksie w pamięci (milisekundy) idzie na pętli"""
+    return _search_response(request, await get_search_index_async())
+
+
+async def get_resource_categories(request):
+    """Same nagłówki kategorii z liczbą zasobów - bez zawartości"""
+    snapshot = await get_catalog_snapshot_async()
+    return _catalog_response(request, snapshot.entries['categories'])
+
+
+async def get_resource_category(request, name):
+    """Podkategorie jednej kategorii, pobierane przy rozwinięciu w sidebarze"""
+    snapshot = await get_catalog_snapshot_async()
+    entry = snapshot.get_category(name)
+    if entry is None:
+        return JsonResponse({'error': f'unknown category: {name}'}, status=404)
+    return _catalog_response(request, entry)
+
+
+async def get_resource_templates(request):
+    """Zwróć gotowe szablony infrastruktury"""
+    return JsonResponse({'templates': RESOURCE_TEMPLATES})
+
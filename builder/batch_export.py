@@ -0,0 +1,90 @@
+"""
+Batch Terraform export streamed as a zip archive
+Designs render one by one in the response iterator (rendering is CPU-bound, threads would only contend for the GIL),
+each main.tf is written to the response as soon as it is ready
+"""
+
+import re
+import time
+import zipfile
+from typing import Dict, Iterator, List, Tuple
+
+from .terraform_generator import InvalidDesign, TerraformGenerator, validate_design_resources
+
+DESIGN_NAME_RE = re.compile(r'[^a-zA-Z0-9._-]+')
+
+
+class _ZipStream:
+    """Write-only, non-seekable sink - zipfile falls back to data descriptors"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def validate_designs(designs) -> List[Tuple[str, List[Dict]]]:
+    """Check every design before streaming starts, return (archive_dir, resources) pairs"""
+    if not isinstance(designs, list) or not designs:
+        raise InvalidDesign('designs must be a non-empty list')
+
+    validated = []
+    used_names = set()
+    for index, design in enumerate(designs):
+        if not isinstance(design, dict):
+            raise InvalidDesign(f'design #{index} must be an object')
+        try:
+            resources = validate_design_resources(design.get('resources', []))
+        except InvalidDesign as e:
+            raise InvalidDesign(f'design #{index}: {e}')
+
+        # Nazwa katalogu w archiwum - bez separatorów ścieżek, unikalna
+        name = DESIGN_NAME_RE.sub('_', str(design.get('name') or f'design_{index + 1}')).strip('._') or f'design_{index + 1}'
+        base, counter = name, 2
+        while name in used_names:
+            name = f'{base}_{counter}'
+            counter += 1
+        used_names.add(name)
+        validated.append((name, resources))
+    return validated
+
+
+def _zip_info(path: str, date_time) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(path, date_time=date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_designs_zip(generator: TerraformGenerator, designs: List[Tuple[str, List[Dict]]]) -> Iterator[bytes]:
+    """Yield zip bytes, one rendered design in memory at a time
+
+    Headers (200) are already sent while this runs, so a design that fails to render becomes
+    <name>/error.txt in the archive instead of cutting the zip off.
+    """
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED)
+    date_time = time.localtime()[:6]
+
+    for name, resources in designs:
+        try:
+            code = generator.generate(resources)
+        except Exception as e:
+            print(f"Batch export: design {name} failed to render: {e}")
+            archive.writestr(_zip_info(f'{name}/error.txt', date_time), f'Failed to render {name}: {e}\n')
+        else:
+            archive.writestr(_zip_info(f'{name}/main.tf', date_time), code)
+        yield sink.drain()
+
+    archive.close()
+    yield sink.drain()
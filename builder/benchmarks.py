@@ -0,0 +1,353 @@
+"""
+Microbenchmarks for the catalog, view and icon mapping hot paths
+Each benchmark reports ops/sec and per-op allocations, compared against a saved JSON baseline
+"""
+
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+
+# Podbij przy zmianie formatu pliku baseline
+BASELINE_VERSION = 1
+
+# Domyślne progi regresji: spadek ops/sec i wzrost alokacji względem baseline
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_ALLOC_THRESHOLD = 0.25
+# Alokacje poniżej tej wartości to szum (cache, interning) - nie porównujemy
+ALLOC_FLOOR_KIB = 16.0
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # setup() -> operacja bez argumentów; setup nie jest mierzony
+    setup: Callable[[], Callable[[], object]]
+    description: str = ''
+    # Nadpisanie progu dla ścieżek z większym szumem (wątki, I/O)
+    threshold: Optional[float] = None
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    ops_per_sec: float
+    spread: float        # (max - min) / median czasu powtórzeń
+    iterations: int      # operacji na powtórzenie
+    repeat: int
+    alloc_kib: float     # szczyt pamięci zaalokowanej w trakcie jednej operacji
+    retained_kib: float  # pamięć, która została po operacji
+    samples: List[float] = field(default_factory=list)
+
+    def as_baseline(self) -> Dict:
+        return {'ops_per_sec': self.ops_per_sec, 'alloc_kib': self.alloc_kib}
+
+
+def measure(operation: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> Dict:
+    """Kalibruje liczbę iteracji do min_time na powtórzenie, mediana z repeat powtórzeń"""
+    operation()  # rozgrzewka: leniwe singletony, importy, cache
+
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or iterations >= 1 << 20:
+            break
+        iterations *= max(2, min(10, int(min_time / max(elapsed, 1e-9)) + 1))
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                operation()
+            samples.append((time.perf_counter() - started) / iterations)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    # Alokacje osobno - tracemalloc spowalnia kilkukrotnie, więc nie w pomiarze czasu
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = operation()
+        _, peak = tracemalloc.get_traced_memory()
+        # Wynik operacji nie jest "zatrzymaną" pamięcią - liczy się to, co zostało w cache itp.
+        del result
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(samples)
+    return {
+        'ops_per_sec': 1 / median if median > 0 else float('inf'),
+        'spread': (max(samples) - min(samples)) / median if median > 0 else 0.0,
+        'iterations': iterations,
+        'repeat': repeat,
+        'alloc_kib': (peak - base) / 1024,
+        'retained_kib': max(current - base, 0) / 1024,
+        'samples': samples,
+    }
+
+
+def run_benchmark(benchmark: Benchmark, min_time: float = 0.2, repeat: int = 5) -> BenchmarkResult:
+    # print() w fetcherze i loggery skryptów mierzymy, ale nie zaśmiecamy wyjścia
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        operation = benchmark.setup()
+        stats = measure(operation, min_time=min_time, repeat=repeat)
+    return BenchmarkResult(name=benchmark.name, **stats)
+
+
+def compare(result: BenchmarkResult, baseline: Optional[Dict], threshold: float,
+            alloc_threshold: float) -> List[str]:
+    """Opisy regresji względem baseline (pusta lista = OK)"""
+    if not baseline:
+        return []
+    problems = []
+    expected = baseline.get('ops_per_sec')
+    if expected and result.ops_per_sec < expected * (1 - threshold):
+        problems.append(f'{result.ops_per_sec:,.1f} ops/s is {1 - result.ops_per_sec / expected:.0%} '
+                        f'below baseline {expected:,.1f} ops/s')
+    expected_alloc = baseline.get('alloc_kib')
+    if expected_alloc is not None and result.alloc_kib > ALLOC_FLOOR_KIB \
+            and result.alloc_kib > max(expected_alloc, ALLOC_FLOOR_KIB) * (1 + alloc_threshold):
+        problems.append(f'{result.alloc_kib:,.1f} KiB allocated per op, baseline {expected_alloc:,.1f} KiB')
+    return problems
+
+
+def baseline_path() -> Path:
+    return Path(getattr(settings, 'BENCHMARK_BASELINE_PATH', Path(settings.BASE_DIR) / 'benchmark_baseline.json'))
+
+
+def machine_info() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_baseline(path) -> Dict[str, Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if data.get('version') != BASELINE_VERSION:
+        return {}
+    return data.get('benchmarks', {})
+
+
+def save_baseline(path, results: List[BenchmarkResult], merge: bool = True) -> None:
+    """Zapis atomowy; przy merge wyniki nieuruchomionych benchmarków zostają z poprzedniego pliku"""
+    path = Path(path)
+    benchmarks = load_baseline(path) if merge else {}
+    benchmarks.update({result.name: result.as_baseline() for result in results})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': BASELINE_VERSION,
+            'saved_at': time.time(),
+            'machine': machine_info(),
+            'benchmarks': dict(sorted(benchmarks.items()))
+        }, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# --- Benchmarki ---
+
+def _static_hierarchical():
+    from .static_resources import StaticResourceProvider
+    return StaticResourceProvider.get_hierarchical_resources
+
+
+def _azure_flat_list():
+    from .azure_resources import AzureResourcesProvider
+    return AzureResourcesProvider.get_flat_list
+
+
+def _view(path: str, **params):
+    def setup():
+        from django.test import Client
+        from django.test.utils import setup_test_environment
+        # Bez tego Client dostaje DisallowedHost dla 'testserver'
+        if 'testserver' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+            setup_test_environment()
+        client = Client()
+
+        def request():
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {path} returned {response.status_code}')
+            return response
+        return request
+    return setup
+
+
+class _StubResponse:
+    def __init__(self, payload, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = {
+            'X-RateLimit-Limit': '5000',
+            'X-RateLimit-Remaining': '5000',
+            'X-RateLimit-Reset': str(int(time.time()) + 3600),
+        }
+
+    def json(self):
+        return self._payload
+
+
+class _StubSession:
+    """Transport w pamięci udający GitHub contents API: services/ i listingi katalogów usług"""
+
+    def __init__(self, services: int = 120, files_per_service: int = 40):
+        services_url = 'https://api.github.com/repos/hashicorp/terraform-provider-azurerm/contents/internal/services'
+        self.routes = {services_url: _StubResponse([
+            {'name': f'service{index:03d}', 'type': 'dir', 'sha': f'sha{index:03d}'} for index in range(services)
+        ])}
+        for index in range(services):
+            files = []
+            for number in range(files_per_service):
+                # Jak w repo: zasoby, testy i pliki pomocnicze
+                files.append({'name': f'thing_{number}_resource.go', 'type': 'file'})
+                files.append({'name': f'thing_{number}_resource_test.go', 'type': 'file'})
+                files.append({'name': f'thing_{number}_data_source.go', 'type': 'file'})
+            self.routes[f'{services_url}/service{index:03d}'] = _StubResponse(files)
+
+    def get(self, url, timeout=None):
+        return self.routes.get(url) or _StubResponse({'message': 'Not Found'}, status_code=404)
+
+
+def _stub_fetcher():
+    from .github_terraform_fetcher import TerraformResourceFetcher
+    fetcher = TerraformResourceFetcher()
+    fetcher.session = _StubSession()
+    fetcher.request_delay = 0
+    fetcher.token = 'benchmark'  # bez limitu 50 usług trybu anonimowego
+    fetcher.concurrent = False
+    return fetcher
+
+
+def _fetcher_crawl():
+    fetcher = _stub_fetcher()
+    return fetcher.crawl_catalog
+
+
+def _fetcher_crawl_incremental():
+    from .catalog_store import StoredCatalog
+    fetcher = _stub_fetcher()
+    resources, meta = fetcher.crawl_catalog()
+    previous = StoredCatalog(resources=resources, version=0, fetched_at=time.time(), meta=meta)
+    return lambda: fetcher.crawl_catalog(previous)
+
+
+def _mapper_sample(step: int = 6) -> List[str]:
+    from .icon_lookup import lookup_settings
+    names_path = lookup_settings()['mapper_dir'] / 'all_resource_names.txt'
+    with open(names_path, 'r', encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip().startswith('azurerm_')]
+    return names[::step]
+
+
+def _icon_mapper_pipeline():
+    from .icon_lookup import import_changes_module, lookup_settings
+    config = lookup_settings()
+    aa = import_changes_module('aa')
+    mapper = aa.AzureIconMapper(icons_path=config['icons_dir'])
+    mapper.icons_cache = mapper.scan_icons(config['manifest_path'], save_manifest=False)
+    names = _mapper_sample()
+    return lambda: mapper.map_resources(names)
+
+
+def _icon_mapper_lookup():
+    from .icon_lookup import import_changes_module, lookup_settings
+    config = lookup_settings()
+    aa = import_changes_module('aa')
+    mapper = aa.AzureIconMapper(icons_path=config['icons_dir'])
+    mapper.icons_cache = mapper.scan_icons(config['manifest_path'], save_manifest=False)
+    names = _mapper_sample(step=37)
+    # Pojedyncze lookupy bez planów - ścieżka widoku /api/icons/lookup/ (bez lru_cache)
+    return lambda: [mapper.find_icon_for_resource(name) for name in names]
+
+
+def _navigation_pipeline():
+    from .icon_lookup import import_changes_module, lookup_settings
+    nav = import_changes_module('azure_nav_generator')
+    config = lookup_settings()
+    generator = nav.AzureNavigationGenerator(
+        csv_path=config['mapper_dir'] / 'azyre.csv', icons_path=config['icons_dir']
+    )
+    generator.icons_cache = generator.scan_icons()
+    services = generator.load_services_from_csv()
+    return lambda: generator.create_navigation_structure(services)
+
+
+def _dependency_order(size: int = 20000):
+    from .dependency_graph import Reference, ReferenceIndex
+    from .terraform_generator import TerraformGenerator
+    # Syntetyczne typy: łańcuch odwrotny do kolejności projektu plus rozgałęzienia co 7 zasobów
+    references = ReferenceIndex({
+        'azurerm_bench_subnet': (Reference('virtual_network_name', 'azurerm_bench_network', 'name', False),),
+        'azurerm_bench_network': (Reference('firewall_id', 'azurerm_bench_firewall', 'id', False),),
+        'azurerm_bench_firewall': (Reference('plan_id', 'azurerm_bench_plan', 'id', False),),
+    })
+    kinds = ('subnet', 'network', 'firewall', 'plan', 'subnet', 'network', 'subnet')
+    resources = [
+        {'type': f'azurerm_bench_{kinds[index % len(kinds)]}', 'id': index, 'category': kinds[index % len(kinds)]}
+        for index in range(size)
+    ]
+    generator = TerraformGenerator(None, references)
+    return lambda: generator.emission_order(resources)
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark('static.hierarchical', _static_hierarchical,
+              'StaticResourceProvider.get_hierarchical_resources'),
+    Benchmark('azure.flat_list', _azure_flat_list, 'AzureResourcesProvider.get_flat_list'),
+    Benchmark('view.resources.hierarchical', _view('/api/resources/'),
+              'GET /api/resources/ (pre-encoded snapshot)'),
+    Benchmark('view.resources.flat', _view('/api/resources/', format='flat'),
+              'GET /api/resources/?format=flat (pre-encoded snapshot)'),
+    Benchmark('view.resources.flat_page', _view('/api/resources/', format='flat', limit=100, fields='name,display'),
+              'GET /api/resources/?format=flat&limit=100&fields=... (columnar page)'),
+    Benchmark('fetcher.crawl', _fetcher_crawl,
+              'TerraformResourceFetcher.crawl_catalog, cold, stubbed transport (120 services)'),
+    Benchmark('fetcher.crawl_incremental', _fetcher_crawl_incremental,
+              'TerraformResourceFetcher.crawl_catalog with unchanged service SHAs'),
+    Benchmark('mapper.pipeline', _icon_mapper_pipeline,
+              'AzureIconMapper.map_resources over every 6th resource name', threshold=0.35),
+    Benchmark('mapper.lookup', _icon_mapper_lookup,
+              'AzureIconMapper.find_icon_for_resource one by one (runtime lookup path)', threshold=0.35),
+    Benchmark('navigation.pipeline', _navigation_pipeline,
+              'AzureNavigationGenerator.create_navigation_structure for azyre.csv', threshold=0.35),
+    Benchmark('terraform.dependency_order', _dependency_order,
+              'TerraformGenerator.emission_order for a 20k-resource design with inferred references'),
+]
+
+
+def select_benchmarks(patterns: List[str]) -> List[Benchmark]:
+    """Benchmarki, których nazwa zawiera któryś ze wzorców (wszystkie bez wzorców)"""
+    if not patterns:
+        return list(BENCHMARKS)
+    return [benchmark for benchmark in BENCHMARKS if any(pattern in benchmark.name for pattern in patterns)]
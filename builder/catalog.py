@@ -0,0 +1,321 @@
+"""
+Pre-serialized catalog snapshot for the resources API
+Built once per process, every response format is encoded to bytes up front
+"""
+
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import static_resources
+from .metrics import phase, record_cache
+from .static_resources import StaticResourceProvider
+
+# Opcjonalne kodowania - bez pakietów serwujemy tylko JSON / gzip
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+MSGPACK_ALIASES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Kolejność preferencji przy remisie wag q
+ENCODING_PREFERENCE = ('br', 'gzip', 'identity')
+
+
+@dataclass(frozen=True)
+class CatalogVariant:
+    """One representation of an entry: media type x content encoding"""
+    body: bytes
+    etag: str
+    content_type: str
+    content_encoding: str = 'identity'
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Encoded response with all precomputed representations, media_type/identity always present"""
+    variants: Dict[Tuple[str, str], CatalogVariant]
+    media_type: str = JSON_TYPE
+
+    @property
+    def default(self) -> CatalogVariant:
+        return self.variants[(self.media_type, 'identity')]
+
+    @property
+    def body(self) -> bytes:
+        return self.default.body
+
+    @property
+    def etag(self) -> str:
+        return self.default.etag
+
+    @property
+    def content_type(self) -> str:
+        return self.default.content_type
+
+    def negotiate(self, accept: str = '', accept_encoding: str = '') -> CatalogVariant:
+        """Pick the best precomputed variant for Accept / Accept-Encoding headers"""
+        media_type = self.media_type
+        if accept and media_type == JSON_TYPE and any((MSGPACK_TYPE, encoding) in self.variants for encoding in ENCODING_PREFERENCE):
+            accepted = parse_quality_header(accept)
+            msgpack_q = max(accepted.get(alias, 0.0) for alias in MSGPACK_ALIASES)
+            json_q = accepted.get(JSON_TYPE, accepted.get('application/*', accepted.get('*/*', 0.0)))
+            if msgpack_q > json_q:
+                media_type = MSGPACK_TYPE
+
+        encodings = parse_quality_header(accept_encoding) if accept_encoding else {}
+        wildcard_q = encodings.get('*', 0.0)
+        best, best_q = None, 0.0
+        for encoding in ENCODING_PREFERENCE:
+            variant = self.variants.get((media_type, encoding))
+            if variant is None:
+                continue
+            # identity dozwolone domyślnie, chyba że jawnie wykluczone
+            default_q = 1.0 if encoding == 'identity' else wildcard_q
+            q = encodings.get(encoding, default_q)
+            if q > best_q:
+                best, best_q = variant, q
+        return best or self.variants[(media_type, 'identity')]
+
+
+def parse_quality_header(header: str) -> Dict[str, float]:
+    """'gzip;q=0.8, br' -> {'gzip': 0.8, 'br': 1.0}"""
+    values = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        token = parts[0].strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[token] = max(q, values.get(token, 0.0))
+    return values
+
+
+def _compressed_variants(media_type: str, body: bytes, etag_base: str) -> Dict[Tuple[str, str], CatalogVariant]:
+    """Identity plus gzip/brotli variants, compressed once at build time"""
+    variants = {(media_type, 'identity'): CatalogVariant(body, f'"{etag_base}"', media_type)}
+
+    # mtime=0 - deterministyczny gzip, stabilny ETag między procesami
+    compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(body, quality=11)
+
+    for encoding, data in compressed.items():
+        if len(data) < len(body):
+            variants[(media_type, encoding)] = CatalogVariant(
+                data, f'"{etag_base}-{encoding}"', media_type, encoding
+            )
+    return variants
+
+
+def encode_entry(payload: Dict) -> CatalogEntry:
+    """Encode payload the same way JsonResponse does and tag each representation with a content hash"""
+    body = json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = _compressed_variants(JSON_TYPE, body, digest)
+
+    if msgpack is not None:
+        packed = msgpack.packb(payload, use_bin_type=True)
+        variants.update(_compressed_variants(MSGPACK_TYPE, packed, f'{digest}-msgpack'))
+
+    return CatalogEntry(variants=variants)
+
+
+class InvalidCursor(ValueError):
+    """Cursor could not be decoded"""
+
+
+class ColumnarView:
+    """Flat list stored column by column in a stable sort order, pages are column slices"""
+
+    # Kolejność stronicowania: nazwa zasobu, potem pozycja w hierarchii; na końcu klucza pozycja wiersza
+    # w źródle - klucz jest unikalny, więc granica strony między dwoma równymi wierszami niczego nie gubi
+    SORT_FIELDS = ('name', 'parent_category', 'subcategory', 'display')
+
+    def __init__(self, rows: List[Dict]):
+        fields = []
+        for row in rows:
+            for field in row:
+                if field not in fields:
+                    fields.append(field)
+        self.fields = tuple(fields)
+
+        keyed = sorted((self._row_key(row, position), row) for position, row in enumerate(rows))
+        self.keys = [key for key, _ in keyed]
+        ordered = [row for _, row in keyed]
+        self.columns = {
+            field: tuple(row.get(field) for row in ordered)
+            for field in self.fields
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def _row_key(cls, row: Dict, position: int) -> Tuple:
+        return tuple(row.get(field) or '' for field in cls.SORT_FIELDS) + (position,)
+
+    @staticmethod
+    def encode_cursor(key: Tuple) -> str:
+        raw = json.dumps(key, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            key = json.loads(raw)
+        except (binascii.Error, ValueError) as e:
+            raise InvalidCursor(str(e))
+        # Pola sortowania i pozycja wiersza w źródle - inny kształt to nie nasz kursor
+        fields = len(ColumnarView.SORT_FIELDS)
+        if not isinstance(key, list) or len(key) != fields + 1 \
+                or not all(isinstance(part, str) for part in key[:fields]) \
+                or not isinstance(key[-1], int) or isinstance(key[-1], bool):
+            raise InvalidCursor('malformed cursor')
+        return tuple(key)
+
+    def page(self, fields: Tuple[str, ...], limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Return rows after cursor (keyset, so cursors survive catalog rebuilds) and next cursor"""
+        start = bisect_right(self.keys, self.decode_cursor(cursor)) if cursor else 0
+        end = min(start + limit, len(self.keys))
+        columns = [self.columns[field][start:end] for field in fields]
+        rows = [dict(zip(fields, values)) for values in zip(*columns)]
+        next_cursor = self.encode_cursor(self.keys[end - 1]) if end < len(self.keys) else None
+        return rows, next_cursor
+
+
+class CatalogSnapshot:
+    """Immutable, fully encoded view of the static resource catalog"""
+
+    # Formaty pełnego katalogu dla ?format=; entries['categories'] ma własny endpoint
+    FORMATS = ('hierarchical', 'flat')
+
+    def __init__(self, hierarchical: Dict, flat: list, built_at: float):
+        self.built_at = built_at
+        self.flat_columns = ColumnarView(flat)
+        self.entries = {
+            'hierarchical': encode_entry({
+                'resources': hierarchical,
+                'format': 'hierarchical',
+                'total_categories': len(hierarchical),
+                'source': 'static_hierarchical',
+                'timestamp': built_at
+            }),
+            'flat': encode_entry({
+                'resources': flat,
+                'total_count': len(flat),
+                'format': 'flat',
+                'source': 'static_flat',
+                'timestamp': built_at
+            }),
+        }
+
+        # Leniwe rozwijanie sidebaru: nagłówki kategorii + osobny wycinek na kategorię
+        headers = []
+        self.categories = {}
+        for category_name, category_data in hierarchical.items():
+            subcategories = category_data['subcategories']
+            resource_count = sum(len(resources) for resources in subcategories.values())
+            headers.append({
+                'name': category_name,
+                'icon': category_data['icon'],
+                'subcategory_count': len(subcategories),
+                'resource_count': resource_count
+            })
+            self.categories[category_name] = encode_entry({
+                'name': category_name,
+                'icon': category_data['icon'],
+                'subcategories': subcategories,
+                'resource_count': resource_count,
+                'source': 'static_hierarchical',
+                'timestamp': built_at
+            })
+        self.entries['categories'] = encode_entry({
+            'categories': headers,
+            'total_categories': len(headers),
+            'source': 'static_hierarchical',
+            'timestamp': built_at
+        })
+
+    @classmethod
+    def build(cls) -> 'CatalogSnapshot':
+        """Build snapshot from StaticResourceProvider"""
+        # Czas modyfikacji źródła zamiast time.time() - identyczne bajty i ETagi we wszystkich workerach
+        return cls(
+            hierarchical=StaticResourceProvider.get_hierarchical_resources(),
+            flat=StaticResourceProvider.get_flat_list(),
+            built_at=os.path.getmtime(static_resources.__file__)
+        )
+
+    def get(self, format_type: str) -> CatalogEntry:
+        """Return encoded entry, unknown formats fall back to flat like the old view"""
+        return self.entries[format_type if format_type in self.FORMATS else 'flat']
+
+    def get_category(self, name: str) -> Optional[CatalogEntry]:
+        """Return encoded subcategories of a single category"""
+        return self.categories.get(name)
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """Return the per-process snapshot, building it on first use"""
+    global _snapshot
+    snapshot = _snapshot
+    record_cache('catalog_snapshot', snapshot is not None)
+    if snapshot is None:
+        with _snapshot_lock, phase('catalog_build'):
+            if _snapshot is None:
+                _snapshot = CatalogSnapshot.build()
+            snapshot = _snapshot
+    return snapshot
+
+
+async def get_catalog_snapshot_async() -> CatalogSnapshot:
+    """get_catalog_snapshot for async views - the one-time build runs in a thread, not on the event loop"""
+    if _snapshot is None:
+        return await sync_to_async(get_catalog_snapshot, thread_sensitive=False)()
+    return get_catalog_snapshot()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check If-None-Match header against ETag (weak comparison, as RFC 9110 requires for 304)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,151 @@
+"""
+Stale-while-revalidate refresh for the GitHub resource catalog
+Requests always get the current catalog immediately, a single background refresher replaces it
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .catalog_store import CatalogStore, StoredCatalog
+
+# crawl(previous) -> (resources, meta) albo None gdy nic nie udało się pobrać
+CrawlFunction = Callable[[Optional[StoredCatalog]], Optional[Tuple[List[Dict], Dict]]]
+
+
+class CatalogRefresher:
+    """Holds the current catalog and rebuilds it in a background thread"""
+
+    def __init__(self, crawl: CrawlFunction, store: CatalogStore, key: str,
+                 interval: float = 7200, jitter: float = 0.1,
+                 backoff: float = 60, backoff_max: float = 3600):
+        self.crawl = crawl
+        self.store = store
+        self.key = key
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        # Lease na cały node, żeby refreshował tylko jeden worker
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+        self._current: Optional[StoredCatalog] = None
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._scheduler: Optional[threading.Thread] = None
+        self._scheduler_lock = threading.Lock()
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[StoredCatalog]:
+        """Current catalog - one reference read, swapped atomically by the refresher"""
+        if self._current is None:
+            stored = self.store.get(self.key)
+            if stored is not None and self._current is None:
+                self._current = stored
+        return self._current
+
+    def is_stale(self, catalog: Optional[StoredCatalog] = None) -> bool:
+        catalog = catalog or self._current
+        return catalog is None or catalog.age >= self.interval
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def trigger(self) -> bool:
+        """Request a refresh now; returns False when one is already running or backing off"""
+        if time.time() < self.next_attempt or self._refresh_lock.locked():
+            return False
+        self.ensure_started()
+        self._wake.set()
+        return True
+
+    def refresh(self) -> bool:
+        """Run one refresh in the calling thread (single-flight per process and per node)"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            # Inny worker mógł już odświeżyć katalog na dysku
+            stored = self.store.get(self.key)
+            if stored is not None and (self._current is None or stored.fetched_at > self._current.fetched_at):
+                self._current = stored
+            if not self.is_stale():
+                return True
+
+            if not self.store.acquire_lease(self.key, self.owner, ttl=max(self.interval / 2, 600)):
+                return False
+            try:
+                result = self.crawl(self._current)
+            finally:
+                self.store.release_lease(self.key, self.owner)
+
+            if not result or not result[0]:
+                raise RuntimeError('crawl returned no resources')
+
+            resources, meta = result
+            # Zapis na dysk i podmiana referencji - czytelnicy widzą stary albo nowy katalog, nigdy pośredni
+            self._current = self.store.put(self.key, resources, meta=meta)
+            self.failures = 0
+            self.next_attempt = 0.0
+            self.last_error = None
+            print(f"Catalog refreshed: {len(resources)} resources")
+            return True
+        except Exception as e:
+            self.failures += 1
+            delay = min(self.backoff * 2 ** (self.failures - 1), self.backoff_max)
+            self.next_attempt = time.time() + self._jittered(delay)
+            self.last_error = str(e)
+            print(f"Catalog refresh failed ({self.failures} in a row), retrying in {int(delay)}s: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def ensure_started(self) -> None:
+        """Start the scheduler thread once per process"""
+        if self._scheduler is not None and self._scheduler.is_alive():
+            return
+        with self._scheduler_lock:
+            if self._scheduler is None or not self._scheduler.is_alive():
+                self._scheduler = threading.Thread(target=self._run, name='catalog-refresh', daemon=True)
+                self._scheduler.start()
+
+    def _next_delay(self) -> float:
+        now = time.time()
+        if self.next_attempt > now:
+            return self.next_attempt - now
+        current = self._current
+        if current is None:
+            return 0.0
+        return max(self._jittered(self.interval) - current.age, 0.0)
+
+    def _run(self) -> None:
+        while True:
+            # Budzi nas termin odświeżenia albo trigger() z requestu
+            self._wake.wait(timeout=self._next_delay())
+            self._wake.clear()
+            if time.time() < self.next_attempt:
+                continue
+            if self.is_stale() or self._current is None:
+                self.refresh()
+                if self.is_stale() and self.next_attempt <= time.time():
+                    # Lease u innego workera - sprawdź dysk za chwilę
+                    self.next_attempt = time.time() + self._jittered(self.backoff)
+
+    def stats(self) -> Dict:
+        current = self._current
+        return {
+            'has_catalog': current is not None,
+            'age': int(current.age) if current else None,
+            'stale': self.is_stale(current),
+            'refreshing': self._refresh_lock.locked(),
+            'failures': self.failures,
+            'next_attempt': self.next_attempt or None,
+            'last_error': self.last_error,
+            'interval': self.interval
+        }
@@ -0,0 +1,160 @@
+"""
+Disk-backed catalog cache shared by all workers on a node
+SQLite in WAL mode - writes are atomic transactions, readers never block on writers
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# Podbij przy zmianie kształtu wpisów katalogu - stare wpisy są wtedy ignorowane
+CATALOG_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class StoredCatalog:
+    resources: List[Dict]
+    version: int
+    fetched_at: float
+    meta: Dict = field(default_factory=dict)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class CatalogStore:
+    """Key -> (version, fetched_at, resources, meta) in a local SQLite file"""
+
+    def __init__(self, path, version: int = CATALOG_FORMAT_VERSION):
+        self.path = Path(path)
+        self.version = version
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # Połączenie per wątek - sqlite3 nie współdzieli połączeń między wątkami
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS catalogs ('
+                        ' key TEXT PRIMARY KEY,'
+                        ' version INTEGER NOT NULL,'
+                        ' fetched_at REAL NOT NULL,'
+                        ' payload TEXT NOT NULL)'
+                    )
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS leases ('
+                        ' key TEXT PRIMARY KEY,'
+                        ' owner TEXT NOT NULL,'
+                        ' expires_at REAL NOT NULL)'
+                    )
+                    self._initialized = True
+        return conn
+
+    def get(self, key: str) -> Optional[StoredCatalog]:
+        """Stored catalog for key, None when missing, unreadable or from another format version"""
+        try:
+            row = self._connection().execute(
+                'SELECT version, fetched_at, payload FROM catalogs WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Catalog store read failed: {e}")
+            return None
+
+        if row is None or row[0] != self.version:
+            return None
+        try:
+            payload = json.loads(row[2])
+        except ValueError:
+            return None
+        return StoredCatalog(
+            resources=payload.get('resources', []),
+            version=row[0],
+            fetched_at=row[1],
+            meta=payload.get('meta', {})
+        )
+
+    def put(self, key: str, resources: List[Dict], meta: Optional[Dict] = None,
+            fetched_at: Optional[float] = None) -> StoredCatalog:
+        """Replace catalog for key in a single transaction"""
+        stored = StoredCatalog(
+            resources=resources,
+            version=self.version,
+            fetched_at=fetched_at if fetched_at is not None else time.time(),
+            meta=meta or {}
+        )
+        payload = json.dumps({'resources': resources, 'meta': stored.meta}, ensure_ascii=False)
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO catalogs (key, version, fetched_at, payload) VALUES (?, ?, ?, ?)',
+                (key, stored.version, stored.fetched_at, payload)
+            )
+        except sqlite3.Error as e:
+            print(f"Catalog store write failed: {e}")
+        return stored
+
+    def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Node-wide lock with expiry - only one worker refreshes a catalog at a time"""
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT owner, expires_at FROM leases WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[0] != owner and row[1] > now:
+                    conn.execute('ROLLBACK')
+                    return False
+                conn.execute(
+                    'INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)',
+                    (key, owner, now + ttl)
+                )
+                conn.execute('COMMIT')
+                return True
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"Catalog store lease failed: {e}")
+            return False
+
+    def release_lease(self, key: str, owner: str) -> None:
+        try:
+            self._connection().execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner))
+        except sqlite3.Error:
+            pass
+
+    def delete(self, key: str) -> None:
+        self._connection().execute('DELETE FROM catalogs WHERE key = ?', (key,))
+
+
+_store: Optional[CatalogStore] = None
+_store_lock = threading.Lock()
+
+
+def get_catalog_store() -> CatalogStore:
+    """Per-process handle to the node-wide store at CATALOG_STORE_PATH"""
+    global _store
+    store = _store
+    if store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CatalogStore(getattr(
+                    settings, 'CATALOG_STORE_PATH', Path(settings.BASE_DIR) / 'catalog_cache.sqlite3'
+                ))
+            store = _store
+    return store
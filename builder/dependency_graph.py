@@ -0,0 +1,257 @@
+"""
+Resource dependency graph for generated HCL
+Reference attributes (virtual_network_name, server_id, ...) are mapped to target resource types once per schema file,
+a design becomes a graph over its resources and is emitted in topological order (Kahn, O(V + E))
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .schema_store import get_schema_store
+
+REFERENCES_VERSION = 1
+
+# Sufiks atrybutu -> atrybut celu w wyrażeniu HCL, czy lista
+REFERENCE_SUFFIXES = (
+    ('_ids', 'id', True),
+    ('_id', 'id', False),
+    ('_name', 'name', False),
+)
+
+# Wiązane z azurerm_resource_group.main przez generator albo wypełniane etykietą
+IMPLICIT_ATTRIBUTES = frozenset({'name', 'location', 'resource_group_name'})
+
+LIST_TYPE_PREFIXES = ('list(', 'set(')
+
+
+class Reference(NamedTuple):
+    attribute: str
+    target_type: str
+    target_attribute: str
+    is_list: bool
+
+    def expression(self, target_label: str) -> str:
+        expression = f'{self.target_type}.{target_label}.{self.target_attribute}'
+        return f'[{expression}]' if self.is_list else expression
+
+
+class DependencyCycle(ValueError):
+    """Design resources reference each other in a cycle"""
+
+    def __init__(self, cycle: List[int], order: List[int]):
+        super().__init__(f"dependency cycle between resources {' -> '.join(map(str, cycle))}")
+        # Indeksy zasobów na cyklu (pierwszy powtórzony na końcu) i kolejność części acyklicznej
+        self.cycle = cycle
+        self.order = order
+
+
+def _reference_candidates(resource_type: str, stem: str) -> Iterable[str]:
+    """azurerm_<stem>, potem z prefiksami typu źródłowego: mssql_database.server_id -> azurerm_mssql_server"""
+    yield f'azurerm_{stem}'
+    parts = resource_type[len('azurerm_'):].split('_')
+    for length in range(len(parts) - 1, 0, -1):
+        prefix = '_'.join(parts[:length])
+        if not stem.startswith(prefix + '_'):
+            yield f'azurerm_{prefix}_{stem}'
+
+
+def infer_references(resource_type: str, schema: Dict, known_types) -> Tuple[Reference, ...]:
+    """Required top-level attributes that name or identify another resource type from the schema"""
+    references = []
+    for attribute, spec in sorted(schema.get('attributes', {}).items()):
+        if not spec.get('required') or attribute in IMPLICIT_ATTRIBUTES:
+            continue
+        for suffix, target_attribute, is_list in REFERENCE_SUFFIXES:
+            if not attribute.endswith(suffix):
+                continue
+            attribute_type = spec.get('type')
+            if is_list != (isinstance(attribute_type, str) and attribute_type.startswith(LIST_TYPE_PREFIXES)):
+                break
+            stem = attribute[:-len(suffix)]
+            for target_type in _reference_candidates(resource_type, stem):
+                if target_type != resource_type and target_type in known_types:
+                    references.append(Reference(attribute, target_type, target_attribute, is_list))
+                    break
+            break
+    return tuple(references)
+
+
+class ReferenceIndex:
+    """{resource type: references} for every schema in the store, persisted next to the schema file"""
+
+    def __init__(self, references: Optional[Dict[str, Tuple[Reference, ...]]] = None):
+        self._references = references or {}
+
+    @classmethod
+    def from_schemas(cls, schemas: Iterable[Tuple[str, Dict]], known_types) -> 'ReferenceIndex':
+        known_types = frozenset(known_types)
+        references = {}
+        for resource_type, schema in schemas:
+            inferred = infer_references(resource_type, schema, known_types)
+            if inferred:
+                references[resource_type] = inferred
+        return cls(references)
+
+    @classmethod
+    def for_store(cls, store, index_path=None) -> 'ReferenceIndex':
+        """Reuse the persisted map when the schema file is unchanged, otherwise scan all schemas once"""
+        index_path = Path(index_path) if index_path else store.path.with_name(store.path.name + '.references.json')
+        fingerprint = {**store.fingerprint(), 'references_version': REFERENCES_VERSION}
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get('fingerprint') == fingerprint:
+                return cls({
+                    resource_type: tuple(Reference(*reference) for reference in references)
+                    for resource_type, references in stored['references'].items()
+                })
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        index = cls.from_schemas(store.iter_schemas(), store.names())
+
+        # Zapis atomowy; brak uprawnień do katalogu nie jest błędem
+        tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': fingerprint, 'references': index._references}, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+        return index
+
+    def __len__(self):
+        return len(self._references)
+
+    def references(self, resource_type: str) -> Tuple[Reference, ...]:
+        return self._references.get(resource_type, ())
+
+
+class DependencyGraph:
+    """Adjacency lists over node indexes; every dependency is emitted before its dependents"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.dependents: List[List[int]] = [[] for _ in range(size)]
+        self.indegree = [0] * size
+
+    def add_edge(self, dependent: int, dependency: int) -> None:
+        self.dependents[dependency].append(dependent)
+        self.indegree[dependent] += 1
+
+    def topological_order(self, groups: Optional[Sequence[str]] = None) -> List[int]:
+        """Kahn's algorithm, stable with respect to node order
+
+        With groups (categories) a group keeps being emitted while it has ready nodes, so a design without
+        dependencies comes out grouped by first appearance, as before. Raises DependencyCycle.
+        """
+        indegree = list(self.indegree)
+        if groups is None:
+            groups = [''] * self.size
+        ready: Dict[str, deque] = {}
+        # Grupy z gotowymi węzłami w kolejności, w jakiej ich kolejka stała się niepusta
+        group_queue: deque = deque()
+
+        def push(node: int) -> None:
+            group = groups[node]
+            queue = ready.get(group)
+            if queue is None:
+                queue = ready[group] = deque()
+            if not queue:
+                group_queue.append(group)
+            queue.append(node)
+
+        for node in range(self.size):
+            if indegree[node] == 0:
+                push(node)
+
+        order = []
+        while group_queue:
+            group = group_queue.popleft()
+            queue = ready[group]
+            # Zwolnione węzły tej samej grupy idą na koniec bieżącej kolejki - bez ponownego kolejkowania grupy
+            while queue:
+                node = queue.popleft()
+                order.append(node)
+                for dependent in self.dependents[node]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0:
+                        if groups[dependent] == group:
+                            queue.append(dependent)
+                        else:
+                            push(dependent)
+
+        if len(order) < self.size:
+            raise DependencyCycle(self._find_cycle(indegree), order)
+        return order
+
+    def _find_cycle(self, indegree: List[int]) -> List[int]:
+        """One cycle among nodes Kahn could not emit - each of them still has an unemitted dependency"""
+        remaining = [node for node in range(self.size) if indegree[node] > 0]
+        dependency_of: Dict[int, int] = {}
+        for node in remaining:
+            for dependent in self.dependents[node]:
+                if indegree[dependent] > 0:
+                    dependency_of.setdefault(dependent, node)
+
+        node = remaining[0]
+        seen: Dict[int, int] = {}
+        path = []
+        while node not in seen:
+            seen[node] = len(path)
+            path.append(node)
+            node = dependency_of[node]
+        cycle = path[seen[node]:]
+        # Kolejność zależności: od zależnego w stronę tego, od którego zależy, z powrotem do pierwszego
+        return cycle + [cycle[0]]
+
+
+def build_design_graph(resources: List[Dict], index: ReferenceIndex,
+                       ) -> Tuple[DependencyGraph, List[List[Tuple[Reference, int]]]]:
+    """Graph of a design plus per-resource (reference, target index) bindings
+
+    A reference binds to the closest earlier resource of the target type, or the first later one.
+    Attributes set explicitly on the resource are left alone.
+    """
+    first_by_type: Dict[str, int] = {}
+    for position, resource in enumerate(resources):
+        first_by_type.setdefault(resource['type'], position)
+
+    graph = DependencyGraph(len(resources))
+    bindings: List[List[Tuple[Reference, int]]] = []
+    last_by_type: Dict[str, int] = {}
+    for position, resource in enumerate(resources):
+        bound = []
+        explicit = resource.get('attributes') or {}
+        for reference in index.references(resource['type']):
+            if reference.attribute in explicit:
+                continue
+            target = last_by_type.get(reference.target_type, first_by_type.get(reference.target_type))
+            if target is None or target == position:
+                continue
+            graph.add_edge(position, target)
+            bound.append((reference, target))
+        bindings.append(bound)
+        last_by_type[resource['type']] = position
+    return graph, bindings
+
+
+_index: Optional[ReferenceIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_reference_index() -> ReferenceIndex:
+    """Per-process reference map for the configured schema store (empty without a schema file)"""
+    global _index
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                store = get_schema_store()
+                _index = ReferenceIndex.for_store(store) if store is not None else ReferenceIndex()
+            index = _index
+    return index
@@ -0,0 +1,215 @@
+"""
+Server-side canvas designs saved as small patch operations
+Each edit appends rows to DesignOperation; every DESIGN_COMPACT_THRESHOLD operations they are folded into the snapshot
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Design, DesignOperation
+from .terraform_generator import InvalidDesign, validate_design_resources
+
+OPERATIONS = ('add', 'move', 'remove', 'clear')
+
+
+class VersionConflict(Exception):
+    """base_version klienta nie jest bieżącą wersją projektu"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f'design is at version {current_version}')
+        self.current_version = current_version
+
+
+def compact_threshold() -> int:
+    return int(getattr(settings, 'DESIGN_COMPACT_THRESHOLD', 200))
+
+
+def max_operations_per_request() -> int:
+    return int(getattr(settings, 'DESIGN_MAX_OPERATIONS', 500))
+
+
+def max_resources() -> int:
+    return int(getattr(settings, 'DESIGN_MAX_RESOURCES', 1000))
+
+
+def max_designs_per_session() -> int:
+    return int(getattr(settings, 'DESIGN_MAX_PER_SESSION', 50))
+
+
+# Projekty należą do sesji, która je utworzyła - id trzymane w sesji, bez kolumny właściciela
+SESSION_KEY = 'builder_design_ids'
+
+
+def session_design_ids(session) -> List[int]:
+    return list(session.get(SESSION_KEY, []))
+
+
+def remember_design(session, design_id: int) -> None:
+    session[SESSION_KEY] = session_design_ids(session) + [design_id]
+
+
+def can_access_design(request, design_id: int) -> bool:
+    return design_id in session_design_ids(request.session) or request.user.is_staff
+
+
+def _resource_key(resource_id) -> str:
+    # Id z canvasu to Date.now() + Math.random() - porównujemy po kanonicznym JSON, nie po typie
+    return json.dumps(resource_id)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_resource_id(value) -> bool:
+    return _is_number(value) or (isinstance(value, str) and value != '')
+
+
+def validate_resource_ids(resources: List[Dict]) -> None:
+    """Każdy zasób projektu ma niepuste, unikalne id - operacje move/remove/add adresują zasoby po id"""
+    seen = set()
+    for index, resource in enumerate(resources):
+        if not _is_resource_id(resource.get('id')):
+            raise InvalidDesign(f'resource #{index} needs an id')
+        key = _resource_key(resource['id'])
+        if key in seen:
+            raise InvalidDesign(f"resource #{index}: duplicate id {resource['id']!r}")
+        seen.add(key)
+
+
+def validate_operation(operation, index: int = 0) -> Dict:
+    """Kształt jednej operacji; istnienie zasobu sprawdza dopiero apply (stałe koszty zapisu)"""
+    if not isinstance(operation, dict):
+        raise InvalidDesign(f'operation #{index} must be an object')
+    kind = operation.get('op')
+    if kind not in OPERATIONS:
+        raise InvalidDesign(f"operation #{index}: op must be one of {', '.join(OPERATIONS)}")
+
+    if kind == 'add':
+        resource = operation.get('resource')
+        try:
+            validate_design_resources([resource])
+        except InvalidDesign as e:
+            raise InvalidDesign(f'operation #{index}: {str(e).replace("resource #0", "resource")}')
+        if not _is_resource_id(resource.get('id')):
+            raise InvalidDesign(f'operation #{index}: resource needs an id')
+        if not _is_number(resource.get('x', 0)) or not _is_number(resource.get('y', 0)):
+            raise InvalidDesign(f'operation #{index}: x and y must be numbers')
+        return {'op': 'add', 'resource': resource}
+
+    if kind == 'clear':
+        return {'op': 'clear'}
+
+    if 'id' not in operation:
+        raise InvalidDesign(f'operation #{index}: {kind} needs an id')
+    if kind == 'remove':
+        return {'op': 'remove', 'id': operation['id']}
+
+    if not _is_number(operation.get('x')) or not _is_number(operation.get('y')):
+        raise InvalidDesign(f'operation #{index}: move needs numeric x and y')
+    return {'op': 'move', 'id': operation['id'], 'x': operation['x'], 'y': operation['y']}
+
+
+def validate_operations(operations) -> List[Dict]:
+    if not isinstance(operations, list) or not operations:
+        raise InvalidDesign('operations must be a non-empty list')
+    limit = max_operations_per_request()
+    if len(operations) > limit:
+        raise InvalidDesign(f'at most {limit} operations per request')
+    return [validate_operation(operation, index) for index, operation in enumerate(operations)]
+
+
+def apply_operations(resources: List[Dict], operations: Iterable[Dict]) -> List[Dict]:
+    """Snapshot + operacje -> lista zasobów; operacje na nieistniejących id są pomijane
+
+    add z istniejącym id podmienia zasób w miejscu (ponowione wysłanie tej samej edycji nic nie psuje).
+    """
+    by_key: Dict[str, Dict] = {_resource_key(resource.get('id')): resource for resource in resources}
+    for operation in operations:
+        kind = operation['op']
+        if kind == 'add':
+            resource = operation['resource']
+            by_key[_resource_key(resource['id'])] = resource
+        elif kind == 'move':
+            resource = by_key.get(_resource_key(operation['id']))
+            if resource is not None:
+                by_key[_resource_key(operation['id'])] = {**resource, 'x': operation['x'], 'y': operation['y']}
+        elif kind == 'remove':
+            by_key.pop(_resource_key(operation['id']), None)
+        elif kind == 'clear':
+            by_key.clear()
+    return list(by_key.values())
+
+
+def _check_size(resources: List[Dict]) -> None:
+    limit = max_resources()
+    if len(resources) > limit:
+        raise InvalidDesign(f'at most {limit} resources per design')
+
+
+def create_design(name: str = '', resources: Optional[List] = None) -> Design:
+    resources = validate_design_resources(resources or [])
+    validate_resource_ids(resources)
+    _check_size(resources)
+    return Design.objects.create(name=str(name)[:200], snapshot=resources)
+
+
+def append_operations(design_id: int, operations: List[Dict], base_version: Optional[int] = None) -> int:
+    """Dopisz operacje do projektu, zwraca nową wersję
+
+    Bez add koszt nie zależy od rozmiaru projektu: jeden odczyt wersji, bulk insert operacji i jeden update.
+    Tylko add może powiększyć projekt, więc tylko wtedy wynik jest składany i sprawdzany z max_resources().
+    Kompaktowanie snapshotu raz na compact_threshold() operacji.
+    """
+    grows = any(operation['op'] == 'add' for operation in operations)
+    for attempt in range(3):
+        try:
+            with transaction.atomic():
+                design = Design.objects.select_for_update().only('version', 'snapshot_version').get(pk=design_id)
+                if base_version is not None and base_version != design.version:
+                    raise VersionConflict(design.version)
+                if grows:
+                    _check_size(apply_operations(load_design(design_id)[1], operations))
+                start = design.version
+                DesignOperation.objects.bulk_create([
+                    DesignOperation(design_id=design_id, version=start + offset, operation=operation)
+                    for offset, operation in enumerate(operations, 1)
+                ])
+                version = start + len(operations)
+                Design.objects.filter(pk=design_id).update(version=version, updated_at=timezone.now())
+            break
+        except IntegrityError:
+            # Równoległy zapis zajął te numery (SQLite ignoruje select_for_update)
+            if base_version is not None or attempt == 2:
+                raise VersionConflict(Design.objects.values_list('version', flat=True).get(pk=design_id))
+
+    if version - design.snapshot_version >= compact_threshold():
+        compact_design(design_id)
+    return version
+
+
+def load_design(design_id: int) -> Tuple[Design, List[Dict]]:
+    """(projekt, zasoby) - snapshot plus operacje zapisane po nim"""
+    design = Design.objects.get(pk=design_id)
+    operations = DesignOperation.objects.filter(
+        design_id=design_id, version__gt=design.snapshot_version, version__lte=design.version
+    ).order_by('version').values_list('operation', flat=True)
+    return design, apply_operations(list(design.snapshot), operations)
+
+
+def compact_design(design_id: int) -> Design:
+    """Złóż operacje w snapshot i usuń je - wczytanie projektu znów czyta jeden wiersz i kilka operacji"""
+    with transaction.atomic():
+        design = Design.objects.select_for_update().get(pk=design_id)
+        operations = DesignOperation.objects.filter(
+            design_id=design_id, version__gt=design.snapshot_version, version__lte=design.version
+        ).order_by('version').values_list('operation', flat=True)
+        design.snapshot = apply_operations(list(design.snapshot), operations)
+        design.snapshot_version = design.version
+        design.save(update_fields=['snapshot', 'snapshot_version'])
+        DesignOperation.objects.filter(design_id=design_id, version__lte=design.snapshot_version).delete()
+    return design
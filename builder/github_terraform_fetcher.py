@@ -1,9 +1,151 @@
+import asyncio
+import os
 import requests
 import re
+import tarfile
+import threading
 import time
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 from django.conf import settings
-from django.core.cache import cache
+from .catalog_refresh import CatalogRefresher
+from .catalog_store import get_catalog_store
+from .metrics import phase, record_cache
+
+CACHE_KEY = 'github_terraform_resources_complete'
+
+# Bez tokena (60 requestów/h) listujemy najwyżej tyle usług na crawl - reszta przy kolejnych refreshach
+ANONYMOUS_SERVICE_LIMIT = 50
+
+# internal/services/<usługa>/<plik>_resource.go w dowolnym katalogu głównym archiwum
+CHECKOUT_RESOURCE_FILE_RE = re.compile(r'(?:^|/)internal/services/([^/]+)/([^/]+_resource\.go)$')
+
+
+_refresher: Optional[CatalogRefresher] = None
+_refresher_lock = threading.Lock()
+
+
+def _crawl_catalog(previous):
+    """Crawl dla refreshera: GITHUB_CRAWL_ASYNC = True - listingi na korutynach zamiast puli wątków"""
+    if getattr(settings, 'GITHUB_CRAWL_ASYNC', False):
+        from .async_fetcher import crawl_catalog_async
+        return crawl_catalog_async(previous)
+    return TerraformResourceFetcher().crawl_catalog(previous)
+
+
+def get_catalog_refresher() -> CatalogRefresher:
+    """Jeden refresher na proces, crawl przez świeży TerraformResourceFetcher"""
+    global _refresher
+    refresher = _refresher
+    if refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = CatalogRefresher(
+                    crawl=_crawl_catalog,
+                    store=get_catalog_store(),
+                    key=CACHE_KEY,
+                    interval=getattr(settings, 'GITHUB_CATALOG_REFRESH_INTERVAL', 7200),
+                    jitter=getattr(settings, 'GITHUB_CATALOG_REFRESH_JITTER', 0.1),
+                    backoff=getattr(settings, 'GITHUB_CATALOG_REFRESH_BACKOFF', 60),
+                    backoff_max=getattr(settings, 'GITHUB_CATALOG_REFRESH_BACKOFF_MAX', 3600)
+                )
+            refresher = _refresher
+    return refresher
+
+
+class RateLimitExhausted(Exception):
+    """Budżet API wyczerpany, a reset jest zbyt daleko żeby czekać"""
+
+
+class RateLimitBudget:
+    """Budżet requestów GitHub wg nagłówków X-RateLimit-Remaining / X-RateLimit-Reset"""
+    
+    def __init__(self, limit: int, reserve: int = 5, low_watermark: float = 0.1, max_wait: float = 60.0):
+        self.limit = limit
+        self.remaining = limit
+        self.reset_at = time.time() + 3600
+        self.reserve = reserve              # zostaw kilka requestów na inne ścieżki (check_rate_limit itp.)
+        self.low_watermark = low_watermark  # poniżej tej części limitu zaczynamy rozkładać requesty w czasie
+        self.max_wait = max_wait
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def update(self, headers) -> None:
+        """Aktualizuj budżet z odpowiedzi GitHub"""
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_at = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        
+        with self._lock:
+            if 'X-RateLimit-Limit' in headers:
+                try:
+                    self.limit = int(headers['X-RateLimit-Limit'])
+                except (TypeError, ValueError):
+                    pass
+            if reset_at > self.reset_at + 1:
+                # Nowe okno - ufamy nagłówkowi
+                self.remaining = remaining
+            else:
+                # Odpowiedzi przychodzą w dowolnej kolejności - bierz mniejszą wartość
+                self.remaining = min(self.remaining, remaining)
+            self.reset_at = reset_at
+    
+    def _reserve(self) -> Tuple[bool, float]:
+        """(zarezerwowano, ile czekać) - przy braku rezerwacji po odczekaniu trzeba spróbować ponownie"""
+        with self._lock:
+            now = time.time()
+            if now >= self.reset_at and self.remaining <= self.reserve:
+                # Okno minęło - zakładamy pełny limit do czasu kolejnych nagłówków
+                self.remaining = self.limit
+                self.reset_at = now + 3600
+            
+            available = self.remaining - self.reserve
+            if available <= 0:
+                wait = self.reset_at - now
+                if wait > self.max_wait:
+                    raise RateLimitExhausted(f'GitHub API budget exhausted, resets in {int(wait)}s')
+                return False, wait
+            
+            # Dużo budżetu - bez opóźnień; mało - równomiernie do resetu
+            if available > self.limit * self.low_watermark:
+                wait = 0.0
+            else:
+                interval = max(self.reset_at - now, 0.0) / available
+                slot = max(self._next_slot, now)
+                self._next_slot = slot + interval
+                wait = slot - now
+            self.remaining -= 1
+            return True, wait
+    
+    def acquire(self) -> None:
+        """Zarezerwuj jeden request, czekając jeśli budżet trzeba rozłożyć w czasie"""
+        while True:
+            reserved, wait = self._reserve()
+            if wait > 0:
+                time.sleep(min(wait, self.max_wait))
+            if reserved:
+                return
+    
+    async def acquire_async(self) -> None:
+        """acquire() bez blokowania pętli zdarzeń"""
+        while True:
+            reserved, wait = self._reserve()
+            if wait > 0:
+                await asyncio.sleep(min(wait, self.max_wait))
+            if reserved:
+                return
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset': int(self.reset_at)
+            }
+
 
 class TerraformResourceFetcher:
     def __init__(self):
@@ -22,62 +164,166 @@ class TerraformResourceFetcher:
         # Rate limiting
         self.max_requests_per_hour = 5000 if self.token else 60
         self.request_delay = 0.1 if self.token else 1.0  # seconds
+        self.budget = RateLimitBudget(self.max_requests_per_hour)
+        
+        # Równoległy crawl - domyślnie tylko z tokenem
+        self.max_workers = getattr(settings, 'GITHUB_CRAWL_WORKERS', 8)
+        self.concurrent = getattr(settings, 'GITHUB_CRAWL_CONCURRENT', bool(self.token))
+        
+        # Jedna sesja = keep-alive i pula połączeń dla wszystkich wątków
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(self.max_workers, 1))
+        self.session.mount('https://', adapter)
+        self.session.headers.update(self.headers)
+    
+    def _request(self, url: str, timeout: float) -> requests.Response:
+        """GET przez wspólną sesję, z rezerwacją budżetu i aktualizacją z nagłówków"""
+        self.budget.acquire()
+        with phase('fetch'):
+            response = self.session.get(url, timeout=timeout)
+        self.budget.update(response.headers)
+        return response
     
     def get_terraform_resources(self) -> List[Dict]:
         """Pobierz wszystkie zasoby Terraform z GitHub"""
         
-        # Sprawdź cache
-        cached_resources = cache.get('github_terraform_resources_complete')
-        if cached_resources:
-            print(f"Using cached resources: {len(cached_resources)} items")
-            return cached_resources
+        # Stale-while-revalidate: zawsze oddaj bieżący katalog od razu, odświeżanie w tle
+        refresher = get_catalog_refresher()
+        catalog = refresher.current
         
-        try:
-            print("Fetching all Terraform resources from GitHub...")
-            
-            # Pobierz wszystkie katalogi usług
-            service_dirs = self._get_all_service_directories()
-            if not service_dirs:
-                print("No service directories found, using fallback")
-                return self._get_fallback_resources()
-            
-            print(f"Found {len(service_dirs)} service directories")
-            
-            # Pobierz zasoby z każdego katalogu
-            all_resources = []
-            processed_count = 0
+        record_cache('github_catalog', catalog is not None and not refresher.is_stale(catalog))
+        if catalog is None:
+            # Katalog jeszcze nigdy nie zbudowany - fallback do czasu pierwszego crawla
+            refresher.trigger()
+            return self._get_fallback_resources()
+        
+        if refresher.is_stale(catalog):
+            refresher.trigger()
+        
+        return catalog.resources
+    
+    def crawl_catalog(self, previous=None) -> Optional[Tuple[List[Dict], Dict]]:
+        """Crawl GitHub, bez cache i bez fallbacku - używany przez CatalogRefresher
+        
+        Przy poprzednim katalogu listujemy ponownie tylko usługi, których SHA katalogu się zmieniło
+        """
+        print("Fetching all Terraform resources from GitHub...")
+        
+        # Pobierz wszystkie katalogi usług
+        service_dirs = self._get_all_service_directories()
+        if not service_dirs:
+            print("No service directories found")
+            return None
+        
+        changed_dirs = self._changed_service_dirs(service_dirs, previous)
+        print(f"Found {len(service_dirs)} service directories, {len(changed_dirs)} changed")
+        
+        # Pobierz zasoby z każdego zmienionego katalogu
+        if not changed_dirs:
+            results = {}
+        elif self.concurrent:
+            results = self._crawl_concurrent(changed_dirs)
+        else:
+            results = self._crawl_serial(changed_dirs)
+        
+        return self._merge_crawl(service_dirs, results, previous, listed=len(changed_dirs))
+    
+    @staticmethod
+    def _previous_service_shas(previous) -> Dict[str, str]:
+        return (previous.meta.get('service_shas') or {}) if previous else {}
+    
+    def _changed_service_dirs(self, service_dirs: List[Dict], previous) -> List[Dict]:
+        """Katalogi do ponownego listowania - SHA katalogu zmienia się przy każdej zmianie plików w nim"""
+        previous_shas = self._previous_service_shas(previous)
+        return [
+            service_dir for service_dir in service_dirs
+            if not service_dir.get('sha') or previous_shas.get(service_dir['name']) != service_dir['sha']
+        ]
+    
+    def _merge_crawl(self, service_dirs: List[Dict], results: Dict[str, Optional[List[Dict]]],
+                     previous, listed: int) -> Tuple[List[Dict], Dict]:
+        """Nowe listingi + niezmienione usługi z poprzedniego katalogu -> (resources, meta)"""
+        previous_shas = self._previous_service_shas(previous)
+        previous_by_service = {}
+        if previous_shas:
+            for resource in previous.resources:
+                previous_by_service.setdefault(resource.get('service'), []).append(resource)
+        
+        # Scal w kolejności listingu; usługi usunięte z repo wypadają z katalogu
+        all_resources = []
+        service_shas = {}
+        for service_dir in service_dirs:
+            service_name = service_dir['name']
+            resources = results.get(service_name)
+            if resources is not None:
+                all_resources.extend(resources)
+                if service_dir.get('sha'):
+                    service_shas[service_name] = service_dir['sha']
+            else:
+                # Niezmieniona albo nieudana - stare wpisy i stare SHA (nieudana zostanie ponowiona przy następnym refreshu)
+                all_resources.extend(previous_by_service.get(service_name, []))
+                if service_name in previous_shas:
+                    service_shas[service_name] = previous_shas[service_name]
+        
+        print(f"Total resources found: {len(all_resources)}")
+        
+        return all_resources, {
+            'source': 'github',
+            'service_shas': service_shas,
+            'services_listed': listed
+        }
+    
+    def _crawl_serial(self, service_dirs: List[Dict]) -> Dict[str, Optional[List[Dict]]]:
+        """Katalog po katalogu ze stałym opóźnieniem (tryb bez tokena); brak klucza = usługa pominięta"""
+        results = {}
+        processed_count = 0
+        
+        for service_dir in service_dirs:
+            service_name = service_dir['name']
+            print(f"Processing service: {service_name} ({processed_count + 1}/{len(service_dirs)})")
             
-            for service_dir in service_dirs:
-                service_name = service_dir['name']
-                print(f"Processing service: {service_name} ({processed_count + 1}/{len(service_dirs)})")
-                
+            try:
                 resources = self._get_resources_from_service(service_name)
-                if resources:
-                    all_resources.extend(resources)
-                    print(f"  Found {len(resources)} resources")
-                
-                processed_count += 1
-                
-                # Rate limiting
-                time.sleep(self.request_delay)
-                
-                # Zatrzymaj po 100 usługach jeśli bez tokena (limit API)
-                if not self.token and processed_count >= 50:
-                    print("Reached API limit without token, stopping...")
-                    break
-            
-            print(f"Total resources found: {len(all_resources)}")
-            
-            if all_resources:
-                # Cache na 2 godziny
-                cache.set('github_terraform_resources_complete', all_resources, 7200)
-                return all_resources
-            else:
-                return self._get_fallback_resources()
-                
-        except Exception as e:
-            print(f"Error fetching from GitHub: {e}")
-            return self._get_fallback_resources()
+            except RateLimitExhausted as e:
+                print(f"{e}, stopping...")
+                break
+            results[service_name] = resources
+            if resources:
+                print(f"  Found {len(resources)} resources")
+            
+            processed_count += 1
+            
+            # Rate limiting
+            time.sleep(self.request_delay)
+            
+            # Zatrzymaj po 50 usługach jeśli bez tokena (limit API) - reszta przy kolejnych refreshach
+            if not self.token and processed_count >= ANONYMOUS_SERVICE_LIMIT:
+                print("Reached API limit without token, stopping...")
+                break
+        
+        return results
+    
+    def _crawl_concurrent(self, service_dirs: List[Dict]) -> Dict[str, Optional[List[Dict]]]:
+        """Katalogi równolegle na puli wątków; tempo wyznacza budżet z nagłówków X-RateLimit-*"""
+        print(f"Crawling {len(service_dirs)} services with {self.max_workers} workers "
+              f"(budget: {self.budget.snapshot()['remaining']} requests)")
+        
+        results = {}
+        
+        def crawl(service_name):
+            try:
+                results[service_name] = self._get_resources_from_service(service_name)
+            except RateLimitExhausted:
+                results[service_name] = None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='github-crawl') as executor:
+            list(executor.map(crawl, [service_dir['name'] for service_dir in service_dirs]))
+        
+        skipped = [name for name, resources in results.items() if resources is None]
+        if skipped:
+            print(f"Rate limit budget exhausted or request failed, skipped {len(skipped)} services")
+        
+        return results
     
     def _get_all_service_directories(self) -> List[Dict]:
         """Pobierz wszystkie katalogi usług z GitHub"""
@@ -85,71 +331,129 @@ class TerraformResourceFetcher:
         url = f"{self.base_url}/repos/{self.repo}/contents/internal/services"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = self._request(url, timeout=15)
             
             if response.status_code != 200:
                 print(f"GitHub API returned {response.status_code}")
                 return []
             
-            services = response.json()
-            
-            # Filtruj tylko katalogi
-            service_dirs = [
-                service for service in services 
-                if service.get('type') == 'dir'
-            ]
-            
-            return service_dirs
+            return self._parse_service_directories(response.json())
             
         except requests.RequestException as e:
             print(f"Error fetching service directories: {e}")
             return []
     
-    def _get_resources_from_service(self, service_name: str) -> List[Dict]:
-        """Pobierz zasoby z konkretnej usługi"""
+    def _get_resources_from_service(self, service_name: str) -> Optional[List[Dict]]:
+        """Pobierz zasoby z konkretnej usługi, None gdy listing się nie udał"""
         
         url = f"{self.base_url}/repos/{self.repo}/contents/internal/services/{service_name}"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._request(url, timeout=10)
             
             if response.status_code != 200:
-                return []
+                return None
             
-            service_files = response.json()
-            resources = []
-            
-            # Debug - print first few files
-            if service_name == "compute":
-                print(f"Debug files in {service_name}:")
-                for f in service_files[:5]:
-                    print(f"  {f.get('name')} (type: {f.get('type')})")
-            
-            # Szukaj plików *_resource.go (główny pattern w GitHub)
-            for file in service_files:
-                filename = file.get('name', '')
-                if (file.get('type') == 'file' and 
-                    filename.endswith('_resource.go') and
-                    not filename.endswith('_test.go')):
-                    
-                    resource_name = self._extract_resource_name_from_service_file(filename, service_name)
-                    if resource_name:
-                        display_name = self._generate_display_name(resource_name)
-                        icon = self._get_resource_icon(resource_name, service_name)
-                        category = self._normalize_category_name(service_name)
-                        
-                        resources.append({
-                            'name': resource_name,
-                            'display': display_name,
-                            'icon': icon,
-                            'category': category,
-                            'service': service_name
-                        })
-            
-            return resources
+            return self._parse_service_files(service_name, response.json())
             
         except requests.RequestException:
-            return []
+            return None
+    
+    @staticmethod
+    def _parse_service_directories(services: List[Dict]) -> List[Dict]:
+        # Filtruj tylko katalogi
+        return [
+            service for service in services 
+            if service.get('type') == 'dir'
+        ]
+    
+    def _parse_service_files(self, service_name: str, service_files: List[Dict]) -> List[Dict]:
+        resources = []
+        
+        # Debug - print first few files
+        if service_name == "compute":
+            print(f"Debug files in {service_name}:")
+            for f in service_files[:5]:
+                print(f"  {f.get('name')} (type: {f.get('type')})")
+        
+        # Szukaj plików *_resource.go (główny pattern w GitHub)
+        for file in service_files:
+            if file.get('type') == 'file':
+                resource = self._build_resource(file.get('name', ''), service_name)
+                if resource:
+                    resources.append(resource)
+        
+        return resources
+    
+    def _build_resource(self, filename: str, service_name: str) -> Optional[Dict]:
+        """Wpis katalogu dla pliku {nazwa}_resource.go, None dla innych plików"""
+        if not filename.endswith('_resource.go') or filename.endswith('_test.go'):
+            return None
+        
+        resource_name = self._extract_resource_name_from_service_file(filename, service_name)
+        if not resource_name:
+            return None
+        
+        category = self._normalize_category_name(service_name)
+        return {
+            'name': resource_name,
+            'display': self._generate_display_name(resource_name),
+            'icon': self._get_resource_icon(resource_name, service_name),
+            'category': category,
+            'service': service_name
+        }
+    
+    def get_terraform_resources_from_checkout(self, source) -> List[Dict]:
+        """Zbuduj katalog z lokalnego klonu lub tarballa terraform-provider-azurerm - bez API GitHub"""
+        source = Path(source)
+        if source.is_dir():
+            by_service = self._scan_checkout_directory(source)
+        elif tarfile.is_tarfile(source):
+            by_service = self._scan_checkout_tarball(source)
+        else:
+            raise ValueError(f"{source} is neither a directory nor a tar archive")
+        
+        # Kolejność jak w listingu GitHub: usługi i pliki alfabetycznie
+        all_resources = []
+        for service_name in sorted(by_service):
+            for filename in sorted(by_service[service_name]):
+                resource = self._build_resource(filename, service_name)
+                if resource:
+                    all_resources.append(resource)
+        
+        print(f"Found {len(all_resources)} resources in {len(by_service)} services from {source}")
+        return all_resources
+    
+    def _scan_checkout_directory(self, root: Path) -> Dict[str, List[str]]:
+        """Równoległy walk po internal/services/*/ - jeden scandir na usługę"""
+        services_dir = root if root.name == 'services' and root.parent.name == 'internal' else root / 'internal' / 'services'
+        if not services_dir.is_dir():
+            raise ValueError(f"{services_dir} does not exist - not a terraform-provider-azurerm checkout")
+        
+        with os.scandir(services_dir) as entries:
+            service_dirs = [entry.path for entry in entries if entry.is_dir()]
+        
+        def list_resource_files(path):
+            with os.scandir(path) as entries:
+                return os.path.basename(path), [
+                    entry.name for entry in entries
+                    if entry.name.endswith('_resource.go') and entry.is_file()
+                ]
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='checkout-scan') as executor:
+            return dict(executor.map(list_resource_files, service_dirs))
+    
+    def _scan_checkout_tarball(self, archive_path: Path) -> Dict[str, List[str]]:
+        """Strumieniowo po nagłówkach tar - bez rozpakowywania"""
+        by_service = {}
+        with tarfile.open(archive_path, mode='r:*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                match = CHECKOUT_RESOURCE_FILE_RE.search(member.name)
+                if match:
+                    by_service.setdefault(match.group(1), []).append(match.group(2))
+        return by_service
     
     def _extract_resource_name_from_service_file(self, filename: str, service_name: str) -> Optional[str]:
         """Wyciągnij nazwę zasobu z pliku w formacie {nazwa}_resource.go"""
@@ -384,6 +688,10 @@ class TerraformResourceFetcher:
             'has_token': self.token is not None,
             'max_requests_per_hour': self.max_requests_per_hour,
             'request_delay': self.request_delay,
+            'concurrent': self.concurrent,
+            'max_workers': self.max_workers,
+            'budget': self.budget.snapshot(),
+            'refresh': get_catalog_refresher().stats(),
             'base_url': self.base_url,
             'repo': self.repo
         }
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Runtime icon lookups for Terraform resource types
+Uses the Changes/aa.py mapper (exact mappings, then fuzzy search pruned by the icon token index)
+"""
+
+import importlib
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+from django.conf import settings
+
+from .metrics import phase, record_cache
+
+
+def lookup_settings() -> Dict:
+    base_dir = Path(settings.BASE_DIR)
+    return {
+        'mapper_dir': Path(getattr(settings, 'ICON_MAPPER_DIR', base_dir / 'Changes')),
+        'icons_dir': Path(getattr(settings, 'ICON_DIR', base_dir / 'Changes' / 'icons')),
+        # Manifest skanu ikon w katalogu cache, nie w drzewie źródeł; zapisywany tylko przez build_icon_sprites
+        'manifest_path': Path(getattr(
+            settings, 'ICON_MANIFEST_PATH',
+            Path(getattr(settings, 'ICON_SPRITES_DIR', base_dir / 'icon_sprites')) / 'icon_manifest_mapper.json'
+        )),
+    }
+
+
+def import_changes_module(name: str):
+    """Moduł skryptu z pakietu Changes (aa, azure_nav_generator)"""
+    return importlib.import_module(f'Changes.{name}')
+
+
+_mapper = None
+_mapper_lock = threading.Lock()
+
+
+def get_icon_mapper():
+    """Per-process AzureIconMapper with the icon catalog scanned once (manifest makes rescans cheap)"""
+    global _mapper
+    mapper = _mapper
+    record_cache('icon_mapper', mapper is not None)
+    if mapper is None:
+        with _mapper_lock, phase('catalog_build'):
+            if _mapper is None:
+                config = lookup_settings()
+                aa = import_changes_module('aa')
+                loaded = aa.AzureIconMapper(icons_path=config['icons_dir'])
+                # Worker WWW tylko czyta manifest - bez zapisu w ścieżce requestu
+                loaded.icons_cache = loaded.scan_icons(config['manifest_path'], save_manifest=False)
+                _mapper = loaded
+            mapper = _mapper
+    return mapper
+
+
+def write_icon_manifest() -> int:
+    """Przeskanuj ikony i zapisz manifest (ICON_MANIFEST_PATH) - krok wdrożenia, nie requestu"""
+    config = lookup_settings()
+    config['manifest_path'].parent.mkdir(parents=True, exist_ok=True)
+    mapper = import_changes_module('aa').AzureIconMapper(icons_path=config['icons_dir'])
+    return len(mapper.scan_icons(config['manifest_path'], save_manifest=True))
+
+
+@lru_cache(maxsize=4096)
+def _lookup(resource_type: str) -> Dict:
+    return get_icon_mapper().find_icon_for_resource(resource_type)
+
+
+def lookup_icon(resource_type: str) -> Dict:
+    """{'icon_path', 'icon_filename', 'confidence', 'method'} for one resource type"""
+    return dict(_lookup(resource_type))
@@ -0,0 +1,401 @@
+"""
+SVG sprite sheets for the icons referenced by Changes/Nav.json
+One minified sheet per category with shared, deduplicated defs, named by content hash
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from html import escape
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .catalog import CatalogEntry, _compressed_variants, encode_entry
+from .metrics import phase, record_cache
+
+SVG_TYPE = 'image/svg+xml'
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+XML_NS = '{http://www.w3.org/XML/1998/namespace}'
+
+# Podbij przy zmianie formatu manifestu lub arkuszy
+SPRITES_VERSION = 1
+
+# Elementy przenoszone do wspólnego <defs> arkusza (deduplikowane po treści)
+DEF_TAGS = frozenset(('linearGradient', 'radialGradient', 'clipPath', 'mask', 'pattern', 'filter'))
+DROP_TAGS = frozenset(('title', 'desc', 'metadata'))
+DROP_ATTRIBUTES = frozenset(('data-name',))
+# Atrybuty korzenia <svg>, które nie przechodzą na <symbol>
+ROOT_ATTRIBUTES = frozenset(('id', 'width', 'height', 'viewBox', 'version', 'x', 'y'))
+
+URL_REF_RE = re.compile(r'url\(#([^)]+)\)')
+CSS_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+ICON_FILENAME_RE = re.compile(r'^(\d+)-icon-service-(.+)\.svg$', re.IGNORECASE)
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+
+def slugify(value: str) -> str:
+    return SLUG_RE.sub('-', value.lower()).strip('-') or 'icons'
+
+
+def symbol_id_for(filename: str) -> str:
+    """10035-icon-service-App-Services.svg -> i10035-app-services"""
+    match = ICON_FILENAME_RE.match(filename)
+    if match:
+        return f'i{match.group(1)}-{slugify(match.group(2))}'
+    return f'i-{slugify(filename[:-4] if filename.endswith(".svg") else filename)}'
+
+
+def _local_name(name: str) -> Optional[str]:
+    """Tag/atrybut bez przestrzeni nazw SVG; None dla obcych przestrzeni (Inkscape itp.)"""
+    if not name.startswith('{'):
+        return name
+    if name.startswith(f'{{{SVG_NS}}}'):
+        return name[len(SVG_NS) + 2:]
+    if name == XLINK_HREF:
+        return 'href'
+    if name.startswith(XML_NS):
+        return 'xml:' + name[len(XML_NS):]
+    return None
+
+
+def serialize(element: ET.Element) -> str:
+    """Minimal XML: no whitespace between tags, no namespace prefixes, self-closed empty elements"""
+    parts = []
+    _serialize(element, parts)
+    return ''.join(parts)
+
+
+def _serialize(element: ET.Element, parts: List[str]) -> None:
+    tag = _local_name(element.tag)
+    if tag is None:
+        return
+    parts.append('<' + tag)
+    for name, value in element.attrib.items():
+        name = _local_name(name)
+        if name is not None:
+            parts.append(f' {name}="{escape(value)}"')
+    text = (element.text or '').strip()
+    if not text and not len(element):
+        parts.append('/>')
+        return
+    parts.append('>')
+    if text:
+        parts.append(escape(text, quote=False))
+    for child in element:
+        _serialize(child, parts)
+    parts.append(f'</{tag}>')
+
+
+def _references(element: ET.Element) -> List[str]:
+    """Ids referenced by url(#...) / href="#..." in attributes and <style> text"""
+    found = []
+    for node in element.iter():
+        for name, value in node.attrib.items():
+            if _local_name(name) == 'href' and value.startswith('#'):
+                found.append(value[1:])
+            else:
+                found.extend(URL_REF_RE.findall(value))
+        if node.text and _local_name(node.tag) == 'style':
+            found.extend(URL_REF_RE.findall(node.text))
+    return found
+
+
+def _rewrite_references(element: ET.Element, renames: Dict[str, str]) -> None:
+    def url(match):
+        return f'url(#{renames.get(match.group(1), match.group(1))})'
+
+    for node in element.iter():
+        for name, value in list(node.attrib.items()):
+            if _local_name(name) == 'href' and value.startswith('#'):
+                node.set(name, '#' + renames.get(value[1:], value[1:]))
+            elif 'url(#' in value:
+                node.set(name, URL_REF_RE.sub(url, value))
+        if node.text and _local_name(node.tag) == 'style':
+            node.text = URL_REF_RE.sub(url, node.text)
+
+
+class SpriteSheet:
+    """<symbol> per icon plus one <defs> shared by all symbols of the sheet"""
+
+    def __init__(self):
+        self.symbols: List[str] = []
+        self.symbol_ids = set()
+        self.defs: List[str] = []
+        self._defs_by_content: Dict[str, str] = {}
+
+    def add_icon(self, symbol_id: str, svg: bytes) -> str:
+        """Add one icon file, return its final (sheet-unique) symbol id"""
+        base, counter = symbol_id, 2
+        while symbol_id in self.symbol_ids:
+            symbol_id = f'{base}-{counter}'
+            counter += 1
+        self.symbol_ids.add(symbol_id)
+
+        root = ET.fromstring(svg)
+        self._strip(root)
+        self._scope_classes(root, symbol_id)
+
+        referenced = set(_references(root))
+        renames = {}
+        definitions = []
+        local_ids = 0
+        parents = {child: parent for parent in root.iter() for child in parent}
+        for node in list(root.iter()):
+            node_id = node.get('id')
+            if node is root or node_id is None:
+                continue
+            if node_id not in referenced:
+                # Id bez odwołań - w arkuszu tylko by kolidowały
+                del node.attrib['id']
+            elif _local_name(node.tag) in DEF_TAGS:
+                parents[node].remove(node)
+                definitions.append(node)
+            else:
+                local_ids += 1
+                renames[node_id] = f'{symbol_id}-{local_ids}'
+                node.set('id', renames[node_id])
+
+        # Definicje bez nierozwiązanych odwołań najpierw - gradient z href do innego gradientu po nim
+        pending = definitions
+        while pending:
+            pending_ids = {node.get('id') for node in pending}
+            ready = [node for node in pending if not pending_ids.intersection(_references(node)) - {node.get('id')}]
+            if not ready:
+                ready = pending  # cykl - rzadkie, dedup i tak działa po treści
+            for node in ready:
+                original_id = node.attrib.pop('id')
+                _rewrite_references(node, renames)
+                content = serialize(node)
+                shared_id = self._defs_by_content.get(content)
+                if shared_id is None:
+                    shared_id = f'd{len(self.defs)}'
+                    self._defs_by_content[content] = shared_id
+                    node.set('id', shared_id)
+                    self.defs.append(serialize(node))
+                renames[original_id] = shared_id
+            pending = [node for node in pending if node not in ready]
+
+        _rewrite_references(root, renames)
+
+        attributes = {'id': symbol_id}
+        if root.get('viewBox'):
+            attributes['viewBox'] = root.get('viewBox')
+        elif root.get('width') and root.get('height'):
+            attributes['viewBox'] = f"0 0 {root.get('width')} {root.get('height')}"
+        for name, value in root.attrib.items():
+            name = _local_name(name)
+            if name and name not in ROOT_ATTRIBUTES and name not in attributes:
+                attributes[name] = value
+
+        symbol = ET.Element('symbol', attributes)
+        symbol.extend(child for child in root if not (_local_name(child.tag) == 'defs' and not len(child)))
+        self.symbols.append(serialize(symbol))
+        return symbol_id
+
+    @staticmethod
+    def _strip(root: ET.Element) -> None:
+        for node in list(root.iter()):
+            for child in list(node):
+                if _local_name(child.tag) in DROP_TAGS or _local_name(child.tag) is None:
+                    node.remove(child)
+            for name in DROP_ATTRIBUTES.intersection(node.attrib):
+                del node.attrib[name]
+
+    @staticmethod
+    def _scope_classes(root: ET.Element, prefix: str) -> None:
+        """.cls-1 z jednej ikony nie może nadpisać .cls-1 innej ikony w tym samym arkuszu"""
+        for node in root.iter():
+            if node.get('class'):
+                node.set('class', ' '.join(f'{prefix}-{name}' for name in node.get('class').split()))
+            if node.text and _local_name(node.tag) == 'style':
+                node.text = CSS_CLASS_RE.sub(lambda match: f'.{prefix}-{match.group(1)}', node.text)
+
+    def to_bytes(self) -> bytes:
+        defs = f"<defs>{''.join(self.defs)}</defs>" if self.defs else ''
+        return f'<svg xmlns="{SVG_NS}">{defs}{"".join(self.symbols)}</svg>'.encode('utf-8')
+
+
+def load_icon_usage(nav_path, csv_path=None) -> Dict[str, List[Tuple[str, List[str]]]]:
+    """{category: [(icon relative path, [resource_type, ...]), ...]} for icons used in Nav.json"""
+    with open(nav_path, 'r', encoding='utf-8') as f:
+        navigation = json.load(f)
+
+    # Wszystkie typy zasobów usługi z azyre.csv - Nav.json trzyma tylko reprezentanta
+    service_resources = defaultdict(list)
+    if csv_path and Path(csv_path).exists():
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = ((row.get('service_category') or '').strip(), (row.get('service_name') or '').strip())
+                resource_type = (row.get('resource_type') or '').strip()
+                if resource_type and all(key):
+                    service_resources[key].append(resource_type)
+
+    usage = {}
+    for category, category_data in navigation.get('categories', {}).items():
+        by_icon = {}
+        for service in category_data.get('services', []):
+            icon = service.get('icon') or {}
+            if not icon.get('path'):
+                continue
+            resource_types = by_icon.setdefault(icon['path'], [])
+            for resource_type in [service.get('resource_type')] + service_resources.get((category, service.get('name')), []):
+                if resource_type and resource_type not in resource_types:
+                    resource_types.append(resource_type)
+        if by_icon:
+            usage[category] = sorted(by_icon.items())
+    return usage
+
+
+class SpriteBundle:
+    """Built sheets plus the manifest mapping resource_type -> sheet#symbol"""
+
+    def __init__(self, sheets: Dict[str, bytes], manifest: Dict):
+        self.sheets = sheets
+        self.manifest = manifest
+        self.manifest_entry = encode_entry(manifest)
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._lock = threading.Lock()
+
+    def sheet_entry(self, name: str) -> Optional[CatalogEntry]:
+        """Pre-compressed sheet; nazwa zawiera hash treści, więc ETag = hash"""
+        entry = self._entries.get(name)
+        if entry is None:
+            body = self.sheets.get(name)
+            if body is None:
+                return None
+            entry = CatalogEntry(
+                _compressed_variants(SVG_TYPE, body, hashlib.sha256(body).hexdigest()[:32]),
+                media_type=SVG_TYPE
+            )
+            with self._lock:
+                entry = self._entries.setdefault(name, entry)
+        return entry
+
+    def write(self, output_dir) -> None:
+        """Zapisz arkusze i manifest; stare arkusze z innym hashem są usuwane"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for name, body in self.sheets.items():
+            path = output_dir / name
+            if not path.exists():
+                tmp_path = output_dir / f'{name}.{os.getpid()}.tmp'
+                tmp_path.write_bytes(body)
+                os.replace(tmp_path, path)
+        tmp_path = output_dir / f'manifest.json.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output_dir / 'manifest.json')
+        for path in output_dir.glob('*.svg'):
+            if path.name not in self.sheets:
+                path.unlink()
+
+    @classmethod
+    def load(cls, output_dir) -> Optional['SpriteBundle']:
+        output_dir = Path(output_dir)
+        try:
+            with open(output_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != SPRITES_VERSION:
+                return None
+            sheets = {name: (output_dir / name).read_bytes() for name in manifest['sheets'].values()}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(sheets, manifest)
+
+
+def source_fingerprint(nav_path, csv_path, icons_dir) -> Dict:
+    """mtime/rozmiar wejść - zmieniony Nav.json, CSV albo folder ikon wymusza przebudowę"""
+    fingerprint = {}
+    for path in (nav_path, csv_path, icons_dir):
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            continue
+        fingerprint[str(Path(path).name)] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def build_sprite_bundle(nav_path, icons_dir, csv_path=None, base_url: str = '') -> SpriteBundle:
+    """Pack every icon used in Nav.json into one sheet per category"""
+    icons_dir = Path(icons_dir)
+    sheets = {}
+    sheet_names = {}
+    icons = {}
+
+    for category, used_icons in load_icon_usage(nav_path, csv_path).items():
+        sheet = SpriteSheet()
+        placed = []
+        for icon_path, resource_types in used_icons:
+            try:
+                svg = (icons_dir / icon_path).read_bytes()
+                symbol_id = sheet.add_icon(symbol_id_for(Path(icon_path).name), svg)
+            except (OSError, ET.ParseError) as e:
+                print(f"Skipping icon {icon_path}: {e}")
+                continue
+            placed.append((symbol_id, resource_types))
+        if not placed:
+            continue
+
+        body = sheet.to_bytes()
+        name = f'{slugify(category)}.{hashlib.sha256(body).hexdigest()[:12]}.svg'
+        sheets[name] = body
+        sheet_names[category] = name
+        for symbol_id, resource_types in placed:
+            for resource_type in resource_types:
+                icons.setdefault(resource_type, f'{name}#{symbol_id}')
+
+    manifest = {
+        'version': SPRITES_VERSION,
+        'base_url': base_url,
+        'source': source_fingerprint(nav_path, csv_path, icons_dir),
+        'sheets': sheet_names,
+        'icons': dict(sorted(icons.items())),
+    }
+    return SpriteBundle(sheets, manifest)
+
+
+def sprite_settings() -> Dict:
+    base_dir = Path(settings.BASE_DIR)
+    return {
+        'nav_path': Path(getattr(settings, 'ICON_NAV_PATH', base_dir / 'Changes' / 'Nav.json')),
+        'csv_path': Path(getattr(settings, 'ICON_CSV_PATH', base_dir / 'Changes' / 'azyre.csv')),
+        'icons_dir': Path(getattr(settings, 'ICON_DIR', base_dir / 'Changes' / 'icons')),
+        'output_dir': Path(getattr(settings, 'ICON_SPRITES_DIR', base_dir / 'icon_sprites')),
+        'base_url': getattr(settings, 'ICON_SPRITES_URL', '/api/icons/sprites/'),
+    }
+
+
+_bundle: Optional[SpriteBundle] = None
+_bundle_lock = threading.Lock()
+
+
+def get_sprite_bundle() -> SpriteBundle:
+    """Per-process bundle: built sheets from ICON_SPRITES_DIR, rebuilt when the sources changed"""
+    global _bundle
+    bundle = _bundle
+    record_cache('icon_sprites', bundle is not None)
+    if bundle is None:
+        with _bundle_lock, phase('catalog_build'):
+            if _bundle is None:
+                config = sprite_settings()
+                loaded = SpriteBundle.load(config['output_dir'])
+                expected = source_fingerprint(config['nav_path'], config['csv_path'], config['icons_dir'])
+                if loaded is None or loaded.manifest.get('source') != expected \
+                        or loaded.manifest.get('base_url') != config['base_url']:
+                    loaded = build_sprite_bundle(config['nav_path'], config['icons_dir'],
+                                                 config['csv_path'], config['base_url'])
+                    try:
+                        loaded.write(config['output_dir'])
+                    except OSError as e:
+                        print(f"Could not write icon sprites: {e}")
+                _bundle = loaded
+            bundle = _bundle
+    return bundle
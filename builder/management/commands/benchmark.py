@@ -0,0 +1,76 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from builder.benchmarks import (
+    DEFAULT_ALLOC_THRESHOLD, DEFAULT_THRESHOLD, baseline_path, compare, load_baseline, run_benchmark,
+    save_baseline, select_benchmarks
+)
+
+
+class Command(BaseCommand):
+    help = 'Run the catalog/view/icon mapping microbenchmarks and compare them with the saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('patterns', nargs='*', help='Run only benchmarks whose name contains one of these')
+        parser.add_argument('--list', action='store_true', help='List benchmarks and exit')
+        parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+        parser.add_argument('--baseline', help='Baseline JSON file (default: BENCHMARK_BASELINE_PATH)')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed ops/sec drop vs baseline, as a fraction (default: %(default)s)')
+        parser.add_argument('--alloc-threshold', type=float, default=DEFAULT_ALLOC_THRESHOLD,
+                            help='Allowed allocation growth vs baseline, as a fraction (default: %(default)s)')
+        parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per repeat')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed repeats per benchmark (median is used)')
+
+    def handle(self, *args, **options):
+        benchmarks = select_benchmarks(options['patterns'])
+        if not benchmarks:
+            raise CommandError(f"No benchmarks match: {', '.join(options['patterns'])}")
+
+        if options['list']:
+            for benchmark in benchmarks:
+                self.stdout.write(f'{benchmark.name:30} {benchmark.description}')
+            return
+
+        path = options['baseline'] or baseline_path()
+        baseline = load_baseline(path)
+
+        self.stdout.write(f"{'benchmark':30} {'ops/sec':>12} {'spread':>7} {'alloc KiB':>10} "
+                          f"{'kept KiB':>9}  vs baseline")
+        results = []
+        regressions = []
+        # Skrypty z Changes/ logują na INFO przy każdym przebiegu
+        logging.disable(logging.INFO)
+        try:
+            for benchmark in benchmarks:
+                result = run_benchmark(benchmark, min_time=options['min_time'], repeat=options['repeat'])
+                results.append(result)
+
+                expected = baseline.get(benchmark.name)
+                threshold = benchmark.threshold if benchmark.threshold is not None else options['threshold']
+                problems = compare(result, expected, threshold, options['alloc_threshold'])
+                if expected and expected.get('ops_per_sec'):
+                    change = f"{result.ops_per_sec / expected['ops_per_sec'] - 1:+.1%}"
+                else:
+                    change = 'new'
+                line = (f'{result.name:30} {result.ops_per_sec:12,.1f} {result.spread:7.1%} '
+                        f'{result.alloc_kib:10,.1f} {result.retained_kib:9,.1f}  {change}')
+                if problems:
+                    regressions.append((result.name, problems))
+                    self.stdout.write(self.style.ERROR(f'{line}  REGRESSION'))
+                else:
+                    self.stdout.write(line)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if options['save']:
+            save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline for {len(results)} benchmarks to {path}'))
+            return
+
+        if regressions:
+            for name, problems in regressions:
+                for problem in problems:
+                    self.stderr.write(f'{name}: {problem}')
+            raise CommandError(f'{len(regressions)} benchmark(s) regressed')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from builder.icon_lookup import lookup_settings, write_icon_manifest
+from builder.icon_sprites import build_sprite_bundle, sprite_settings
+
+
+class Command(BaseCommand):
+    help = ('Pack the icons used in Nav.json into content-hashed per-category SVG sprite sheets plus a manifest, '
+            'and write the icon scan manifest used by runtime icon lookups')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Output directory (default: ICON_SPRITES_DIR)')
+        parser.add_argument('--nav', help='Navigation JSON with icon paths (default: ICON_NAV_PATH)')
+        parser.add_argument('--icons', help='Icons directory (default: ICON_DIR)')
+
+    def handle(self, *args, **options):
+        config = sprite_settings()
+        nav_path = options['nav'] or config['nav_path']
+        icons_dir = options['icons'] or config['icons_dir']
+        output_dir = options['output'] or config['output_dir']
+
+        try:
+            bundle = build_sprite_bundle(nav_path, icons_dir, config['csv_path'], config['base_url'])
+            bundle.write(output_dir)
+            scanned = write_icon_manifest()
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        total = sum(len(body) for body in bundle.sheets.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(bundle.sheets)} sheets ({total / 1024:.1f} KiB) for "
+            f"{len(bundle.manifest['icons'])} resource types to {output_dir}"
+        ))
+        self.stdout.write(f"Icon scan manifest for {scanned} icons: {lookup_settings()['manifest_path']}")
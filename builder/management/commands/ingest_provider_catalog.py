@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from builder.catalog_store import get_catalog_store
+from builder.github_terraform_fetcher import CACHE_KEY, TerraformResourceFetcher
+
+
+class Command(BaseCommand):
+    help = 'Build the resource catalog from a local terraform-provider-azurerm checkout or tarball (no GitHub API)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path to the provider checkout, its internal/services dir, or a .tar/.tar.gz')
+        parser.add_argument('--output', '-o', help='Write the catalog as JSON to this file')
+        parser.add_argument('--store', action='store_true',
+                            help='Save into the disk catalog cache so workers start without GitHub requests')
+
+    def handle(self, *args, **options):
+        fetcher = TerraformResourceFetcher()
+        try:
+            resources = fetcher.get_terraform_resources_from_checkout(options['source'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['store']:
+            store = get_catalog_store()
+            store.put(CACHE_KEY, resources, meta={'source': 'checkout', 'path': str(options['source'])})
+            self.stdout.write(self.style.SUCCESS(f"Stored {len(resources)} resources in {store.path}"))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'resources': resources, 'total_count': len(resources)}, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(resources)} resources to {options['output']}"))
+        elif not options['store']:
+            self.stdout.write(f'{len(resources)} resources')
@@ -0,0 +1,224 @@
+"""
+Per-view request metrics: latency and size histograms, cache hit/miss counters, request phases
+Counters live in per-thread shards (no lock on the request path), /api/metrics sums them in Prometheus text format
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class RequestTiming:
+    """Czasy faz jednego requestu (sumowane przy wielokrotnym wejściu w fazę)"""
+
+    __slots__ = ('phases', 'cache')
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.cache: List[Tuple[str, bool]] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        parts = []
+        for name, seconds in self.phases.items():
+            parts.append(f'{name};dur={seconds * 1000:.2f}')
+        # Czas widoku bez zmierzonych faz (fazy mogą się zagnieżdżać, więc nie poniżej zera)
+        view = max(total - sum(self.phases.values()), 0.0)
+        parts.append(f'view;dur={view * 1000:.2f}')
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar('request_timing', default=None)
+
+
+@contextmanager
+def request_timing() -> Iterator[RequestTiming]:
+    """Zbieraj fazy i zdarzenia cache dla requestu obsługiwanego w tym kontekście"""
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Mierz fazę bieżącego requestu (catalog_build, fetch, serialize); poza requestem nic nie robi"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Trafienie/chybienie cache w bieżącym requeście - liczone per widok przez middleware"""
+    timing = _current.get()
+    if timing is not None:
+        timing.cache.append((cache, hit))
+
+
+class MetricsRegistry:
+    """Liczniki i histogramy w osobnym słowniku na wątek; odczyt sumuje wszystkie shardy
+
+    Shardy zakończonych wątków (runserver: wątek na połączenie) są przy odczycie doliczane do sumy
+    retired i usuwane, więc pamięć i koszt scrape'a zależą od liczby żywych wątków.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        # ident wątku -> shard
+        self._shards: Dict[int, Dict] = {}
+        self._retired: Dict = {}
+        # Tylko przy rejestracji nowego wątku i przy odczycie, nie przy każdym zapisie
+        self._shards_lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            ident = threading.get_ident()
+            with self._shards_lock:
+                # Ident po zakończonym wątku może zostać użyty ponownie - stary shard do retired
+                previous = self._shards.get(ident)
+                if previous is not None:
+                    _merge(self._retired, previous)
+                self._shards[ident] = shard
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float, buckets: Tuple[float, ...]) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        histogram = shard.get(key)
+        if histogram is None:
+            # Liczności per kubełek (nieskumulowane, ostatni = +Inf), potem suma i liczba obserwacji
+            histogram = shard[key] = [0] * (len(buckets) + 3)
+        index = 0
+        while index < len(buckets) and value > buckets[index]:
+            index += 1
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def observe_request(self, view: str, method: str, status: int, seconds: float,
+                        size: Optional[int], timing: RequestTiming) -> None:
+        labels = (('view', view), ('method', method), ('status', str(status)))
+        self.observe('builder_http_request_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+        if size is not None:
+            self.observe('builder_http_response_size_bytes', (('view', view),), size, SIZE_BUCKETS)
+        for name, phase_seconds in timing.phases.items():
+            self.observe('builder_http_request_phase_seconds', (('view', view), ('phase', name)),
+                         phase_seconds, LATENCY_BUCKETS)
+        for cache, hit in timing.cache:
+            self.inc('builder_cache_requests_total',
+                     (('view', view), ('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+    def collect(self) -> Dict[Tuple[str, Labels], object]:
+        """Suma shardów; list(items()) to jedna operacja pod GIL, więc nie koliduje z zapisami"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        with self._shards_lock:
+            for ident in [ident for ident in self._shards if ident not in alive]:
+                # Martwy wątek już nie pisze - bezpieczne scalenie
+                _merge(self._retired, self._shards.pop(ident))
+            shards = [self._retired] + list(self._shards.values())
+            totals = {}
+            for shard in shards:
+                _merge(totals, shard)
+        return totals
+
+
+def _merge(totals: Dict, shard: Dict) -> None:
+    for key, value in list(shard.items()):
+        if isinstance(value, list):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = list(value)
+            else:
+                for index, item in enumerate(value):
+                    total[index] += item
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+METRIC_HELP = {
+    'builder_http_request_duration_seconds': ('histogram', 'Request latency per view', LATENCY_BUCKETS),
+    'builder_http_response_size_bytes': ('histogram', 'Response body size per view', SIZE_BUCKETS),
+    'builder_http_request_phase_seconds': ('histogram', 'Time spent in request phases per view', LATENCY_BUCKETS),
+    'builder_cache_requests_total': ('counter', 'Cache lookups per view, by cache and result', None),
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render_prometheus(registry: 'MetricsRegistry') -> str:
+    """Prometheus text exposition format 0.0.4 dla tego workera"""
+    totals = registry.collect()
+    by_name: Dict[str, List[Tuple[Labels, object]]] = {}
+    for (name, labels), value in totals.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = [
+        '# HELP builder_worker_start_time_seconds Start time of this worker process',
+        '# TYPE builder_worker_start_time_seconds gauge',
+        f'builder_worker_start_time_seconds{{pid="{os.getpid()}"}} {registry.started_at:.3f}',
+    ]
+    for name, (kind, help_text, buckets) in METRIC_HELP.items():
+        series = sorted(by_name.get(name, []), key=lambda item: item[0])
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, (("le", _format_value(float(bound))),))} '
+                                 f'{cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, (("le", "+Inf"),))} {value[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,144 @@
+"""
+Request instrumentation: per-view metrics into builder.metrics and a Server-Timing header,
+plus opt-in cProfile of sampled requests into builder.profiling
+"""
+
+import cProfile
+import random
+import threading
+import time
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .metrics import registry, request_timing
+from .profiling import get_profile_store, profiling_settings
+
+
+def server_timing_enabled() -> bool:
+    return getattr(settings, 'SERVER_TIMING_HEADER', True)
+
+
+def _view_label(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name or 'unnamed'
+
+
+def _response_size(response) -> Optional[int]:
+    if getattr(response, 'streaming', False):
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    """Latency/size/cache metrics per view and a Server-Timing header with request phases"""
+
+    # Pod ASGI bez przeskoku do wątku na każdym request
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = server_timing_enabled()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with request_timing() as timing:
+            response = self.get_response(request)
+        return self._finish(request, response, timing, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with request_timing() as timing:
+            response = await self.get_response(request)
+        return self._finish(request, response, timing, started)
+
+    def _finish(self, request, response, timing, started: float):
+        elapsed = time.perf_counter() - started
+        registry.observe_request(_view_label(request), request.method, response.status_code,
+                                 elapsed, _response_size(response), timing)
+        if self.server_timing:
+            response['Server-Timing'] = timing.server_timing(elapsed)
+        return response
+
+
+class ProfilingMiddleware:
+    """cProfile for staff ?profile=1 requests and PROFILING_SAMPLE_RATE of all others
+
+    Must come after AuthenticationMiddleware. An unsampled request costs one substring check
+    (and one random() when sampling is on). Streaming responses are profiled only up to the view's return.
+    Under ASGI the profile also contains other coroutines that ran on the event loop meanwhile.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = profiling_settings()['sample_rate']
+        self.store = get_profile_store()
+        # cProfile działa per wątek - pod ASGI na pętli zdarzeń naraz tylko jeden profilowany request
+        self._loop_state = threading.local()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _profile_requested(request) -> bool:
+        return 'profile=' in request.META.get('QUERY_STRING', '') and request.GET.get('profile') == '1'
+
+    @staticmethod
+    def _is_staff(request) -> bool:
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_active and user.is_staff
+
+    def _sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not ((self._profile_requested(request) and self._is_staff(request)) or self._sampled()):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._store(request, response, profiler, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # request.user jest leniwy - pod ASGI odczyt sesji i użytkownika z bazy tylko w wątku
+        requested = self._profile_requested(request) and await sync_to_async(self._is_staff)(request)
+        if not (requested or self._sampled()) or getattr(self._loop_state, 'profiling', False):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        self._loop_state.profiling = True
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+            self._loop_state.profiling = False
+        return self._store(request, response, profiler, time.perf_counter() - started)
+
+    def _store(self, request, response, profiler: cProfile.Profile, duration: float):
+        try:
+            name = self.store.save(profiler, _view_label(request), duration)
+        except OSError as e:
+            print(f"Could not store request profile: {e}")
+            return response
+        response['X-Profile'] = name
+        return response
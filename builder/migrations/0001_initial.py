@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Design',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('snapshot', models.JSONField(default=list)),
+                ('snapshot_version', models.PositiveIntegerField(default=0)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DesignOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('operation', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('design', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='builder.design')),
+            ],
+            options={
+                'ordering': ['design', 'version'],
+                'constraints': [models.UniqueConstraint(fields=('design', 'version'), name='unique_design_operation_version')],
+            },
+        ),
+    ]
@@ -1,3 +1,36 @@
 from django.db import models
 
-# Create your models here.
+
+class Design(models.Model):
+    """Projekt z canvasu: skompaktowany snapshot + operacje zapisane po nim (DesignOperation)"""
+
+    name = models.CharField(max_length=200, blank=True)
+    # Lista zasobów canvasu po zastosowaniu operacji do snapshot_version włącznie
+    snapshot = models.JSONField(default=list)
+    snapshot_version = models.PositiveIntegerField(default=0)
+    # Numer ostatniej zapisanej operacji
+    version = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name or f'Design {self.pk}'
+
+
+class DesignOperation(models.Model):
+    """Jedna edycja canvasu (add / move / remove / clear) o numerze version w obrębie projektu"""
+
+    design = models.ForeignKey(Design, on_delete=models.CASCADE, related_name='operations')
+    version = models.PositiveIntegerField()
+    operation = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['design', 'version']
+        constraints = [
+            # Dwa równoległe zapisy z tym samym numerem - drugi dostaje IntegrityError zamiast rozjechanej historii
+            models.UniqueConstraint(fields=['design', 'version'], name='unique_design_operation_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.design_id}@{self.version}: {self.operation.get('op')}"
@@ -0,0 +1,119 @@
+"""
+Opt-in request profiling: cProfile for staff ?profile=1 requests and a random sample (PROFILING_SAMPLE_RATE) of the rest
+Results are pstats files in a bounded on-disk ring, listed by view and duration in a staff view
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+PROFILE_SUFFIX = '.pstats'
+# {ms od epoki}-{widok}-{czas w µs}-{id}.pstats - lista profili bez otwierania plików
+PROFILE_NAME_RE = re.compile(r'^(\d+)-([A-Za-z0-9_.]+)-(\d+)-([0-9a-f]+)\.pstats$')
+VIEW_LABEL_RE = re.compile(r'[^A-Za-z0-9_.]+')
+
+
+def profiling_settings() -> Dict:
+    return {
+        'sample_rate': float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)),
+        'directory': Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles')),
+        'max_files': int(getattr(settings, 'PROFILING_MAX_FILES', 100)),
+    }
+
+
+@dataclass(frozen=True)
+class StoredProfile:
+    name: str
+    created_at: float
+    view: str
+    duration: float
+    size: int
+
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'created_at': self.created_at,
+            'view': self.view,
+            'duration_ms': round(self.duration * 1000, 2),
+            'size': self.size,
+        }
+
+
+class ProfileStore:
+    """Katalog z plikami pstats; po każdym zapisie usuwane są najstarsze ponad max_files"""
+
+    def __init__(self, directory, max_files: int = 100):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, profiler: cProfile.Profile, view: str, duration: float) -> str:
+        view = VIEW_LABEL_RE.sub('_', view) or 'unnamed'
+        name = f'{int(time.time() * 1000)}-{view}-{int(duration * 1_000_000)}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Zapis atomowy - lista nigdy nie pokazuje połowy pliku
+        tmp_path = self.directory / f'.{name}.{os.getpid()}.tmp'
+        profiler.dump_stats(tmp_path)
+        os.replace(tmp_path, self.directory / name)
+        self.prune()
+        return name
+
+    def _names(self) -> List[str]:
+        try:
+            with os.scandir(self.directory) as entries:
+                return sorted(entry.name for entry in entries if PROFILE_NAME_RE.match(entry.name))
+        except FileNotFoundError:
+            return []
+
+    def prune(self) -> None:
+        names = self._names()
+        for name in names[:max(len(names) - self.max_files, 0)]:
+            try:
+                os.remove(self.directory / name)
+            except FileNotFoundError:
+                pass  # inny worker usunął go pierwszy
+
+    def list(self) -> List[StoredProfile]:
+        profiles = []
+        for name in self._names():
+            match = PROFILE_NAME_RE.match(name)
+            try:
+                size = os.stat(self.directory / name).st_size
+            except FileNotFoundError:
+                continue
+            profiles.append(StoredProfile(
+                name=name,
+                created_at=int(match.group(1)) / 1000,
+                view=match.group(2),
+                duration=int(match.group(3)) / 1_000_000,
+                size=size
+            ))
+        return profiles
+
+    def path(self, name: str) -> Optional[Path]:
+        """Ścieżka profilu albo None - tylko nazwy z ringu, bez wychodzenia poza katalog"""
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+def get_profile_store() -> ProfileStore:
+    config = profiling_settings()
+    return ProfileStore(config['directory'], config['max_files'])
+
+
+def profile_summary(path, sort: str = 'cumulative', limit: int = 60) -> str:
+    """Tekstowe podsumowanie pstats: najdroższe funkcje wg sort"""
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
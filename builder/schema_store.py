@@ -0,0 +1,188 @@
+"""
+Memory-mapped schema store for azure_resources_formatted.json
+Byte-offset index built once, single resource schemas parsed on demand
+"""
+
+import json
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+# Stringi (z escape'ami) albo nawiasy - wszystko inne pomijamy przy skanowaniu
+TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+INDEX_VERSION = 1
+
+
+def scan_offsets(buffer) -> Tuple[Dict[str, Tuple[int, int]], Optional[Tuple[int, int]]]:
+    """Return {resource_name: (start, end)} for entries of top-level "resources" and the metadata span"""
+    offsets = {}
+    metadata_span = None
+
+    depth = 0
+    top_key = None          # ostatni klucz na poziomie 1
+    resources_depth = None  # głębokość wnętrza obiektu "resources"
+    entry_key = None
+    entry_start = None
+    metadata_start = None
+
+    for match in TOKEN_RE.finditer(buffer):
+        token = match.group()
+        first = token[:1]
+
+        if first == b'"':
+            if depth == 1:
+                top_key = token
+            elif resources_depth is not None and depth == resources_depth and entry_start is None:
+                entry_key = token
+            continue
+
+        if first in (b'{', b'['):
+            depth += 1
+            if depth == 2 and first == b'{':
+                if top_key == b'"resources"':
+                    resources_depth = 2
+                elif top_key == b'"metadata"':
+                    metadata_start = match.start()
+            elif resources_depth is not None and depth == resources_depth + 1 and entry_key is not None:
+                entry_start = match.start()
+        else:
+            if resources_depth is not None and depth == resources_depth + 1 and entry_start is not None:
+                offsets[json.loads(entry_key)] = (entry_start, match.end())
+                entry_key = entry_start = None
+            elif depth == 2:
+                if metadata_start is not None and top_key == b'"metadata"':
+                    metadata_span = (metadata_start, match.end())
+                    metadata_start = None
+                if top_key == b'"resources"':
+                    resources_depth = None
+            depth -= 1
+
+    return offsets, metadata_span
+
+
+class SchemaStore:
+    """Per-resource schema lookup over a mmapped schema file with an LRU of parsed entries"""
+
+    def __init__(self, path, cache_size: int = 128, index_path=None):
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self.index_path = Path(index_path) if index_path else self.path.with_name(self.path.name + '.offsets.json')
+
+        self._file = open(self.path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._metadata = None
+
+        self._offsets, self._metadata_span = self._load_or_build_index()
+
+    def fingerprint(self) -> Dict:
+        stat = os.stat(self.path)
+        return {'version': INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_or_build_index(self):
+        """Reuse persisted offsets when the schema file is unchanged, otherwise rescan"""
+        fingerprint = self.fingerprint()
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get('fingerprint') == fingerprint:
+                offsets = {name: tuple(span) for name, span in stored['offsets'].items()}
+                metadata_span = tuple(stored['metadata']) if stored.get('metadata') else None
+                return offsets, metadata_span
+        except (OSError, ValueError, KeyError):
+            pass
+
+        offsets, metadata_span = scan_offsets(self._mm)
+
+        # Zapis atomowy; brak uprawnień do katalogu nie jest błędem
+        tmp_path = self.index_path.with_name(f'{self.index_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': fingerprint, 'offsets': offsets, 'metadata': metadata_span}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+        return offsets, metadata_span
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, name):
+        return name in self._offsets
+
+    def names(self) -> List[str]:
+        """Resource names in file order"""
+        return list(self._offsets)
+
+    @property
+    def metadata(self) -> Dict:
+        if self._metadata is None:
+            if self._metadata_span:
+                start, end = self._metadata_span
+                self._metadata = json.loads(self._mm[start:end])
+            else:
+                self._metadata = {}
+        return self._metadata
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Parsed schema of one resource (shared object - do not mutate)"""
+        with self._lock:
+            schema = self._cache.get(name)
+            if schema is not None:
+                self._cache.move_to_end(name)
+                return schema
+
+        span = self._offsets.get(name)
+        if span is None:
+            return None
+        schema = json.loads(self._mm[span[0]:span[1]])
+
+        with self._lock:
+            self._cache[name] = schema
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return schema
+
+    def iter_schemas(self) -> Iterator[Tuple[str, Dict]]:
+        """All schemas in file order, parsed one by one without going through the LRU"""
+        for name, (start, end) in self._offsets.items():
+            yield name, json.loads(self._mm[start:end])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+_store: Optional[SchemaStore] = None
+_store_lock = threading.Lock()
+
+
+def get_schema_store() -> Optional[SchemaStore]:
+    """Return per-process store for the configured schema file, sample file when the full one is missing"""
+    global _store
+    store = _store
+    if store is None:
+        with _store_lock:
+            if _store is None:
+                base_dir = Path(settings.BASE_DIR)
+                candidates = [
+                    Path(getattr(settings, 'TERRAFORM_SCHEMA_PATH',
+                                 base_dir / 'azure_terraform_complete_schemas' / 'azure_resources_formatted.json')),
+                    base_dir / 'Changes' / 'sample_azure_resources.json',
+                ]
+                for path in candidates:
+                    if path.exists():
+                        _store = SchemaStore(path, cache_size=getattr(settings, 'SCHEMA_CACHE_SIZE', 128))
+                        break
+            store = _store
+    return store
@@ -0,0 +1,221 @@
+"""
+Full-text search over all Azure Terraform resources
+Token + prefix inverted index built once per process from the schema name list and Nav.json
+"""
+
+import heapq
+import json
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import phase, record_cache
+from .static_resources import StaticResourceProvider
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """azurerm_virtual_network / 'Virtual Network' -> ['virtual', 'network']"""
+    return TOKEN_RE.findall(text.lower().replace('_', ' '))
+
+
+@dataclass(frozen=True)
+class SearchDocument:
+    kind: str  # resource / service / category
+    name: str
+    display: str
+    icon: str
+    category: str
+
+    def as_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'display': self.display,
+            'icon': self.icon,
+            'category': self.category
+        }
+
+
+class ResourceSearchIndex:
+    """Inverted index: exact token postings plus every token prefix"""
+
+    # Bonus for exact token hits vs. prefix-only hits
+    EXACT_WEIGHT = 2.0
+    PREFIX_WEIGHT = 1.0
+    PHRASE_BONUS = 1.0
+
+    def __init__(self, documents: List[SearchDocument]):
+        self.documents = documents
+        self._name_lengths = [len(doc.name) for doc in documents]
+        self._phrases = []
+        exact = defaultdict(set)
+        prefix = defaultdict(set)
+        leading = defaultdict(set)
+
+        for doc_id, doc in enumerate(documents):
+            name_tokens = tokenize(doc.name)
+            if name_tokens and name_tokens[0] == 'azurerm':
+                name_tokens = name_tokens[1:]
+            display_tokens = tokenize(doc.display)
+            self._phrases.append((tuple(name_tokens), tuple(display_tokens)))
+
+            for token in set(name_tokens) | set(display_tokens) | set(tokenize(doc.name)):
+                exact[token].add(doc_id)
+                for end in range(1, len(token) + 1):
+                    prefix[token[:end]].add(doc_id)
+
+            # Prefiksy pierwszego tokenu - kandydaci do bonusu za frazę
+            for lead in {name_tokens[0] if name_tokens else '', display_tokens[0] if display_tokens else ''}:
+                for end in range(1, len(lead) + 1):
+                    leading[lead[:end]].add(doc_id)
+
+        # Zamroź postingi - przy zapytaniu tylko operacje na zbiorach
+        self._exact = {token: frozenset(ids) for token, ids in exact.items()}
+        self._prefix = {token: frozenset(ids) for token, ids in prefix.items()}
+        self._leading = {token: frozenset(ids) for token, ids in leading.items()}
+
+    def _starts_with_phrase(self, doc_id: int, phrase: List[str]) -> bool:
+        """Query tokens are prefixes of consecutive leading document tokens"""
+        for doc_tokens in self._phrases[doc_id]:
+            if len(doc_tokens) >= len(phrase) and all(
+                    doc_token.startswith(token) for doc_token, token in zip(doc_tokens, phrase)):
+                return True
+        return False
+
+    def search(self, query: str, limit: int = 20, kind: Optional[str] = None) -> List[Dict]:
+        """Return top-k documents matching every query token (as exact token or prefix)"""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        # Najrzadszy token pierwszy - mniejsze przecięcia
+        postings = []
+        for token in query_tokens:
+            ids = self._prefix.get(token)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for ids in postings[1:]:
+            candidates = candidates & ids
+            if not candidates:
+                return []
+
+        if kind:
+            candidates = {doc_id for doc_id in candidates if self.documents[doc_id].kind == kind}
+
+        scores = dict.fromkeys(candidates, self.PREFIX_WEIGHT * len(query_tokens))
+        exact_bonus = self.EXACT_WEIGHT - self.PREFIX_WEIGHT
+        empty = frozenset()
+        for token in query_tokens:
+            for doc_id in candidates & self._exact.get(token, empty):
+                scores[doc_id] += exact_bonus
+
+        phrase = query_tokens[1:] if query_tokens[0] == 'azurerm' and len(query_tokens) > 1 else query_tokens
+        for doc_id in candidates & self._leading.get(phrase[0], empty):
+            if len(phrase) == 1 or self._starts_with_phrase(doc_id, phrase):
+                scores[doc_id] += self.PHRASE_BONUS
+
+        # Krótsze nazwy wyżej przy remisie
+        name_lengths = self._name_lengths
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -name_lengths[item[0]]))
+        results = []
+        for doc_id, score in best:
+            result = self.documents[doc_id].as_dict()
+            result['score'] = score
+            results.append(result)
+        return results
+
+    @classmethod
+    def build(cls, resource_names_path: Path, navigation_path: Path) -> 'ResourceSearchIndex':
+        """Build index from all_resource_names.txt and Nav.json"""
+        return cls(load_search_documents(resource_names_path, navigation_path))
+
+
+def load_search_documents(resource_names_path: Path, navigation_path: Path) -> List[SearchDocument]:
+    """Collect resources, services and categories as search documents"""
+    # Ikony/nazwy ze statycznego katalogu gdzie są dostępne
+    known = {}
+    for resource in StaticResourceProvider.get_flat_list():
+        known.setdefault(resource['name'], resource)
+
+    # Kategoria zasobu z Nav.json (usługa wskazuje reprezentatywny resource_type)
+    navigation = {}
+    if navigation_path.exists():
+        with open(navigation_path, 'r', encoding='utf-8') as f:
+            navigation = json.load(f).get('categories', {})
+
+    resource_categories = {}
+    documents = []
+    for category_name, category_data in navigation.items():
+        documents.append(SearchDocument(
+            kind='category', name=category_name, display=category_name, icon='📂', category=category_name
+        ))
+        for service in category_data.get('services', []):
+            resource_categories.setdefault(service['resource_type'], category_name)
+            documents.append(SearchDocument(
+                kind='service', name=service['resource_type'], display=service['name'],
+                icon='🧩', category=category_name
+            ))
+
+    resource_names = []
+    if resource_names_path.exists():
+        with open(resource_names_path, 'r', encoding='utf-8') as f:
+            resource_names = [line.strip() for line in f if line.strip()]
+    # Zasoby ze statycznego katalogu zawsze wyszukiwalne
+    listed = set(resource_names)
+    resource_names.extend(name for name in known if name not in listed)
+
+    seen = set()
+    for name in resource_names:
+        if name in seen:
+            continue
+        seen.add(name)
+        static = known.get(name)
+        if static:
+            display, icon, category = static['display'], static['icon'], static['category']
+        else:
+            display = ' '.join(word.capitalize() for word in name.replace('azurerm_', '').split('_'))
+            icon, category = '📋', resource_categories.get(name, 'other')
+        documents.append(SearchDocument(kind='resource', name=name, display=display, icon=icon, category=category))
+
+    return documents
+
+
+_index: Optional[ResourceSearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> ResourceSearchIndex:
+    """Return the per-process index, building it on first use"""
+    global _index
+    index = _index
+    record_cache('search_index', index is not None)
+    if index is None:
+        with _index_lock, phase('catalog_build'):
+            if _index is None:
+                base_dir = Path(settings.BASE_DIR)
+                _index = ResourceSearchIndex.build(
+                    Path(getattr(settings, 'RESOURCE_NAMES_PATH',
+                                 base_dir / 'azure_terraform_complete_schemas' / 'all_resource_names.txt')),
+                    Path(getattr(settings, 'NAVIGATION_PATH', base_dir / 'Changes' / 'Nav.json'))
+                )
+            index = _index
+    return index
+
+
+async def get_search_index_async() -> ResourceSearchIndex:
+    """get_search_index for async views - the one-time build runs in a thread, not on the event loop"""
+    if _index is None:
+        return await sync_to_async(get_search_index, thread_sensitive=False)()
+    return get_search_index()
@@ -0,0 +1,378 @@
+"""
+Schema-driven Terraform (HCL) generation
+One compiled render template per resource type, built on first use from the schema store
+"""
+
+import json
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .dependency_graph import DependencyCycle, Reference, ReferenceIndex, build_design_graph, get_reference_index
+from .schema_store import get_schema_store
+
+TERRAFORM_HEADER = '''terraform {
+  required_version = ">= 1.0"
+  required_providers {
+    azurerm = {
+      source  = "hashicorp/azurerm"
+      version = "~> 4.0"
+    }
+  }
+}
+
+provider "azurerm" {
+  features {}
+}
+
+# Resource Group - Foundation
+resource "azurerm_resource_group" "main" {
+  name     = "rg-terraform-builder"
+  location = "East US"
+}
+
+'''
+
+# Atrybuty wiązane z grupą zasobów zamiast pustej wartości
+RESOURCE_GROUP_DEFAULTS = {
+    'location': 'azurerm_resource_group.main.location',
+    'resource_group_name': 'azurerm_resource_group.main.name',
+}
+
+# Wartości zerowe wg typu atrybutu w schemacie
+TYPE_DEFAULTS = {
+    'string': '""',
+    'number': '0',
+    'bool': 'false',
+}
+
+# Sloty wyliczane per instancja zasobu
+NAME_SLOT = 'name'
+TAGS_SLOT = 'tags'
+
+# Szablon dla zasobów spoza schematu - to samo co generował przeglądarkowy generateTerraform()
+GENERIC_ATTRIBUTES = ('name', 'location', 'resource_group_name')
+
+LABEL_RE = re.compile(r'[^a-zA-Z0-9_-]')
+# Sprawdzane przez fullmatch - '$' w match() przepuszcza końcowy '\n'
+RESOURCE_TYPE_RE = re.compile(r'azurerm_[a-z0-9_]+')
+IDENTIFIER_RE = re.compile(r'[a-zA-Z_][a-zA-Z0-9_-]*')
+
+# Pola z canvasu wstawiane do HCL jako tekst (etykieta, komentarz, tagi, nagłówek kategorii)
+TEXT_FIELDS = ('category', 'display', 'subcategory', 'label')
+
+
+def to_hcl(value, indent: int = 2) -> str:
+    """Encode a JSON value as an HCL expression"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return json.dumps(value)
+    if isinstance(value, str):
+        # ${ i %{ to interpolacja w HCL - escapujemy
+        return json.dumps(value, ensure_ascii=False).replace('${', '$${').replace('%{', '%%{')
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(to_hcl(item, indent) for item in value) + ']'
+    if isinstance(value, dict):
+        if not value:
+            return '{}'
+        pad = ' ' * (indent + 2)
+        width = max(len(key) for key in value)
+        lines = [
+            f'{pad}{key if IDENTIFIER_RE.fullmatch(key) else json.dumps(key):<{width}} = {to_hcl(item, indent + 2)}'
+            for key, item in value.items()
+        ]
+        return '{\n' + '\n'.join(lines) + '\n' + ' ' * indent + '}'
+    raise TypeError(f'Cannot encode {type(value).__name__} as HCL')
+
+
+@lru_cache(maxsize=256)
+def default_tags(category: str) -> str:
+    """Tags the browser generator used to add, encoded once per category"""
+    return to_hcl({
+        'Environment': 'Development',
+        'CreatedBy': 'TerraformBuilder',
+        'Category': category,
+    })
+
+
+def default_for_type(attribute_type) -> str:
+    """Zero value for a schema type like "string", "list(string)", "map(string)"""
+    if not isinstance(attribute_type, str):
+        return 'null'
+    if attribute_type in TYPE_DEFAULTS:
+        return TYPE_DEFAULTS[attribute_type]
+    if attribute_type.startswith(('list(', 'set(')):
+        return '[]'
+    if attribute_type.startswith(('map(', 'object(')):
+        return '{}'
+    return 'null'
+
+
+def _required_attributes(attributes: Dict) -> List[str]:
+    return sorted(name for name, spec in attributes.items() if spec.get('required'))
+
+
+def _render_block(name: str, block: Dict, indent: int) -> str:
+    """Required nested block with its required attributes (and required sub-blocks)"""
+    pad = ' ' * indent
+    attributes = block.get('attributes', {})
+    required = _required_attributes(attributes)
+    lines = [f'{pad}{name} {{']
+    width = max((len(attr) for attr in required), default=0)
+    for attr in required:
+        lines.append(f'{pad}  {attr:<{width}} = {default_for_type(attributes[attr].get("type"))}')
+    for child_name, child in sorted(block.get('nested_blocks', {}).items()):
+        if child.get('min_items', 0) >= 1:
+            lines.append(_render_block(child_name, child, indent + 2))
+    lines.append(f'{pad}}}')
+    return '\n'.join(lines)
+
+
+class CompiledTemplate:
+    """Pre-rendered HCL for one resource type with per-instance slots"""
+
+    def __init__(self, resource_type: str, attributes: List[Tuple[str, Optional[str]]], blocks: str, has_tags: bool):
+        self.resource_type = resource_type
+        self.has_tags = has_tags
+        self.attribute_names = frozenset(name for name, _ in attributes)
+
+        width = max((len(name) for name, _ in attributes), default=0)
+        if has_tags:
+            width = max(width, len(TAGS_SLOT))
+        # (nazwa, gotowy prefiks linii, domyślne wyrażenie lub None dla slotu)
+        self.lines = [(name, f'  {name:<{width}} = ', default) for name, default in attributes]
+        self.width = width
+        self.tags_prefix = f'  {TAGS_SLOT:<{width}} = '
+        self.header = f'resource "{resource_type}" "'
+        self.blocks = blocks
+
+    def render(self, label: str, overrides: Optional[Dict[str, str]] = None, comment: str = '',
+               category: str = '') -> str:
+        """Fill slots: overrides are raw HCL expressions keyed by attribute name"""
+        overrides = overrides or {}
+        parts = [self.header, label, '" {\n']
+        for name, prefix, default in self.lines:
+            if name in overrides:
+                expression = overrides[name]
+            elif default is None:
+                expression = to_hcl(label)
+            else:
+                expression = default
+            parts.append(prefix)
+            parts.append(expression)
+            parts.append('\n')
+        # Atrybuty opcjonalne podane jawnie w projekcie
+        for name, expression in overrides.items():
+            if name not in self.attribute_names and name != TAGS_SLOT:
+                parts.append(f'  {name:<{self.width}} = {expression}\n')
+        if comment:
+            parts.append(f'\n  # {comment}\n')
+        if self.blocks:
+            parts.append('\n')
+            parts.append(self.blocks)
+            parts.append('\n')
+        if self.has_tags:
+            parts.append('\n')
+            parts.append(self.tags_prefix)
+            parts.append(overrides.get(TAGS_SLOT) or default_tags(category))
+            parts.append('\n')
+        parts.append('}\n')
+        return ''.join(parts)
+
+
+def compile_template(resource_type: str, schema: Optional[Dict]) -> CompiledTemplate:
+    """Compile render template from a resource schema (generic template when schema is unknown)"""
+    if schema is None:
+        return CompiledTemplate(
+            resource_type,
+            [(name, RESOURCE_GROUP_DEFAULTS.get(name)) for name in GENERIC_ATTRIBUTES],
+            '',
+            has_tags=True
+        )
+
+    attributes = schema.get('attributes', {})
+    # name/location/resource_group_name na początku, jak w dokumentacji providera
+    ordered = [name for name in GENERIC_ATTRIBUTES if attributes.get(name, {}).get('required')]
+    ordered += [name for name in _required_attributes(attributes) if name not in ordered]
+
+    template_attributes = []
+    for name in ordered:
+        if name == NAME_SLOT:
+            template_attributes.append((name, None))
+        elif name in RESOURCE_GROUP_DEFAULTS:
+            template_attributes.append((name, RESOURCE_GROUP_DEFAULTS[name]))
+        else:
+            template_attributes.append((name, default_for_type(attributes[name].get('type'))))
+
+    blocks = '\n'.join(
+        _render_block(block_name, block, 2)
+        for block_name, block in sorted(schema.get('blocks', {}).items())
+        if block.get('min_items', 0) >= 1
+    )
+
+    return CompiledTemplate(resource_type, template_attributes, blocks, has_tags=TAGS_SLOT in attributes)
+
+
+class TerraformGenerator:
+    """Render designs to HCL through cached per-type templates"""
+
+    def __init__(self, schema_store=None, references: Optional[ReferenceIndex] = None):
+        self.schema_store = schema_store
+        self.references = references or ReferenceIndex()
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template_for(self, resource_type: str) -> CompiledTemplate:
+        template = self._templates.get(resource_type)
+        if template is None:
+            schema = self.schema_store.get(resource_type) if self.schema_store else None
+            template = compile_template(resource_type, schema)
+            with self._lock:
+                template = self._templates.setdefault(resource_type, template)
+        return template
+
+    @staticmethod
+    def resource_label(resource: Dict, index: int) -> str:
+        """Terraform label: explicit label or <type>_<last 4 chars of canvas id>, like the browser did"""
+        label = resource.get('label')
+        if not label:
+            suffix = str(resource.get('id', index)).replace('.', '')[-4:]
+            label = f"{resource['type'].replace('azurerm_', '')}_{suffix}"
+        label = LABEL_RE.sub('_', str(label))
+        if not label[:1].isalpha() and label[:1] != '_':
+            label = f'r_{label}'
+        return label
+
+    def assign_labels(self, resources: List[Dict]) -> List[str]:
+        """Unique label per resource within the design"""
+        labels = []
+        seen = set()
+        for index, resource in enumerate(resources):
+            label = base = self.resource_label(resource, index)
+            counter = 2
+            while (resource['type'], label) in seen:
+                label = f'{base}_{counter}'
+                counter += 1
+            seen.add((resource['type'], label))
+            labels.append(label)
+        return labels
+
+    def render_resource(self, resource: Dict, label: str, overrides: Optional[Dict[str, str]] = None) -> str:
+        template = self.template_for(resource['type'])
+        expressions = {
+            name: to_hcl(value)
+            for name, value in (resource.get('attributes') or {}).items()
+        }
+        if overrides:
+            expressions.update(overrides)
+
+        comment = ''
+        if resource.get('display'):
+            comment = resource['display']
+            if resource.get('subcategory'):
+                comment += f" - {resource['subcategory']}"
+            comment = ' '.join(str(comment).split())
+        return template.render(label, expressions, comment=comment, category=resource.get('category', ''))
+
+    def emission_order(self, resources: List[Dict]) -> Tuple[List[int], List[List[Tuple[Reference, int]]], List[int]]:
+        """(order, references, cycle): resource indexes in topological order, grouped by category where possible
+
+        references[i] lists (reference, target index) pairs wired into resource i. Resources on
+        a cycle (or behind one) follow in design order and keep only references to resources emitted before them.
+        """
+        graph, bindings = build_design_graph(resources, self.references)
+        groups = [resource.get('category') or 'other' for resource in resources]
+        cycle: List[int] = []
+        try:
+            order = graph.topological_order(groups)
+        except DependencyCycle as e:
+            cycle = e.cycle
+            emitted = set(e.order)
+            order = e.order + [position for position in range(len(resources)) if position not in emitted]
+
+        emitted_at = [0] * len(resources)
+        for rank, position in enumerate(order):
+            emitted_at[position] = rank
+        references = [
+            [(reference, target) for reference, target in bound if emitted_at[target] < emitted_at[position]]
+            for position, bound in enumerate(bindings)
+        ]
+        return order, references, cycle
+
+    def generate(self, resources: List[Dict]) -> str:
+        """Full main.tf for a design: references wired from the schema, dependencies before dependents"""
+        labels = self.assign_labels(resources)
+        order, references, cycle = self.emission_order(resources)
+        addresses = [f"{resource['type']}.{label}" for resource, label in zip(resources, labels)]
+
+        parts = [TERRAFORM_HEADER]
+        if cycle:
+            parts.append(f"# Dependency cycle: {' -> '.join(addresses[position] for position in cycle)}\n")
+            parts.append('# References to resources emitted after the referring one are left at their defaults\n\n')
+
+        category = None
+        for position in order:
+            resource = resources[position]
+            # Nagłówek to komentarz HCL - białe znaki (w tym nowe linie) zwinięte jak w komentarzu zasobu
+            resource_category = ' '.join(str(resource.get('category') or '').split()) or 'other'
+            if resource_category != category:
+                if category is not None:
+                    parts.append('\n')
+                parts.append(f'# {resource_category.upper()} Resources\n')
+                category = resource_category
+            overrides = {
+                reference.attribute: reference.expression(labels[target])
+                for reference, target in references[position]
+            }
+            parts.append(self.render_resource(resource, labels[position], overrides))
+            parts.append('\n')
+        if category is not None:
+            parts.append('\n')
+        return ''.join(parts)
+
+
+_generator: Optional[TerraformGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def get_terraform_generator() -> TerraformGenerator:
+    """Per-process generator sharing compiled templates between requests"""
+    global _generator
+    generator = _generator
+    if generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = TerraformGenerator(get_schema_store(), get_reference_index())
+            generator = _generator
+    return generator
+
+
+class InvalidDesign(ValueError):
+    """Design payload could not be rendered"""
+
+
+def validate_design_resources(resources) -> List[Dict]:
+    """Check the shape sent by the canvas: list of {type, ...}"""
+    if not isinstance(resources, list):
+        raise InvalidDesign('resources must be a list')
+    for index, resource in enumerate(resources):
+        if not isinstance(resource, dict) or not isinstance(resource.get('type'), str):
+            raise InvalidDesign(f'resource #{index} has no type')
+        if not RESOURCE_TYPE_RE.fullmatch(resource['type']):
+            raise InvalidDesign(f"resource #{index}: unsupported type {resource['type']}")
+        for field in TEXT_FIELDS:
+            value = resource.get(field)
+            if value is not None and not isinstance(value, str):
+                raise InvalidDesign(f'resource #{index}: {field} must be a string')
+        attributes = resource.get('attributes')
+        if attributes is not None:
+            if not isinstance(attributes, dict):
+                raise InvalidDesign(f'resource #{index}: attributes must be an object')
+            for name in attributes:
+                if not IDENTIFIER_RE.fullmatch(name):
+                    raise InvalidDesign(f'resource #{index}: invalid attribute name {name!r}')
+    return resources
@@ -1,3 +1,1584 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from difflib import SequenceMatcher
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import User
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+
+from Changes.icon_catalog import IconCatalog, icon_service_name, normalizer_signature
+
+from . import async_views, icon_lookup
+from .async_fetcher import AsyncGitHubClient, AsyncTerraformResourceFetcher
+from .batch_export import stream_designs_zip, validate_designs
+from .benchmarks import BenchmarkResult, compare, load_baseline, save_baseline
+from .catalog import (
+    JSON_TYPE, CatalogSnapshot, ColumnarView, InvalidCursor, encode_entry, etag_matches, parse_quality_header
+)
+from .catalog_refresh import CatalogRefresher
+from .catalog_store import CATALOG_FORMAT_VERSION, CatalogStore, StoredCatalog
+from .dependency_graph import (
+    DependencyCycle, DependencyGraph, Reference, ReferenceIndex, build_design_graph, infer_references
+)
+from .designs import VersionConflict, append_operations, compact_design, create_design, load_design
+from .github_terraform_fetcher import RateLimitBudget, RateLimitExhausted, TerraformResourceFetcher
+from .icon_lookup import import_changes_module
+from .icon_sprites import SpriteSheet, build_sprite_bundle
+from .metrics import MetricsRegistry, render_prometheus
+from .models import DesignOperation
+from .profiling import ProfileStore
+from .schema_store import SchemaStore, scan_offsets
+from .search import ResourceSearchIndex, SearchDocument, tokenize
+from .terraform_generator import (
+    InvalidDesign, TerraformGenerator, compile_template, to_hcl, validate_design_resources
+)
+from .urls import build_urlpatterns
+
+# Trasy z widokami async (jak przy BUILDER_ASYNC_VIEWS = True) dla AsyncViewsTests
+urlpatterns = build_urlpatterns(async_views)
+
+
+class CatalogSnapshotTests(SimpleTestCase):
+    """Gotowe bajty katalogu z ETagiem i 304 przy If-None-Match"""
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/resources/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+
+        cached = self.client.get('/api/resources/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(cached.content, b'')
+
+        weak = self.client.get('/api/resources/', HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(weak.status_code, 304)
+        self.assertEqual(self.client.get('/api/resources/', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_formats(self):
+        hierarchical = self.client.get('/api/resources/').json()
+        flat = self.client.get('/api/resources/?format=flat')
+        self.assertEqual(hierarchical['format'], 'hierarchical')
+        self.assertEqual(flat.json()['format'], 'flat')
+        self.assertEqual(flat.json()['total_count'], len(flat.json()['resources']))
+        # Nieznany format jak dawniej - lista płaska
+        self.assertEqual(self.client.get('/api/resources/?format=nope').content, flat.content)
+        # Nagłówki kategorii mają własny endpoint, nie są formatem katalogu
+        self.assertEqual(self.client.get('/api/resources/?format=categories').content, flat.content)
+
+    def test_etag_follows_content(self):
+        first = CatalogSnapshot({}, [{'name': 'azurerm_a'}], built_at=1.0)
+        same = CatalogSnapshot({}, [{'name': 'azurerm_a'}], built_at=1.0)
+        other = CatalogSnapshot({}, [{'name': 'azurerm_b'}], built_at=1.0)
+        self.assertEqual(first.get('flat').etag, same.get('flat').etag)
+        self.assertNotEqual(first.get('flat').etag, other.get('flat').etag)
+        self.assertEqual(json.loads(first.get('flat').body)['resources'], [{'name': 'azurerm_a'}])
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('*', '"abc"'))
+        self.assertTrue(etag_matches('W/"abc"', '"abc"'))
+        self.assertFalse(etag_matches('', '"abc"'))
+        self.assertFalse(etag_matches('"abd"', '"abc"'))
+
+
+class SearchIndexTests(SimpleTestCase):
+    """Ranking wyszukiwarki"""
+
+    def setUp(self):
+        names = [
+            'azurerm_virtual_network_gateway_connection',
+            'azurerm_virtual_network_gateway',
+            'azurerm_virtual_network',
+            'azurerm_network_interface',
+            'azurerm_virtual_machine',
+        ]
+        documents = [
+            SearchDocument(kind='resource', name=name, display=name[len('azurerm_'):].replace('_', ' ').title(),
+                           icon='', category='networking')
+            for name in names
+        ]
+        documents.append(SearchDocument(kind='category', name='networking', display='networking', icon='', category='networking'))
+        self.index = ResourceSearchIndex(documents)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('azurerm_virtual_network'), ['azurerm', 'virtual', 'network'])
+        self.assertEqual(tokenize('Key Vault (HSM)'), ['key', 'vault', 'hsm'])
+
+    def test_exact_name_ranks_first(self):
+        results = self.index.search('virtual network')
+        self.assertEqual(results[0]['name'], 'azurerm_virtual_network')
+        self.assertNotIn('azurerm_virtual_machine', [result['name'] for result in results])
+
+    def test_prefix_and_phrase(self):
+        results = self.index.search('virt net gate')
+        self.assertEqual([result['name'] for result in results], [
+            'azurerm_virtual_network_gateway', 'azurerm_virtual_network_gateway_connection'
+        ])
+        # Fraza od początku nazwy przed trafieniem w środku
+        self.assertEqual(self.index.search('network')[0]['name'], 'azurerm_network_interface')
+
+    def test_kind_limit_and_misses(self):
+        self.assertEqual([result['kind'] for result in self.index.search('network', kind='category')], ['category'])
+        self.assertEqual(len(self.index.search('network', limit=2)), 2)
+        self.assertEqual(self.index.search('storage'), [])
+        self.assertEqual(self.index.search('  '), [])
+
+    def test_view(self):
+        response = self.client.get('/api/resources/search/?q=key+vault&limit=3')
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertLessEqual(payload['count'], 3)
+        self.assertEqual(payload['results'][0]['name'], 'azurerm_key_vault')
+        self.assertEqual(self.client.get('/api/resources/search/?q=vm&limit=x').status_code, 400)
+
+
+class ColumnarViewTests(SimpleTestCase):
+    """Stronicowanie keyset po kolumnowym widoku listy płaskiej"""
+
+    def rows(self):
+        rows = [
+            {'name': f'azurerm_resource_{index:02d}', 'parent_category': 'compute', 'subcategory': 'vm', 'display': str(index)}
+            for index in (7, 3, 9, 0, 5, 1, 8, 2, 6, 4)
+        ]
+        # Identyczne wiersze - klucz bez pozycji byłby równy i granica strony gubiłaby duplikaty
+        rows += [dict(rows[1]) for _ in range(3)]
+        return rows
+
+    def collect(self, view, limit, cursor=None):
+        pages = []
+        while True:
+            page, cursor = view.page(('name', 'display'), limit, cursor)
+            pages.append(page)
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_row_once(self):
+        rows = self.rows()
+        view = ColumnarView(rows)
+        for limit in (1, 2, 3, 5, 100):
+            pages = self.collect(view, limit)
+            names = [row['name'] for page in pages for row in page]
+            self.assertEqual(names, sorted(row['name'] for row in rows))
+            self.assertTrue(all(len(page) <= limit for page in pages))
+
+    def test_cursor_survives_rebuild(self):
+        rows = self.rows()
+        page, cursor = ColumnarView(rows).page(('name',), 3)
+        self.assertEqual(page[-1], {'name': 'azurerm_resource_02'})
+        # Nowy wiersz przed kursorem nie przesuwa następnej strony
+        rebuilt = ColumnarView(rows + [{'name': 'azurerm_resource_00a'}])
+        self.assertEqual(rebuilt.page(('name',), 1, cursor)[0], [{'name': 'azurerm_resource_03'}])
+
+    def test_invalid_cursor(self):
+        view = ColumnarView(self.rows())
+        for cursor in ('!!!', base64.urlsafe_b64encode(b'[1, 2]').decode(), base64.urlsafe_b64encode(b'{}').decode(),
+                       ColumnarView.encode_cursor(('a', 'b', 'c', 'd', True)),
+                       ColumnarView.encode_cursor(('a', 'b', 'c', 'd')),
+                       ColumnarView.encode_cursor(('a', 'b', 'c', 'd', 1, 2))):
+            with self.assertRaises(InvalidCursor):
+                view.page(('name',), 1, cursor)
+
+    def test_view_pages_and_rejects_bad_cursor(self):
+        first = self.client.get('/api/resources/?format=flat&limit=5&fields=name').json()
+        self.assertEqual(first['count'], 5)
+        self.assertEqual(first['fields'], ['name'])
+        second = self.client.get(f"/api/resources/?format=flat&limit=5&fields=name&cursor={first['next_cursor']}").json()
+        self.assertGreaterEqual(second['resources'][0]['name'], first['resources'][-1]['name'])
+
+        self.assertEqual(self.client.get('/api/resources/?format=flat&limit=5&cursor=bad').status_code, 400)
+        self.assertEqual(self.client.get('/api/resources/?format=flat&limit=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/resources/?format=flat&fields=nope').status_code, 400)
+
+
+class CatalogNegotiationTests(SimpleTestCase):
+    """Wybór gotowego wariantu po Accept i Accept-Encoding"""
+
+    def test_gzip_variant(self):
+        plain = self.client.get('/api/resources/?format=flat')
+        response = self.client.get('/api/resources/?format=flat', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept, Accept-Encoding')
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # ETag per wariant - 304 tylko dla tej samej reprezentacji
+        cached = self.client.get('/api/resources/?format=flat', HTTP_ACCEPT_ENCODING='gzip',
+                                 HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get('/api/resources/?format=flat', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_brotli_preferred_on_tie(self):
+        entry = encode_entry({'resources': ['azurerm_virtual_network'] * 50})
+        if (JSON_TYPE, 'br') not in entry.variants:
+            self.skipTest('brotli not installed')
+        self.assertEqual(entry.negotiate('', 'gzip, br').content_encoding, 'br')
+        self.assertEqual(entry.negotiate('', 'gzip, br;q=0.5').content_encoding, 'gzip')
+        self.assertEqual(entry.negotiate('', '*').content_encoding, 'br')
+
+    def test_identity_excluded_falls_back_to_compressed(self):
+        response = self.client.get('/api/resources/', HTTP_ACCEPT_ENCODING='gzip;q=0.5, identity;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', self.client.get('/api/resources/', HTTP_ACCEPT_ENCODING='compress'))
+
+    def test_msgpack_variant(self):
+        try:
+            import msgpack
+        except ImportError:
+            self.skipTest('msgpack not installed')
+        plain = self.client.get('/api/resources/?format=flat')
+        response = self.client.get('/api/resources/?format=flat', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(plain.content))
+
+        # JSON wygrywa, gdy klient woli go bardziej
+        response = self.client.get('/api/resources/', HTTP_ACCEPT='application/json, application/msgpack;q=0.5')
+        self.assertTrue(response['Content-Type'].startswith('application/json'))
+
+    def test_parse_quality_header(self):
+        self.assertEqual(parse_quality_header('gzip;q=0.8, br'), {'gzip': 0.8, 'br': 1.0})
+        self.assertEqual(parse_quality_header('GZIP, gzip;q=0.1'), {'gzip': 1.0})
+        self.assertEqual(parse_quality_header('gzip;q=bad'), {'gzip': 0.0})
+
+
+class CategoryEndpointTests(SimpleTestCase):
+    """Nagłówki kategorii i osobny wycinek na kategorię dla sidebaru"""
+
+    def test_headers_match_hierarchy(self):
+        hierarchy = self.client.get('/api/resources/').json()['resources']
+        payload = self.client.get('/api/resources/categories/').json()
+        self.assertEqual(payload['total_categories'], len(hierarchy))
+        for header in payload['categories']:
+            subcategories = hierarchy[header['name']]['subcategories']
+            self.assertEqual(header['subcategory_count'], len(subcategories))
+            self.assertEqual(header['resource_count'], sum(len(resources) for resources in subcategories.values()))
+
+    def test_single_category(self):
+        name, category = next(iter(self.client.get('/api/resources/').json()['resources'].items()))
+        response = self.client.get(f'/api/resources/categories/{name}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['subcategories'], category['subcategories'])
+        self.assertEqual(self.client.get(f'/api/resources/categories/{name}/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/resources/categories/nope/').status_code, 404)
+
+
+class ScanOffsetsTests(SimpleTestCase):
+    """Offsety ze skanera tokenów odpowiadają json.load"""
+
+    def check(self, buffer):
+        parsed = json.loads(buffer)
+        offsets, metadata_span = scan_offsets(buffer)
+        self.assertEqual(set(offsets), set(parsed['resources']))
+        for name, (start, end) in offsets.items():
+            self.assertEqual(json.loads(buffer[start:end]), parsed['resources'][name])
+        if 'metadata' in parsed:
+            self.assertEqual(json.loads(buffer[metadata_span[0]:metadata_span[1]]), parsed['metadata'])
+        else:
+            self.assertIsNone(metadata_span)
+
+    def test_escapes_and_nesting(self):
+        document = {
+            'resources': {
+                'azurerm_a': {'attributes': {'x': {'description': 'brace } and "quote" \\ [x'}}, 'blocks': [{}]},
+                'azurerm_"b"': {'attributes': {}, 'list': [[1, {'nested': '{'}]]},
+                'azurerm_zażółć': {},
+            },
+            'other': {'resources': {'azurerm_ignored': {}}},
+            'metadata': {'total_resources': 3},
+        }
+        self.check(json.dumps(document, indent=2, ensure_ascii=False).encode('utf-8'))
+        self.check(json.dumps(document, separators=(',', ':')).encode('utf-8'))
+
+    def test_without_metadata(self):
+        self.check(b'{"resources": {"azurerm_a": {"a": [1, 2]}}}')
+
+    def test_sample_schema_file(self):
+        path = Path(settings.BASE_DIR) / 'Changes' / 'sample_azure_resources.json'
+        if not path.exists():
+            self.skipTest('sample schema file not present')
+        self.check(path.read_bytes())
+
+
+class SchemaStoreTests(SimpleTestCase):
+    """Odczyt pojedynczych schematów z pliku przez zapisany indeks offsetów"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'schemas.json'
+        self.write({'azurerm_a': {'attributes': {'name': {'type': 'string'}}}, 'azurerm_b': {'attributes': {}}})
+
+    def write(self, resources):
+        self.path.write_text(json.dumps({'metadata': {'total_resources': len(resources)}, 'resources': resources}, indent=2))
+
+    def open_store(self, **kwargs):
+        store = SchemaStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_lookup(self):
+        store = self.open_store(cache_size=1)
+        self.assertEqual(store.names(), ['azurerm_a', 'azurerm_b'])
+        self.assertIn('azurerm_b', store)
+        self.assertEqual(store.get('azurerm_a'), {'attributes': {'name': {'type': 'string'}}})
+        self.assertEqual(store.get('azurerm_b'), {'attributes': {}})
+        self.assertIsNone(store.get('azurerm_missing'))
+        self.assertEqual(store.metadata, {'total_resources': 2})
+
+    def test_index_is_persisted_and_rebuilt_when_file_changes(self):
+        self.open_store()
+        index_path = self.path.with_name(self.path.name + '.offsets.json')
+        self.assertTrue(index_path.exists())
+
+        self.write({'azurerm_c': {'attributes': {'x': {'type': 'number'}}}})
+        store = self.open_store()
+        self.assertEqual(store.names(), ['azurerm_c'])
+        self.assertEqual(store.get('azurerm_c'), {'attributes': {'x': {'type': 'number'}}})
+
+
+class TerraformGeneratorTests(SimpleTestCase):
+    """Generowanie HCL ze skompilowanych szablonów per typ zasobu"""
+
+    SCHEMA = {
+        'attributes': {
+            'name': {'type': 'string', 'required': True},
+            'location': {'type': 'string', 'required': True},
+            'resource_group_name': {'type': 'string', 'required': True},
+            'sku_name': {'type': 'string', 'required': True},
+            'address_space': {'type': 'list(string)', 'required': True},
+            'enabled': {'type': 'bool', 'required': False},
+            'tags': {'type': 'map(string)', 'required': False},
+        },
+        'blocks': {
+            'network_rules': {'min_items': 1, 'attributes': {'default_action': {'type': 'string', 'required': True}}},
+            'optional_block': {'min_items': 0, 'attributes': {}},
+        },
+    }
+
+    def test_to_hcl(self):
+        self.assertEqual(to_hcl(None), 'null')
+        self.assertEqual(to_hcl(True), 'true')
+        self.assertEqual(to_hcl([1, 'a']), '[1, "a"]')
+        self.assertEqual(to_hcl('${var.x} %{if}'), '"$${var.x} %%{if}"')
+        self.assertEqual(to_hcl({'a': 1, 'long-key': {}}), '{\n    a        = 1\n    long-key = {}\n  }')
+
+    def test_compiled_template(self):
+        code = compile_template('azurerm_thing', self.SCHEMA).render('main', {'enabled': 'true'}, comment='Thing',
+                                                                     category='compute')
+        lines = code.splitlines()
+        self.assertEqual(lines[0], 'resource "azurerm_thing" "main" {')
+        self.assertEqual([line.split('=')[0].strip() for line in lines[1:6]],
+                         ['name', 'location', 'resource_group_name', 'address_space', 'sku_name'])
+        self.assertIn('  resource_group_name = azurerm_resource_group.main.name', lines)
+        self.assertIn('  address_space       = []', lines)
+        self.assertIn('  enabled             = true', lines)
+        self.assertIn('  # Thing', lines)
+        self.assertIn('  network_rules {', lines)
+        self.assertNotIn('optional_block', code)
+        self.assertIn('Category    = "compute"', code)
+
+    def test_generate_groups_by_category_and_labels(self):
+        code = TerraformGenerator().generate([
+            {'type': 'azurerm_b', 'label': 'x', 'category': 'storage'},
+            {'type': 'azurerm_a', 'label': 'y', 'category': 'compute'},
+            {'type': 'azurerm_c', 'label': 'z', 'category': 'storage'},
+            {'type': 'azurerm_c', 'label': 'z'},
+            {'type': 'azurerm_d', 'id': 1234.5678},
+        ])
+        self.assertTrue(code.startswith('terraform {'))
+        self.assertLess(code.index('# STORAGE Resources'), code.index('# COMPUTE Resources'))
+        self.assertLess(code.index('"azurerm_c" "z"'), code.index('# COMPUTE Resources'))
+        self.assertIn('resource "azurerm_c" "z_2"', code)
+        self.assertIn('resource "azurerm_d" "d_5678"', code)
+
+    def test_validation(self):
+        for resources, message in (
+                ('x', 'resources must be a list'),
+                ([{}], 'has no type'),
+                ([{'type': 'aws_instance'}], 'unsupported type'),
+                ([{'type': 'azurerm_a', 'attributes': []}], 'attributes must be an object'),
+                ([{'type': 'azurerm_a', 'attributes': {'a = 1\n': 1}}], 'invalid attribute name'),
+                ([{'type': 'azurerm_a\n'}], 'unsupported type'),
+                ([{'type': 'azurerm_a', 'attributes': {'a\n': 1}}], 'invalid attribute name')):
+            with self.assertRaisesMessage(InvalidDesign, message):
+                validate_design_resources(resources)
+
+    def test_text_fields_cannot_break_out_of_comments(self):
+        self.assertEqual(to_hcl({'a\n': 1}), '{\n    "a\\n" = 1\n  }')
+        code = TerraformGenerator().generate([{
+            'type': 'azurerm_key_vault', 'label': 'kv', 'category': 'x\nresource "azurerm_evil" "e" {}',
+            'display': 'Key\nVault', 'subcategory': 'a\r\nb',
+        }])
+        self.assertIn('# X RESOURCE "AZURERM_EVIL" "E" {} Resources\n', code)
+        self.assertIn('# Key Vault - a b\n', code)
+        self.assertNotIn('\nresource "azurerm_evil"', code)
+
+    def test_text_fields_must_be_strings(self):
+        for field in ('category', 'display', 'subcategory', 'label'):
+            with self.assertRaisesMessage(InvalidDesign, f'{field} must be a string'):
+                validate_design_resources([{'type': 'azurerm_key_vault', field: ['x']}])
+        validate_design_resources([{'type': 'azurerm_key_vault', 'category': None, 'label': 'kv'}])
+
+    def test_generate_view(self):
+        response = self.client.post('/api/terraform/generate/', {'resources': [{'type': 'azurerm_key_vault', 'label': 'kv'}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resource_count'], 1)
+        self.assertIn('resource "azurerm_key_vault" "kv"', response.json()['code'])
+
+        response = self.client.post('/api/terraform/generate/', {'resources': [{'type': 'x'}]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/terraform/generate/', b'{', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get('/api/terraform/generate/').status_code, 405)
+
+
+class BatchExportTests(SimpleTestCase):
+    """Zip z main.tf per projekt, strumieniowany w trakcie renderowania"""
+
+    def test_validate_designs(self):
+        designs = validate_designs([
+            {'name': '../etc/passwd', 'resources': []},
+            {'name': 'etc_passwd', 'resources': [{'type': 'azurerm_a'}]},
+            {'resources': []},
+        ])
+        self.assertEqual([name for name, _ in designs], ['etc_passwd', 'etc_passwd_2', 'design_3'])
+        with self.assertRaisesMessage(InvalidDesign, 'design #1: resource #0 has no type'):
+            validate_designs([{'resources': []}, {'resources': [{}]}])
+        with self.assertRaisesMessage(InvalidDesign, 'non-empty list'):
+            validate_designs([])
+
+    def test_zip_contains_every_design_in_order(self):
+        designs = [(f'd{index}', [{'type': 'azurerm_key_vault', 'label': f'kv{index}'}]) for index in range(20)]
+        data = b''.join(stream_designs_zip(TerraformGenerator(), designs))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [f'd{index}/main.tf' for index in range(20)])
+            self.assertIn('resource "azurerm_key_vault" "kv7"', archive.read('d7/main.tf').decode())
+
+    def test_failing_design_becomes_error_entry(self):
+        class FailingGenerator(TerraformGenerator):
+            def generate(self, resources):
+                if resources and resources[0]['type'] == 'azurerm_broken':
+                    raise RuntimeError('boom')
+                return super().generate(resources)
+
+        designs = [
+            ('first', [{'type': 'azurerm_key_vault', 'label': 'kv'}]),
+            ('broken', [{'type': 'azurerm_broken'}]),
+            ('last', [{'type': 'azurerm_storage_account', 'label': 'sa'}]),
+        ]
+        data = b''.join(stream_designs_zip(FailingGenerator(), designs))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ['first/main.tf', 'broken/error.txt', 'last/main.tf'])
+            self.assertIn('boom', archive.read('broken/error.txt').decode())
+            self.assertIn('resource "azurerm_storage_account" "sa"', archive.read('last/main.tf').decode())
+
+    def test_view(self):
+        response = self.client.post('/api/terraform/batch/', {'designs': [
+            {'name': '../x', 'resources': [{'type': 'azurerm_key_vault'}]},
+            {'name': 'x', 'resources': []},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['x/main.tf', 'x_2/main.tf'])
+
+        response = self.client.post('/api/terraform/batch/', {'designs': [{'resources': 'x'}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+
+class FakeGitHubSession:
+    """Listing katalogów providera w pamięci zamiast api.github.com"""
+
+    def __init__(self, services, shas=None):
+        self.services = services
+        self.shas = shas or {}
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        with self._lock:
+            self.requested.append(url)
+        name = url.rsplit('/', 1)[-1]
+        if name == 'services':
+            return FakeResponse([
+                {'name': service, 'type': 'dir', 'sha': self.shas.get(service)} for service in self.services
+            ])
+        files = self.services.get(name)
+        if files is None:
+            return FakeResponse({}, status_code=404)
+        return FakeResponse([{'name': filename, 'type': 'file'} for filename in files])
+
+
+class RateLimitBudgetTests(SimpleTestCase):
+    """Budżet requestów GitHub z nagłówków X-RateLimit-*"""
+
+    def test_plenty_of_budget_does_not_wait(self):
+        budget = RateLimitBudget(5000)
+        started = time.monotonic()
+        for _ in range(100):
+            budget.acquire()
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(budget.snapshot()['remaining'], 4900)
+
+    def test_headers_update_budget(self):
+        budget = RateLimitBudget(60)
+        reset = budget.reset_at
+        budget.update({'X-RateLimit-Remaining': '40', 'X-RateLimit-Reset': str(reset)})
+        # Spóźniona odpowiedź z wyższą wartością nie podnosi budżetu
+        budget.update({'X-RateLimit-Remaining': '45', 'X-RateLimit-Reset': str(reset)})
+        self.assertEqual(budget.remaining, 40)
+        budget.update({'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': str(reset + 3600),
+                       'X-RateLimit-Limit': '5000'})
+        self.assertEqual((budget.remaining, budget.limit), (4999, 5000))
+        budget.update({'X-RateLimit-Remaining': 'x'})
+        self.assertEqual(budget.remaining, 4999)
+
+    def test_exhausted_budget_raises(self):
+        budget = RateLimitBudget(60, reserve=5, max_wait=1)
+        budget.update({'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': str(time.time() + 600)})
+        with self.assertRaises(RateLimitExhausted):
+            budget.acquire()
+
+
+@override_settings(GITHUB_TOKEN='token', GITHUB_CRAWL_WORKERS=4)
+class ConcurrentCrawlTests(SimpleTestCase):
+    """Równoległy crawl katalogów usług"""
+
+    SERVICES = {
+        'compute': ['availability_set_resource.go', 'availability_set_resource_test.go', 'client.go'],
+        'network': ['virtual_network_resource.go', 'subnet_resource.go'],
+        'keyvault': ['key_vault_resource.go'],
+        'broken': None,
+    }
+
+    def test_results_follow_listing_order(self):
+        fetcher = TerraformResourceFetcher()
+        self.assertTrue(fetcher.concurrent)
+        fetcher.session = FakeGitHubSession(self.SERVICES)
+        resources, _ = fetcher.crawl_catalog()
+        self.assertEqual([resource['name'] for resource in resources], [
+            'azurerm_availability_set', 'azurerm_virtual_network', 'azurerm_subnet', 'azurerm_key_vault'
+        ])
+        self.assertEqual(resources[2]['category'], 'network')
+        self.assertEqual(resources[3]['category'], 'security')
+        self.assertEqual(len(fetcher.session.requested), 5)
+
+
+class CheckoutIngestTests(SimpleTestCase):
+    """Katalog z lokalnego klonu lub tarballa providera"""
+
+    FILES = [
+        'internal/services/network/virtual_network_resource.go',
+        'internal/services/network/subnet_resource.go',
+        'internal/services/compute/availability_set_resource.go',
+        'internal/services/compute/client.go',
+        'internal/services/keyvault/key_vault_resource.go',
+        'internal/provider/provider_resource.go',
+    ]
+    EXPECTED = ['azurerm_availability_set', 'azurerm_key_vault', 'azurerm_subnet', 'azurerm_virtual_network']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.checkout = self.root / 'terraform-provider-azurerm'
+        for name in self.FILES:
+            path = self.checkout / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('package x\n')
+
+    def names(self, source):
+        return [resource['name'] for resource in TerraformResourceFetcher().get_terraform_resources_from_checkout(source)]
+
+    def test_directory(self):
+        self.assertEqual(self.names(self.checkout), self.EXPECTED)
+        self.assertEqual(self.names(self.checkout / 'internal' / 'services'), self.EXPECTED)
+        with self.assertRaises(ValueError):
+            self.names(self.root)
+
+    def test_tarball(self):
+        archive_path = self.root / 'provider.tar.gz'
+        with tarfile.open(archive_path, 'w:gz') as archive:
+            archive.add(self.checkout, arcname='terraform-provider-azurerm-4.0.0')
+        self.assertEqual(self.names(archive_path), self.EXPECTED)
+
+        not_archive = self.root / 'notes.txt'
+        not_archive.write_text('x')
+        with self.assertRaises(ValueError):
+            self.names(not_archive)
+
+    def test_command(self):
+        output = self.root / 'catalog.json'
+        call_command('ingest_provider_catalog', str(self.checkout), output=str(output), stdout=io.StringIO())
+        catalog = json.loads(output.read_text())
+        self.assertEqual(catalog['total_count'], 4)
+        self.assertEqual([resource['name'] for resource in catalog['resources']], self.EXPECTED)
+        with self.assertRaises(CommandError):
+            call_command('ingest_provider_catalog', str(self.root / 'missing'), stdout=io.StringIO())
+
+
+class CatalogStoreTests(SimpleTestCase):
+    """Katalog na dysku współdzielony przez workery"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'catalog.sqlite3'
+        self.store = CatalogStore(self.path)
+
+    def test_round_trip_between_connections(self):
+        stored = self.store.put('key', [{'name': 'azurerm_a'}], meta={'source': 'test'})
+        self.assertLess(stored.age, 5)
+
+        # Inny wątek = inne połączenie
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(CatalogStore(self.path).get('key')))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen[0].resources, [{'name': 'azurerm_a'}])
+        self.assertEqual(seen[0].meta, {'source': 'test'})
+        self.assertEqual(seen[0].fetched_at, stored.fetched_at)
+
+        self.store.delete('key')
+        self.assertIsNone(self.store.get('key'))
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_other_format_version_is_ignored(self):
+        CatalogStore(self.path, version=CATALOG_FORMAT_VERSION + 1).put('key', [{'name': 'azurerm_new'}])
+        self.assertIsNone(self.store.get('key'))
+
+
+class CatalogRefresherTests(SimpleTestCase):
+    """Stale-while-revalidate, lease na node i backoff"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = CatalogStore(Path(directory.name) / 'catalog.sqlite3')
+        self.calls = []
+
+    def crawl(self, previous):
+        self.calls.append(previous)
+        return [{'name': 'azurerm_key_vault'}], {'commit': 'abc'}
+
+    def refresher(self, crawl=None, **kwargs):
+        return CatalogRefresher(crawl or self.crawl, self.store, 'test', **kwargs)
+
+    def test_refresh_stores_catalog(self):
+        refresher = self.refresher()
+        self.assertIsNone(refresher.current)
+        self.assertTrue(refresher.refresh())
+        self.assertEqual(refresher.current.resources, [{'name': 'azurerm_key_vault'}])
+        self.assertFalse(refresher.is_stale())
+
+        # Drugi worker czyta katalog z dysku, bez crawla
+        other = self.refresher()
+        self.assertEqual(other.current.meta, {'commit': 'abc'})
+        self.assertTrue(other.refresh())
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_catalog_is_served_then_replaced(self):
+        self.store.put('test', [{'name': 'old'}], fetched_at=time.time() - 10)
+        refresher = self.refresher(interval=5)
+        self.assertEqual(refresher.current.resources, [{'name': 'old'}])
+        self.assertTrue(refresher.is_stale())
+        self.assertTrue(refresher.refresh())
+        self.assertEqual(self.calls[0].resources, [{'name': 'old'}])
+        self.assertEqual(refresher.current.resources, [{'name': 'azurerm_key_vault'}])
+
+    def test_lease_held_by_other_worker(self):
+        self.assertTrue(self.store.acquire_lease('test', 'other-worker', ttl=60))
+        refresher = self.refresher()
+        self.assertFalse(refresher.refresh())
+        self.assertEqual(self.calls, [])
+
+        self.store.release_lease('test', 'other-worker')
+        self.assertTrue(refresher.refresh())
+        # Lease zwolniony po crawlu
+        self.assertTrue(self.store.acquire_lease('test', 'other-worker', ttl=60))
+
+    def test_failure_backs_off(self):
+        def failing(previous):
+            raise RuntimeError('rate limited')
+
+        refresher = self.refresher(failing, backoff=30, jitter=0)
+        self.assertFalse(refresher.refresh())
+        self.assertEqual(refresher.failures, 1)
+        self.assertEqual(refresher.last_error, 'rate limited')
+        self.assertAlmostEqual(refresher.next_attempt - time.time(), 30, delta=2)
+        self.assertFalse(refresher.trigger())
+
+        self.assertFalse(refresher.refresh())
+        self.assertAlmostEqual(refresher.next_attempt - time.time(), 60, delta=2)
+        self.assertEqual(refresher.stats()['failures'], 2)
+
+        refresher.crawl = lambda previous: ([], {})
+        self.assertFalse(refresher.refresh())
+        self.assertEqual(refresher.last_error, 'crawl returned no resources')
+
+    def test_single_flight(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow(previous):
+            started.set()
+            release.wait(5)
+            return self.crawl(previous)
+
+        refresher = self.refresher(slow)
+        thread = threading.Thread(target=refresher.refresh)
+        thread.start()
+        started.wait(5)
+        self.assertFalse(refresher.refresh())
+        self.assertFalse(refresher.trigger())
+        release.set()
+        thread.join()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_requests_never_wait_for_github(self):
+        fetcher = TerraformResourceFetcher()
+        fetcher.session = FakeGitHubSession({})
+        refresher = self.refresher(interval=5)
+        with mock.patch('builder.github_terraform_fetcher.get_catalog_refresher', return_value=refresher), \
+                mock.patch.object(refresher, 'trigger') as trigger:
+            # Jeszcze bez katalogu - statyczny fallback i refresh w tle
+            self.assertEqual(fetcher.get_terraform_resources(), fetcher._get_fallback_resources())
+            self.assertEqual(trigger.call_count, 1)
+
+            self.store.put('test', [{'name': 'old'}], fetched_at=time.time() - 10)
+            self.assertEqual(fetcher.get_terraform_resources(), [{'name': 'old'}])
+            self.assertEqual(trigger.call_count, 2)
+
+            self.store.put('test', [{'name': 'fresh'}])
+            refresher.refresh()
+            self.assertEqual(fetcher.get_terraform_resources(), [{'name': 'fresh'}])
+            self.assertEqual(trigger.call_count, 2)
+        self.assertEqual(fetcher.session.requested, [])
+        self.assertEqual(self.calls, [])
+
+    @override_settings(GITHUB_TOKEN='token')
+    def test_crawl_catalog(self):
+        fetcher = TerraformResourceFetcher()
+        fetcher.session = FakeGitHubSession({'keyvault': ['key_vault_resource.go']})
+        resources, meta = fetcher.crawl_catalog()
+        self.assertEqual([resource['name'] for resource in resources], ['azurerm_key_vault'])
+        self.assertEqual(meta['source'], 'github')
+        fetcher.session = FakeGitHubSession({})
+        self.assertIsNone(fetcher.crawl_catalog())
+
+
+@override_settings(GITHUB_TOKEN='token')
+class IncrementalCrawlTests(SimpleTestCase):
+    """Ponowny listing tylko usług ze zmienionym SHA katalogu"""
+
+    def crawl(self, services, shas, previous=None):
+        fetcher = TerraformResourceFetcher()
+        fetcher.session = FakeGitHubSession(services, shas)
+        resources, meta = fetcher.crawl_catalog(previous)
+        stored = StoredCatalog(resources=resources, version=CATALOG_FORMAT_VERSION, fetched_at=time.time(), meta=meta)
+        return stored, fetcher.session.requested
+
+    def names(self, catalog):
+        return [resource['name'] for resource in catalog.resources]
+
+    def test_unchanged_provider_costs_one_request(self):
+        services = {'network': ['subnet_resource.go'], 'keyvault': ['key_vault_resource.go']}
+        first, requested = self.crawl(services, {'network': 'a', 'keyvault': 'b'})
+        self.assertEqual(len(requested), 3)
+        self.assertEqual(first.meta['service_shas'], {'network': 'a', 'keyvault': 'b'})
+
+        second, requested = self.crawl(services, {'network': 'a', 'keyvault': 'b'}, first)
+        self.assertEqual(len(requested), 1)
+        self.assertEqual(second.resources, first.resources)
+        self.assertEqual(second.meta['services_listed'], 0)
+
+    def test_changed_removed_and_failed_services(self):
+        first, _ = self.crawl(
+            {'network': ['subnet_resource.go'], 'keyvault': ['key_vault_resource.go'], 'web': ['app_resource.go']},
+            {'network': 'a', 'keyvault': 'b', 'web': 'c'}
+        )
+        # network zmieniona, web usunięta, keyvault zmieniona, ale listing się nie udał
+        second, requested = self.crawl(
+            {'network': ['subnet_resource.go', 'virtual_network_resource.go'], 'keyvault': None},
+            {'network': 'a2', 'keyvault': 'b2'}, first
+        )
+        self.assertEqual(len(requested), 3)
+        self.assertEqual(self.names(second), ['azurerm_subnet', 'azurerm_virtual_network', 'azurerm_key_vault'])
+        # Nieudana usługa zostaje przy starym SHA - ponowiona przy następnym refreshu
+        self.assertEqual(second.meta['service_shas'], {'network': 'a2', 'keyvault': 'b'})
+
+    async def test_async_crawl_matches_sync(self):
+        services = {'network': ['subnet_resource.go'], 'keyvault': ['key_vault_resource.go'], 'broken': None}
+        shas = {'network': 'a', 'keyvault': 'b', 'broken': 'c'}
+        session = FakeGitHubSession(services, shas)
+
+        async def get(client, url, timeout):
+            return session.get(url, timeout=timeout)
+
+        with mock.patch.object(AsyncGitHubClient, 'get', get):
+            cold = await AsyncTerraformResourceFetcher().crawl_catalog()
+            expected, _ = self.crawl(services, shas)
+            self.assertEqual(cold[0], expected.resources)
+            self.assertEqual(cold[1]['service_shas'], expected.meta['service_shas'])
+
+            previous = StoredCatalog(resources=cold[0], version=CATALOG_FORMAT_VERSION, fetched_at=0, meta=cold[1])
+            session.requested.clear()
+            warm = await AsyncTerraformResourceFetcher().crawl_catalog(previous)
+            # Tylko listing usług i ponowienie tej, której się nie udało
+            self.assertEqual(len(session.requested), 2)
+            self.assertEqual(warm[0], cold[0])
+
+
+class IconCatalogTests(SimpleTestCase):
+    """Skan folderu ikon z indeksami i manifestem po mtime plików"""
+
+    ICONS = {
+        'networking': ['10061-icon-service-Virtual-Networks.svg', '10062-icon-service-Load-Balancers.svg'],
+        'compute': ['10021-icon-service-Virtual-Machine.svg', 'readme.txt'],
+        'security': ['10245-icon-service-Key-Vaults.svg'],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.icons_path = Path(directory.name) / 'icons'
+        for folder, filenames in self.ICONS.items():
+            (self.icons_path / folder).mkdir(parents=True)
+            for filename in filenames:
+                (self.icons_path / folder / filename).write_text('<svg/>')
+        self.normalized = []
+
+    def normalize(self, name):
+        self.normalized.append(name)
+        return name.lower()
+
+    def scan(self, normalize=None):
+        return IconCatalog(self.icons_path, normalize or self.normalize, name='test').scan()
+
+    def test_indexes(self):
+        catalog = self.scan()
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual([icon.relative_path for icon in catalog][:2], [
+            'compute/10021-icon-service-Virtual-Machine.svg', 'networking/10061-icon-service-Virtual-Networks.svg'
+        ])
+        self.assertEqual(catalog.get('security/10245-icon-service-Key-Vaults.svg').normalized_name, 'key vaults')
+        self.assertEqual(len(catalog.in_folder('networking')), 2)
+        self.assertEqual(catalog.with_name('virtual machine')[0].folder_category, 'compute')
+        self.assertEqual(catalog.with_name('virtual machine')[0].service_keywords, ['virtual', 'machine'])
+        self.assertEqual(icon_service_name('123-icon-service-App-Services.svg'), 'App Services')
+        self.assertEqual(icon_service_name('custom.svg'), 'custom')
+
+    def test_manifest_reuses_unchanged_files(self):
+        self.scan()
+        self.assertTrue(self.icons_path.with_name('.icon_manifest_test.json').exists())
+        self.normalized.clear()
+
+        catalog = self.scan()
+        self.assertEqual(self.normalized, [])
+        self.assertEqual(catalog.stats['reused'], 4)
+
+        changed = self.icons_path / 'security' / '10245-icon-service-Key-Vaults.svg'
+        changed.write_text('<svg>changed</svg>')
+        (self.icons_path / 'compute' / '10021-icon-service-Virtual-Machine.svg').unlink()
+        catalog = self.scan()
+        self.assertEqual(self.normalized, ['Key Vaults'])
+        self.assertEqual((catalog.stats['processed'], catalog.stats['removed'], len(catalog)), (1, 1, 3))
+
+    def test_token_index(self):
+        catalog = self.scan()
+        self.assertEqual(catalog.token_positions('virtual'), [0, 1])
+        self.assertEqual(catalog.token_positions('vault'), [])
+        self.assertEqual(catalog.token_positions('vault', substring=True), [3])
+        self.assertEqual([icon.normalized_name for icon in catalog.candidates(['load', 'machine'])],
+                         ['virtual machine', 'load balancers'])
+
+    def test_signature_covers_called_names(self):
+        def normalizer(method, nested=False):
+            # Ta sama nazwa i ten sam bajtkod - różnią się tylko wywoływaną metodą
+            if nested and method == 'lower':
+                def normalize(name):
+                    return (lambda text: text.lower())(name)
+            elif nested:
+                def normalize(name):
+                    return (lambda text: text.upper())(name)
+            elif method == 'lower':
+                def normalize(name):
+                    return name.lower()
+            else:
+                def normalize(name):
+                    return name.upper()
+            return normalize
+
+        for nested in (False, True):
+            lower = normalizer_signature(normalizer('lower', nested))
+            self.assertEqual(lower, normalizer_signature(normalizer('lower', nested)))
+            self.assertNotEqual(lower, normalizer_signature(normalizer('upper', nested)))
+        self.scan(normalize=normalizer('lower'))
+        self.assertEqual(self.scan(normalize=normalizer('upper')).stats['processed'], 4)
+
+    def test_other_normalizer_invalidates_manifest(self):
+        self.scan()
+        catalog = self.scan(normalize=lambda name: name.upper())
+        self.assertEqual(catalog.stats['processed'], 4)
+        self.assertEqual(catalog.with_name('KEY VAULTS')[0].folder_category, 'security')
+
+
+class ParallelMappingTests(SimpleTestCase):
+    """Mapowanie w puli procesów daje ten sam wynik co przebieg szeregowy"""
+
+    RESOURCES = [
+        'azurerm_virtual_network', 'azurerm_key_vault', 'azurerm_virtual_machine_scale_set',
+        'azurerm_load_balancer_rule', 'azurerm_unknown_thing', 'azurerm_storage_account',
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        icons_path = Path(directory.name) / 'icons'
+        for folder, filenames in IconCatalogTests.ICONS.items():
+            (icons_path / folder).mkdir(parents=True)
+            for filename in filenames:
+                (icons_path / folder / filename).write_text('<svg/>')
+        aa = import_changes_module('aa')
+        self.mapper = aa.AzureIconMapper(icons_path=icons_path)
+        self.mapper.icons_cache = self.mapper.scan_icons()
+
+    def test_parallel_matches_serial(self):
+        serial = self.mapper.map_resources(self.RESOURCES)
+        self.assertEqual(len(serial), len(self.RESOURCES))
+        self.assertEqual(self.mapper.map_resources(self.RESOURCES, workers=2), serial)
+
+
+class MappingCacheTests(SimpleTestCase):
+    """Cache wyników mapowania przelicza tylko zasoby z nieaktualnymi zależnościami"""
+
+    RESOURCES = ['azurerm_virtual_network', 'azurerm_key_vault', 'azurerm_unknown_thing']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.icons_path = self.root / 'icons'
+        for folder, filenames in IconCatalogTests.ICONS.items():
+            (self.icons_path / folder).mkdir(parents=True)
+            for filename in filenames:
+                (self.icons_path / folder / filename).write_text('<svg/>')
+
+    def mapper(self):
+        aa = import_changes_module('aa')
+        mapper = aa.AzureIconMapper(icons_path=self.icons_path, output_path=self.root / 'out.json')
+        mapper.icons_cache = mapper.scan_icons()
+        return mapper
+
+    def run_mapping(self, mapper):
+        with mock.patch.object(mapper, 'map_resources', wraps=mapper.map_resources) as map_resources:
+            results = mapper.map_resources_incremental(self.RESOURCES)
+        computed = [name for call in map_resources.call_args_list for name in call.args[0]]
+        return results, computed
+
+    def test_warm_run_reuses_results(self):
+        first, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, self.RESOURCES)
+        second, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, [])
+        self.assertEqual(second, first)
+
+    def test_changed_exact_mapping_recomputes_one_resource(self):
+        self.run_mapping(self.mapper())
+        mapper = self.mapper()
+        mapper.exact_mappings['azurerm_key_vault'] = 'compute/'
+        results, computed = self.run_mapping(mapper)
+        self.assertEqual(computed, ['azurerm_key_vault'])
+        self.assertEqual(results[1]['icon_path'], 'compute/10021-icon-service-Virtual-Machine.svg')
+
+    def test_new_icon_recomputes_fuzzy_results(self):
+        self.run_mapping(self.mapper())
+        (self.icons_path / 'general').mkdir()
+        (self.icons_path / 'general' / '10001-icon-service-Unknown-Thing.svg').write_text('<svg/>')
+        results, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, ['azurerm_unknown_thing'])
+        self.assertEqual(results[2]['method'], 'fuzzy_search')
+
+    def test_changed_matching_code_drops_cache(self):
+        aa = import_changes_module('aa')
+        self.run_mapping(self.mapper())
+        with mock.patch.object(aa, 'FUZZY_TEXT_WEIGHT', 0.31):
+            _, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, self.RESOURCES)
+
+        original = aa.quick_ratio_bounds
+
+        def quick_ratio_bounds(queries, documents, batch_size=64):
+            return original(queries, documents, batch_size)
+
+        self.run_mapping(self.mapper())
+        with mock.patch.object(aa, 'quick_ratio_bounds', quick_ratio_bounds):
+            _, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, self.RESOURCES)
+
+    def test_changed_called_name_drops_cache(self):
+        aa = import_changes_module('aa')
+
+        # Ten sam bajtkod i qualname - różni się tylko wywoływana metoda (co_names)
+        def ratio(self, str1, str2):
+            return SequenceMatcher(None, str1, str2).ratio()
+
+        def quick_ratio(self, str1, str2):
+            return SequenceMatcher(None, str1, str2).quick_ratio()
+
+        for function in (ratio, quick_ratio):
+            function.__qualname__ = 'AzureIconMapper.calculate_similarity'
+        with mock.patch.object(aa.AzureIconMapper, 'calculate_similarity', ratio):
+            self.run_mapping(self.mapper())
+        with mock.patch.object(aa.AzureIconMapper, 'calculate_similarity', quick_ratio):
+            _, computed = self.run_mapping(self.mapper())
+        self.assertEqual(computed, self.RESOURCES)
+
+
+class IconSpriteTests(SimpleTestCase):
+    """Arkusze SVG per kategoria z manifestem resource_type -> arkusz#symbol"""
+
+    GRADIENT_ICON = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="18" height="18"><title>icon</title>'
+        '<defs><style>.cls-1{fill:url(#g)}</style>'
+        '<linearGradient id="g"><stop offset="0" stop-color="#0078d4"/></linearGradient></defs>'
+        '<path id="unused" class="cls-1" data-name="Path" d="M0 0h18v18H0z"/></svg>'
+    )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        icons_dir = self.root / 'icons'
+        (icons_dir / 'networking').mkdir(parents=True)
+        (icons_dir / 'networking' / '10061-icon-service-Virtual-Networks.svg').write_text(self.GRADIENT_ICON)
+        (icons_dir / 'networking' / '10062-icon-service-Load-Balancers.svg').write_text(self.GRADIENT_ICON)
+        (self.root / 'Nav.json').write_text(json.dumps({'categories': {'Networking': {'services': [
+            {'name': 'Virtual Network', 'resource_type': 'azurerm_virtual_network',
+             'icon': {'path': 'networking/10061-icon-service-Virtual-Networks.svg'}},
+            {'name': 'Load Balancer', 'resource_type': 'azurerm_lb',
+             'icon': {'path': 'networking/10062-icon-service-Load-Balancers.svg'}},
+            {'name': 'No icon', 'resource_type': 'azurerm_other'},
+        ]}}}))
+        (self.root / 'azyre.csv').write_text(
+            'service_category,service_name,resource_type\n'
+            'Networking,Virtual Network,azurerm_subnet\n'
+        )
+        self.settings_override = override_settings(
+            ICON_NAV_PATH=self.root / 'Nav.json', ICON_CSV_PATH=self.root / 'azyre.csv',
+            ICON_DIR=icons_dir, ICON_SPRITES_DIR=self.root / 'sprites'
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        patcher = mock.patch('builder.icon_sprites._bundle', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sheet_shares_defs_and_scopes_ids(self):
+        sheet = SpriteSheet()
+        self.assertEqual(sheet.add_icon('vnet', self.GRADIENT_ICON.encode()), 'vnet')
+        self.assertEqual(sheet.add_icon('vnet', self.GRADIENT_ICON.encode()), 'vnet-2')
+        body = sheet.to_bytes().decode()
+        self.assertEqual(len(sheet.defs), 1)
+        self.assertIn('url(#d0)', body)
+        self.assertIn('.vnet-cls-1', body)
+        self.assertIn('.vnet-2-cls-1', body)
+        self.assertNotIn('<title>', body)
+        self.assertNotIn('data-name', body)
+        self.assertNotIn('unused', body)
+        self.assertIn('viewBox="0 0 18 18"', body)
+
+    def test_bundle_manifest(self):
+        bundle = build_sprite_bundle(self.root / 'Nav.json', self.root / 'icons', self.root / 'azyre.csv')
+        [name] = bundle.sheets
+        self.assertRegex(name, r'^networking\.[0-9a-f]{12}\.svg$')
+        self.assertEqual(bundle.manifest['sheets'], {'Networking': name})
+        self.assertEqual(bundle.manifest['icons'], {
+            'azurerm_lb': f'{name}#i10062-load-balancers',
+            'azurerm_subnet': f'{name}#i10061-virtual-networks',
+            'azurerm_virtual_network': f'{name}#i10061-virtual-networks',
+        })
+
+    def test_manifest_and_sprite_views(self):
+        response = self.client.get('/api/icons/manifest/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        manifest = json.loads(response.content)
+        [name] = manifest['sheets'].values()
+        self.assertTrue((self.root / 'sprites' / name).exists())
+        self.assertEqual(self.client.get('/api/icons/manifest/', headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        response = self.client.get(f'/api/icons/sprites/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get('/api/icons/sprites/missing.svg').status_code, 404)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('build_icon_sprites', stdout=out)
+        self.assertIn('Wrote 1 sheets', out.getvalue())
+        self.assertTrue((self.root / 'sprites' / 'manifest.json').exists())
+        self.assertTrue((self.root / 'sprites' / 'icon_manifest_mapper.json').exists())
+
+
+class NgramSimilarityTests(SimpleTestCase):
+    """TF-IDF n-gramów i ograniczenia górne przycinają przegląd ikon bez zmiany wyniku"""
+
+    NAMES = [
+        'virtual networks', 'load balancers', 'virtual machine', 'key vaults', 'storage accounts',
+        'app services', 'function apps', 'sql database', 'cosmos db', 'event hubs', 'service bus',
+        'network security groups', 'public ip addresses', 'kubernetes services', 'container registries',
+    ]
+    RESOURCES = [
+        'azurerm_virtual_network_peering', 'azurerm_lb_rule', 'azurerm_linux_function_app',
+        'azurerm_eventhub_consumer_group', 'azurerm_kubernetes_cluster', 'azurerm_container_registry',
+        'azurerm_network_security_rule', 'azurerm_mssql_database', 'azurerm_nothing_alike',
+    ]
+
+    def setUp(self):
+        self.aa = import_changes_module('aa')
+
+    def test_scores(self):
+        scores = self.aa.NgramSimilarity(self.NAMES).scores(['key vault', 'virtual network'])
+        self.assertEqual(scores.shape, (2, len(self.NAMES)))
+        self.assertEqual(scores.argmax(axis=1).tolist(), [3, 0])
+
+    def test_bounds(self):
+        incidence = self.aa.substring_incidence(['vault', 'virtual'], self.NAMES)
+        self.assertEqual([self.NAMES[i] for i in incidence[1].nonzero()[0]], ['virtual networks', 'virtual machine'])
+        self.assertEqual(incidence[0].sum(), 1)
+        bounds = self.aa.quick_ratio_bounds(['key vault'], self.NAMES)
+        for document, bound in zip(self.NAMES, bounds[0]):
+            self.assertGreaterEqual(bound + 1e-9, SequenceMatcher(None, 'key vault', document).ratio())
+
+    def test_pruned_search_matches_full_scan(self):
+        mapper = self.aa.AzureIconMapper()
+        mapper.icons_cache = [
+            self.aa.IconFile(f'{index}.svg', f'/icons/general/{index}.svg', f'general/{index}.svg', 'general', name,
+                             name.split())
+            for index, name in enumerate(self.NAMES)
+        ]
+        full = [mapper.find_icon_by_fuzzy_search(name) for name in self.RESOURCES]
+        mapper.prepare_fuzzy_plans(self.RESOURCES)
+        self.assertEqual(set(mapper.fuzzy_plans), set(self.RESOURCES))
+        self.assertEqual([mapper.find_icon_by_fuzzy_search(name) for name in self.RESOURCES], full)
+
+
+class IconLookupTests(SimpleTestCase):
+    """Pojedyncze wyszukiwania przez indeks tokenów dają ten sam wynik co pełny przegląd"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        icons_path = Path(directory.name) / 'icons'
+        (icons_path / 'general').mkdir(parents=True)
+        for index, name in enumerate(NgramSimilarityTests.NAMES):
+            (icons_path / 'general' / f"{10000 + index}-icon-service-{name.title().replace(' ', '-')}.svg").write_text('<svg/>')
+        self.manifest_path = Path(directory.name) / 'cache' / 'icon_manifest_mapper.json'
+        self.settings_override = override_settings(ICON_DIR=icons_path, ICON_MANIFEST_PATH=self.manifest_path)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        patcher = mock.patch('builder.icon_lookup._mapper', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(icon_lookup._lookup.cache_clear)
+        icon_lookup._lookup.cache_clear()
+
+    def test_index_matches_full_scan(self):
+        mapper = icon_lookup.get_icon_mapper()
+        indexed = [mapper.find_icon_by_fuzzy_search(name) for name in NgramSimilarityTests.RESOURCES]
+        mapper.icon_catalog, catalog = None, mapper.icon_catalog
+        self.addCleanup(setattr, mapper, 'icon_catalog', catalog)
+        self.assertEqual([mapper.find_icon_by_fuzzy_search(name) for name in NgramSimilarityTests.RESOURCES], indexed)
+
+    def test_lookup_only_reads_manifest(self):
+        icon_lookup.get_icon_mapper()
+        self.assertFalse(self.manifest_path.exists())
+        self.assertEqual(icon_lookup.write_icon_manifest(), len(NgramSimilarityTests.NAMES))
+        self.assertTrue(self.manifest_path.exists())
+
+    def test_changes_scripts_import_as_package(self):
+        path = list(sys.path)
+        aa = import_changes_module('aa')
+        self.assertEqual(aa.__name__, 'Changes.aa')
+        self.assertIs(aa.IconCatalog, IconCatalog)
+        self.assertEqual(sys.path, path)
+
+    def test_view(self):
+        response = self.client.get('/api/icons/lookup/', {'resource': 'azurerm_key_vault'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['resource'], 'azurerm_key_vault')
+        self.assertEqual(json.loads(response.content)['icon_filename'], '10003-icon-service-Key-Vaults.svg')
+        self.assertEqual(self.client.get('/api/icons/lookup/').status_code, 400)
+
+
+class BenchmarkBaselineTests(SimpleTestCase):
+    """Porównanie wyników z zapisanym baseline i progami regresji"""
+
+    def result(self, name='catalog', ops_per_sec=1000.0, alloc_kib=100.0):
+        return BenchmarkResult(name, ops_per_sec, 0.01, 10, 5, alloc_kib, 0.0)
+
+    def test_compare(self):
+        baseline = {'ops_per_sec': 1000.0, 'alloc_kib': 100.0}
+        self.assertEqual(compare(self.result(ops_per_sec=800.0), baseline, 0.25, 0.25), [])
+        self.assertEqual(compare(self.result(ops_per_sec=700.0), None, 0.25, 0.25), [])
+        [problem] = compare(self.result(ops_per_sec=700.0), baseline, 0.25, 0.25)
+        self.assertIn('30% below baseline', problem)
+        [problem] = compare(self.result(alloc_kib=130.0), baseline, 0.25, 0.25)
+        self.assertIn('KiB allocated per op', problem)
+        # Małe alokacje poniżej progu szumu nie są regresją
+        self.assertEqual(compare(self.result(alloc_kib=10.0), {'alloc_kib': 1.0}, 0.25, 0.25), [])
+
+    def test_save_merges_baseline(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'baseline.json'
+        self.assertEqual(load_baseline(path), {})
+        save_baseline(path, [self.result('a'), self.result('b')])
+        save_baseline(path, [self.result('b', ops_per_sec=5.0)])
+        self.assertEqual(load_baseline(path), {
+            'a': {'ops_per_sec': 1000.0, 'alloc_kib': 100.0}, 'b': {'ops_per_sec': 5.0, 'alloc_kib': 100.0}
+        })
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Liczniki i histogramy per wątek; shardy zakończonych wątków scalane przy odczycie"""
+
+    def test_dead_thread_shards_are_folded(self):
+        registry = MetricsRegistry()
+        threads = [threading.Thread(target=registry.inc, args=('requests', (('view', 'x'),))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        registry.observe('latency', (), 0.2, (0.1, 1.0))
+        registry.observe('latency', (), 5, (0.1, 1.0))
+
+        totals = registry.collect()
+        self.assertEqual(totals[('requests', (('view', 'x'),))], 20)
+        self.assertEqual(totals[('latency', ())], [0, 1, 1, 5.2, 2])
+        self.assertEqual(list(registry._shards), [threading.get_ident()])
+        self.assertEqual(registry.collect(), totals)
+
+    def test_prometheus_format(self):
+        registry = MetricsRegistry()
+        registry.inc('builder_cache_requests_total', (('view', 'a"b'), ('cache', 'snapshot'), ('result', 'hit')))
+        registry.observe('builder_http_response_size_bytes', (('view', 'list'),), 2000, (256, 1024, 4096))
+        text = render_prometheus(registry)
+        self.assertIn('builder_cache_requests_total{view="a\\"b",cache="snapshot",result="hit"} 1\n', text)
+        self.assertIn('builder_http_response_size_bytes_bucket{view="list",le="1024"} 0\n', text)
+        self.assertIn('builder_http_response_size_bytes_bucket{view="list",le="4096"} 1\n', text)
+        self.assertIn('builder_http_response_size_bytes_count{view="list"} 1\n', text)
+
+    def test_server_timing_and_endpoint(self):
+        response = self.client.get('/api/resources/')
+        self.assertRegex(response['Server-Timing'], r'view;dur=[0-9.]+, total;dur=[0-9.]+$')
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('builder_http_request_duration_seconds_count{view="get_resources",method="GET",status="200"}',
+                      response.content.decode())
+
+
+class ProfilingTests(TestCase):
+    """cProfile dla ?profile=1 od staff, ring plików pstats i widoki listy"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.settings_override = override_settings(PROFILING_DIR=self.directory, PROFILING_MAX_FILES=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+
+    def test_only_staff_requests_are_profiled(self):
+        response = self.client.get('/api/resources/', {'profile': '1'})
+        self.assertNotIn('X-Profile', response)
+        self.client.force_login(self.staff)
+        self.assertNotIn('X-Profile', self.client.get('/api/resources/'))
+        response = self.client.get('/api/resources/', {'profile': '1'})
+        self.assertRegex(response['X-Profile'], r'^\d+-get_resources-\d+-[0-9a-f]+\.pstats$')
+        self.assertTrue((self.directory / response['X-Profile']).is_file())
+
+    def test_ring_keeps_newest_files(self):
+        self.client.force_login(self.staff)
+        names = [self.client.get('/api/resources/', {'profile': '1'})['X-Profile'] for _ in range(3)]
+        self.assertEqual([profile.name for profile in ProfileStore(self.directory).list()], names[1:])
+
+    def test_profile_views(self):
+        self.assertEqual(self.client.get('/profiles/').status_code, 302)
+        self.client.force_login(self.staff)
+        name = self.client.get('/api/resources/', {'profile': '1'})['X-Profile']
+
+        listing = json.loads(self.client.get('/profiles/', {'format': 'json'}).content)
+        self.assertEqual(listing['count'], 1)
+        self.assertEqual(listing['profiles'][0]['view'], 'get_resources')
+        self.assertEqual(self.client.get('/profiles/').status_code, 200)
+
+        response = self.client.get(f'/profiles/{name}')
+        self.assertIn('function calls', response.content.decode())
+        response = self.client.get(f'/profiles/{name}', {'download': '1'})
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(self.client.get('/profiles/..%2Fsettings.py').status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='builder.tests')
+class AsyncViewsTests(TestCase):
+    """Widoki ASGI zwracają to samo co synchroniczne"""
+
+    async def test_same_responses(self):
+        sync_client = self.client_class()
+        for url, headers in (
+                ('/api/resources/', {}),
+                ('/api/resources/?format=flat', {'Accept-Encoding': 'gzip'}),
+                ('/api/resources/?format=flat&limit=3&fields=name', {}),
+                ('/api/resources/categories/', {}),
+                ('/api/resources/search/?q=virtual+network', {}),
+                ('/api/templates/', {})):
+            response = await AsyncClient().get(url, headers=headers)
+            with override_settings(ROOT_URLCONF='terraform_builder.urls'):
+                expected = await sync_to_async(sync_client.get)(url, headers=headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertEqual(response.get('ETag'), expected.get('ETag'), url)
+
+        response = await AsyncClient().get('/api/resources/categories/nope/')
+        self.assertEqual(response.status_code, 404)
+
+
+class DesignTests(TestCase):
+    """Projekty zapisywane jako operacje, wersje i kompaktowanie"""
+
+    def post(self, url, payload, client=None):
+        return (client or self.client).post(url, payload, content_type='application/json')
+
+    def test_operations_and_load(self):
+        design = create_design('demo', [{'type': 'azurerm_key_vault', 'id': 1}])
+        version = append_operations(design.pk, [
+            {'op': 'add', 'resource': {'type': 'azurerm_storage_account', 'id': 2.5, 'x': 1, 'y': 2}},
+            {'op': 'move', 'id': 1, 'x': 10, 'y': 20},
+            {'op': 'remove', 'id': 'missing'},
+        ])
+        self.assertEqual(version, 3)
+        loaded, resources = load_design(design.pk)
+        self.assertEqual(loaded.version, 3)
+        self.assertEqual(resources, [
+            {'type': 'azurerm_key_vault', 'id': 1, 'x': 10, 'y': 20},
+            {'type': 'azurerm_storage_account', 'id': 2.5, 'x': 1, 'y': 2},
+        ])
+
+        append_operations(design.pk, [{'op': 'clear'}])
+        self.assertEqual(load_design(design.pk)[1], [])
+
+    def test_version_conflict(self):
+        design = create_design()
+        append_operations(design.pk, [{'op': 'clear'}], base_version=0)
+        with self.assertRaises(VersionConflict) as caught:
+            append_operations(design.pk, [{'op': 'clear'}], base_version=0)
+        self.assertEqual(caught.exception.current_version, 1)
+
+    @override_settings(DESIGN_COMPACT_THRESHOLD=3)
+    def test_compaction(self):
+        design = create_design()
+        for index in range(4):
+            append_operations(design.pk, [{'op': 'add', 'resource': {'type': 'azurerm_key_vault', 'id': index}}])
+        loaded, resources = load_design(design.pk)
+        self.assertEqual(loaded.snapshot_version, 3)
+        self.assertEqual(DesignOperation.objects.filter(design_id=design.pk).count(), 1)
+        self.assertEqual([resource['id'] for resource in resources], [0, 1, 2, 3])
+
+        compact_design(design.pk)
+        self.assertFalse(DesignOperation.objects.filter(design_id=design.pk).exists())
+        self.assertEqual(load_design(design.pk)[1], resources)
+
+    def test_views(self):
+        created = self.post('/api/designs/', {'name': 'demo', 'resources': [{'type': 'azurerm_key_vault', 'id': 1}]})
+        self.assertEqual(created.status_code, 201)
+        pk = created.json()['id']
+
+        response = self.post(f'/api/designs/{pk}/operations/', {
+            'base_version': 0, 'operations': [{'op': 'move', 'id': 1, 'x': 5, 'y': 6}]
+        })
+        self.assertEqual(response.json(), {'version': 1})
+        conflict = self.post(f'/api/designs/{pk}/operations/', {'base_version': 0, 'operations': [{'op': 'clear'}]})
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict.json()['version'], 1)
+
+        design = self.client.get(f'/api/designs/{pk}/').json()
+        self.assertEqual(design['resources'], [{'type': 'azurerm_key_vault', 'id': 1, 'x': 5, 'y': 6}])
+
+        bad = self.post(f'/api/designs/{pk}/operations/', {'operations': [{'op': 'add', 'resource': {'type': 'x; rm'}}]})
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(self.post('/api/designs/', {'resources': [{'type': 'azurerm_a', 'display': 1}]}).status_code, 400)
+
+    def test_other_sessions_cannot_see_design(self):
+        pk = self.post('/api/designs/', {'resources': []}).json()['id']
+        other = self.client_class()
+        self.assertEqual(other.get(f'/api/designs/{pk}/').status_code, 404)
+        self.assertEqual(self.post(f'/api/designs/{pk}/operations/', {'operations': [{'op': 'clear'}]}, other).status_code, 404)
+
+    def test_resource_ids_required_and_unique(self):
+        for resources, message in (
+                ([{'type': 'azurerm_key_vault'}], 'resource #0 needs an id'),
+                ([{'type': 'azurerm_key_vault', 'id': ''}], 'resource #0 needs an id'),
+                ([{'type': 'azurerm_key_vault', 'id': 1}, {'type': 'azurerm_key_vault', 'id': 1}],
+                 'resource #1: duplicate id 1')):
+            with self.assertRaisesMessage(InvalidDesign, message):
+                create_design('demo', resources)
+        self.assertEqual(self.post('/api/designs/', {'resources': [{'type': 'azurerm_key_vault'}]}).status_code, 400)
+        pk = self.post('/api/designs/', {'resources': []}).json()['id']
+        response = self.post(f'/api/designs/{pk}/operations/', {'operations': [
+            {'op': 'add', 'resource': {'type': 'azurerm_key_vault', 'id': ''}}
+        ]})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DESIGN_MAX_RESOURCES=2)
+    def test_operations_cannot_grow_design_past_limit(self):
+        design = create_design('demo', [{'type': 'azurerm_key_vault', 'id': 1}])
+        add = [{'op': 'add', 'resource': {'type': 'azurerm_key_vault', 'id': index}} for index in (2, 3)]
+        with self.assertRaisesMessage(InvalidDesign, 'at most 2 resources per design'):
+            append_operations(design.pk, add)
+        self.assertEqual(load_design(design.pk)[0].version, 0)
+        # Podmiana istniejącego id i remove + add mieszczą się w limicie
+        self.assertEqual(append_operations(design.pk, add[:1] + add[:1]), 2)
+        self.assertEqual(append_operations(design.pk, [{'op': 'remove', 'id': 1}] + add[1:]), 4)
+        self.assertEqual([resource['id'] for resource in load_design(design.pk)[1]], [2, 3])
+
+    @override_settings(DESIGN_MAX_PER_SESSION=2, DESIGN_MAX_RESOURCES=1)
+    def test_limits(self):
+        too_big = [{'type': 'azurerm_key_vault', 'id': 1}, {'type': 'azurerm_key_vault', 'id': 2}]
+        self.assertEqual(self.post('/api/designs/', {'resources': too_big}).status_code, 400)
+        self.assertEqual(self.post('/api/designs/', {}).status_code, 201)
+        self.assertEqual(self.post('/api/designs/', {}).status_code, 201)
+        self.assertEqual(self.post('/api/designs/', {}).status_code, 429)
+
+    def test_csrf_enforced(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        self.assertEqual(self.post('/api/designs/', {}, client).status_code, 403)
+
+
+class DependencyGraphTests(SimpleTestCase):
+    """Wnioskowanie referencji, kolejność topologiczna i cykle"""
+
+    SCHEMAS = {
+        'azurerm_virtual_network': {'attributes': {'name': {'type': 'string', 'required': True}}},
+        'azurerm_subnet': {'attributes': {
+            'name': {'type': 'string', 'required': True},
+            'resource_group_name': {'type': 'string', 'required': True},
+            'virtual_network_name': {'type': 'string', 'required': True},
+        }},
+        'azurerm_network_interface': {'attributes': {
+            'subnet_id': {'type': 'string', 'required': True},
+            'network_security_group_id': {'type': 'string', 'required': False},
+        }},
+        'azurerm_mssql_server': {'attributes': {}},
+        'azurerm_mssql_database': {'attributes': {'server_id': {'type': 'string', 'required': True}}},
+        'azurerm_linux_virtual_machine': {'attributes': {
+            'network_interface_ids': {'type': 'list(string)', 'required': True},
+        }},
+    }
+
+    def index(self):
+        return ReferenceIndex.from_schemas(self.SCHEMAS.items(), self.SCHEMAS)
+
+    def test_infer_references(self):
+        index = self.index()
+        self.assertEqual(index.references('azurerm_subnet'), (
+            Reference('virtual_network_name', 'azurerm_virtual_network', 'name', False),
+        ))
+        # Prefiks typu źródłowego: mssql_database.server_id -> azurerm_mssql_server
+        self.assertEqual(index.references('azurerm_mssql_database')[0].target_type, 'azurerm_mssql_server')
+        vm = index.references('azurerm_linux_virtual_machine')[0]
+        self.assertEqual(vm.expression('nic'), '[azurerm_network_interface.nic.id]')
+        # Opcjonalne atrybuty i nieznane typy pomijane
+        self.assertEqual(len(index.references('azurerm_network_interface')), 1)
+        self.assertEqual(infer_references('azurerm_subnet', self.SCHEMAS['azurerm_subnet'], set()), ())
+
+    def test_topological_order_keeps_groups(self):
+        graph = DependencyGraph(4)
+        graph.add_edge(0, 3)
+        self.assertEqual(graph.topological_order(['a', 'b', 'a', 'c']), [1, 2, 3, 0])
+        self.assertEqual(DependencyGraph(3).topological_order(['a', 'b', 'a']), [0, 2, 1])
+
+    def test_cycle(self):
+        graph = DependencyGraph(4)
+        graph.add_edge(1, 2)
+        graph.add_edge(2, 1)
+        graph.add_edge(3, 1)
+        with self.assertRaises(DependencyCycle) as caught:
+            graph.topological_order()
+        self.assertEqual(caught.exception.order, [0])
+        self.assertEqual(sorted(caught.exception.cycle[:-1]), [1, 2])
+        self.assertEqual(caught.exception.cycle[0], caught.exception.cycle[-1])
+
+    def test_bindings_prefer_closest_earlier_target(self):
+        resources = [
+            {'type': 'azurerm_virtual_network'},
+            {'type': 'azurerm_subnet'},
+            {'type': 'azurerm_virtual_network'},
+            {'type': 'azurerm_subnet'},
+            {'type': 'azurerm_subnet', 'attributes': {'virtual_network_name': 'explicit'}},
+        ]
+        _, bindings = build_design_graph(resources, self.index())
+        self.assertEqual([target for _, target in bindings[1]], [0])
+        self.assertEqual([target for _, target in bindings[3]], [2])
+        self.assertEqual(bindings[4], [])
+
+    def test_generate_emits_dependencies_first(self):
+        generator = TerraformGenerator(references=self.index())
+        code = generator.generate([
+            {'type': 'azurerm_network_interface', 'label': 'nic', 'category': 'compute'},
+            {'type': 'azurerm_subnet', 'label': 'internal', 'category': 'networking'},
+            {'type': 'azurerm_virtual_network', 'label': 'main', 'category': 'networking'},
+        ])
+        self.assertLess(code.index('"azurerm_virtual_network" "main"'), code.index('"azurerm_subnet" "internal"'))
+        self.assertLess(code.index('"azurerm_subnet" "internal"'), code.index('"azurerm_network_interface" "nic"'))
+        self.assertRegex(code, r'virtual_network_name\s+= azurerm_virtual_network\.main\.name')
+        self.assertRegex(code, r'subnet_id\s+= azurerm_subnet\.internal\.id')
+        self.assertNotIn('Dependency cycle', code)
+
+    def test_generate_reports_cycle(self):
+        references = ReferenceIndex({
+            'azurerm_a': (Reference('b_id', 'azurerm_b', 'id', False),),
+            'azurerm_b': (Reference('a_id', 'azurerm_a', 'id', False),),
+        })
+        code = TerraformGenerator(references=references).generate([
+            {'type': 'azurerm_a', 'label': 'one'}, {'type': 'azurerm_b', 'label': 'two'},
+        ])
+        self.assertIn('# Dependency cycle: azurerm_', code)
+        self.assertIn('resource "azurerm_a" "one"', code)
+        self.assertIn('resource "azurerm_b" "two"', code)
+
+    def test_generate_without_references_keeps_design_order(self):
+        code = TerraformGenerator().generate([
+            {'type': 'azurerm_b', 'label': 'x', 'category': 'storage'},
+            {'type': 'azurerm_a', 'label': 'y', 'category': 'compute'},
+            {'type': 'azurerm_c', 'label': 'z', 'category': 'storage'},
+        ])
+        self.assertLess(code.index('# STORAGE Resources'), code.index('# COMPUTE Resources'))
+        self.assertLess(code.index('"azurerm_c" "z"'), code.index('# COMPUTE Resources'))
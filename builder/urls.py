@@ -1,8 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path('', views.home, name='home'),
-    path('api/resources/', views.get_resources, name='get_resources'),
-    path('api/templates/', views.get_resource_templates, name='templates'),
-]
\ No newline at end of file
+
+def build_urlpatterns(catalog_views):
+    """Trasy aplikacji; catalog_views to views (WSGI) albo async_views (ASGI) - testy sprawdzają oba warianty"""
+    return [
+        path('', views.home, name='home'),
+        path('api/resources/', catalog_views.get_resources, name='get_resources'),
+        path('api/resources/search/', catalog_views.search_resources, name='search_resources'),
+        path('api/resources/categories/', catalog_views.get_resource_categories, name='resource_categories'),
+        path('api/resources/categories/<str:name>/', catalog_views.get_resource_category, name='resource_category'),
+        path('api/templates/', catalog_views.get_resource_templates, name='templates'),
+        path('api/terraform/generate/', views.generate_terraform, name='generate_terraform'),
+        path('api/terraform/batch/', views.generate_terraform_batch, name='generate_terraform_batch'),
+        path('api/designs/', views.create_design_view, name='create_design'),
+        path('api/designs/<int:pk>/', views.get_design, name='design'),
+        path('api/designs/<int:pk>/operations/', views.append_design_operations, name='design_operations'),
+        path('api/icons/manifest/', views.get_icon_manifest, name='icon_manifest'),
+        path('profiles/', views.list_profiles, name='profiles'),
+        path('profiles/<str:name>', views.get_profile, name='profile_detail'),
+        path('api/metrics', views.get_metrics, name='metrics'),
+        path('api/icons/lookup/', views.get_icon_lookup, name='icon_lookup'),
+        path('api/icons/sprites/<str:name>', views.get_icon_sprite, name='icon_sprite'),
+    ]
+
+
+# Pod ASGI widoki katalogu, wyszukiwania i szablonów jako korutyny (BUILDER_ASYNC_VIEWS = True);
+# WSGI zostaje przy synchronicznych
+urlpatterns = build_urlpatterns(async_views if getattr(settings, 'BUILDER_ASYNC_VIEWS', False) else views)
@@ -1,80 +1,347 @@
 from django.shortcuts import render
-from django.http import JsonResponse
-from .static_resources import StaticResourceProvider
+from django.conf import settings
+from django.http import FileResponse, JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+import json
 import time
+from .catalog import get_catalog_snapshot, etag_matches, InvalidCursor
+from .search import get_search_index
+from .terraform_generator import get_terraform_generator, validate_design_resources, InvalidDesign
+from .batch_export import validate_designs, stream_designs_zip
+from .icon_sprites import get_sprite_bundle
+from .icon_lookup import lookup_icon
+from .metrics import PROMETHEUS_TYPE, phase, record_cache, registry, render_prometheus
+from .profiling import get_profile_store, profile_summary, profiling_settings
+from .designs import (
+    VersionConflict, append_operations, can_access_design, create_design, load_design, max_designs_per_session,
+    remember_design, session_design_ids, validate_operations
+)
+from .models import Design
+
+# Gotowe szablony infrastruktury - wspólne dla widoków sync i async
+RESOURCE_TEMPLATES = [
+    {
+        'name': 'web_app_basic',
+        'display': 'Web App + Database',
+        'description': 'Simple web application with PostgreSQL database',
+        'icon': '🌐',
+        'resources': [
+            'azurerm_resource_group',
+            'azurerm_service_plan',
+            'azurerm_linux_web_app',
+            'azurerm_postgresql_server',
+            'azurerm_postgresql_database'
+        ]
+    },
+    {
+        'name': 'vm_with_network',
+        'display': 'Virtual Machine Setup',
+        'description': 'Windows VM with complete networking setup',
+        'icon': '🖥️',
+        'resources': [
+            'azurerm_resource_group',
+            'azurerm_virtual_network',
+            'azurerm_subnet',
+            'azurerm_network_security_group',
+            'azurerm_public_ip',
+            'azurerm_network_interface',
+            'azurerm_windows_virtual_machine'
+        ]
+    },
+    {
+        'name': 'secure_storage',
+        'display': 'Secure Storage Solution',
+        'description': 'Storage account with backup and security',
+        'icon': '💾',
+        'resources': [
+            'azurerm_resource_group',
+            'azurerm_storage_account',
+            'azurerm_key_vault',
+            'azurerm_recovery_services_vault'
+        ]
+    }
+]
 
 def home(request):
     return render(request, 'index.html')
 
+def _catalog_response(request, entry, cache_control='no-cache'):
+    """Serve pre-encoded catalog entry, 304 when client already has it"""
+    # Wybór gotowego wariantu (JSON/MessagePack x identity/gzip/br) - bez kompresji per request
+    with phase('serialize'):
+        variant = entry.negotiate(
+            request.headers.get('Accept', ''),
+            request.headers.get('Accept-Encoding', '')
+        )
+        not_modified = etag_matches(request.headers.get('If-None-Match', ''), variant.etag)
+        record_cache('etag', not_modified)
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(variant.body, content_type=variant.content_type)
+            if variant.content_encoding != 'identity':
+                response['Content-Encoding'] = variant.content_encoding
+    response['ETag'] = variant.etag
+    response['Vary'] = 'Accept, Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
+
 def get_resources(request):
     """API endpoint zwracający hierarchiczne zasoby Azure"""
     
     # Sprawdź format odpowiedzi
     format_type = request.GET.get('format', 'hierarchical')  # hierarchical lub flat
     
-    if format_type == 'hierarchical':
-        resources = StaticResourceProvider.get_hierarchical_resources()
-        return JsonResponse({
-            'resources': resources,
-            'format': 'hierarchical',
-            'total_categories': len(resources),
-            'source': 'static_hierarchical',
-            'timestamp': time.time()
-        })
-    else:
-        # Flat format for backward compatibility
-        resources = StaticResourceProvider.get_flat_list()
+    # Stronicowanie / projekcja pól tylko dla listy płaskiej
+    if format_type != 'hierarchical' and any(param in request.GET for param in ('limit', 'cursor', 'fields')):
+        return _flat_resources_page(request)
+    
+    # Snapshot jest budowany raz na proces - tu tylko lookup i zapis do socketu
+    return _catalog_response(request, get_catalog_snapshot().get(format_type))
+
+def get_resource_categories(request):
+    """Same nagłówki kategorii z liczbą zasobów - bez zawartości"""
+    return _catalog_response(request, get_catalog_snapshot().entries['categories'])
+
+def get_resource_category(request, name):
+    """Podkategorie jednej kategorii, pobierane przy rozwinięciu w sidebarze"""
+    entry = get_catalog_snapshot().get_category(name)
+    if entry is None:
+        return JsonResponse({'error': f'unknown category: {name}'}, status=404)
+    return _catalog_response(request, entry)
+
+def _flat_resources_page(request, snapshot=None):
+    """Strona listy płaskiej wycięta z kolumnowego widoku snapshotu"""
+    snapshot = snapshot or get_catalog_snapshot()
+    columns = snapshot.flat_columns
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    fields_param = request.GET.get('fields', '')
+    fields = tuple(field for field in fields_param.split(',') if field) if fields_param else columns.fields
+    unknown = [field for field in fields if field not in columns.columns]
+    if unknown:
+        return JsonResponse({'error': f"unknown fields: {', '.join(unknown)}", 'available_fields': columns.fields}, status=400)
+    
+    with phase('serialize'):
+        try:
+            page, next_cursor = columns.page(fields, limit, request.GET.get('cursor') or None)
+        except InvalidCursor:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        
         return JsonResponse({
-            'resources': resources,
-            'total_count': len(resources),
+            'resources': page,
+            'count': len(page),
+            'total_count': len(columns),
+            'fields': fields,
+            'next_cursor': next_cursor,
             'format': 'flat',
             'source': 'static_flat',
-            'timestamp': time.time()
+            'timestamp': snapshot.built_at
         })
 
+def search_resources(request):
+    """Wyszukiwanie pełnotekstowe po wszystkich zasobach, usługach i kategoriach"""
+    return _search_response(request, get_search_index())
+
+def _search_response(request, index):
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind') or None
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    results = index.search(query, limit=limit, kind=kind)
+    with phase('serialize'):
+        return JsonResponse({
+            'query': query,
+            'results': results,
+            'count': len(results)
+        })
+
+def _load_json_body(request):
+    """Parsuj body JSON, None gdy niepoprawne"""
+    try:
+        return json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+@csrf_exempt
+@require_POST
+def generate_terraform(request):
+    """Generuj HCL po stronie serwera ze skompilowanych szablonów per typ zasobu"""
+    payload = _load_json_body(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'invalid JSON body'}, status=400)
+    
+    try:
+        resources = validate_design_resources(payload.get('resources', []))
+    except InvalidDesign as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    code = get_terraform_generator().generate(resources)
+    return JsonResponse({
+        'code': code,
+        'resource_count': len(resources)
+    })
+
+@csrf_exempt
+@require_POST
+def generate_terraform_batch(request):
+    """Wiele projektów naraz - zip z main.tf per projekt, strumieniowany w trakcie renderowania"""
+    payload = _load_json_body(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'invalid JSON body'}, status=400)
+    
+    max_designs = getattr(settings, 'TERRAFORM_BATCH_MAX_DESIGNS', 1000)
+    designs = payload.get('designs')
+    if isinstance(designs, list) and len(designs) > max_designs:
+        return JsonResponse({'error': f'at most {max_designs} designs per batch'}, status=400)
+    
+    try:
+        designs = validate_designs(designs)
+    except InvalidDesign as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    response = StreamingHttpResponse(
+        stream_designs_zip(get_terraform_generator(), designs),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = 'attachment; filename="terraform-designs.zip"'
+    return response
+
+@require_POST
+def create_design_view(request):
+    """Nowy projekt z początkową listą zasobów; dalsze edycje przez /operations/ z tej samej sesji"""
+    payload = _load_json_body(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'invalid JSON body'}, status=400)
+    
+    limit = max_designs_per_session()
+    if len(session_design_ids(request.session)) >= limit and not request.user.is_staff:
+        return JsonResponse({'error': f'at most {limit} designs per session'}, status=429)
+    
+    try:
+        design = create_design(payload.get('name', ''), payload.get('resources', []))
+    except InvalidDesign as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    remember_design(request.session, design.pk)
+    return JsonResponse({'id': design.pk, 'name': design.name, 'version': design.version}, status=201)
+
+@require_GET
+def get_design(request, pk):
+    """Snapshot + operacje zapisane po nim"""
+    if not can_access_design(request, pk):
+        return JsonResponse({'error': 'design not found'}, status=404)
+    try:
+        design, resources = load_design(pk)
+    except Design.DoesNotExist:
+        return JsonResponse({'error': 'design not found'}, status=404)
+    
+    with phase('serialize'):
+        return JsonResponse({
+            'id': design.pk,
+            'name': design.name,
+            'version': design.version,
+            'resources': resources
+        })
+
+@require_POST
+def append_design_operations(request, pk):
+    """Dopisz edycje (add / move / remove / clear); base_version odrzuca zapis na nieaktualnym stanie (409)"""
+    if not can_access_design(request, pk):
+        return JsonResponse({'error': 'design not found'}, status=404)
+    payload = _load_json_body(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'invalid JSON body'}, status=400)
+    
+    base_version = payload.get('base_version')
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return JsonResponse({'error': 'base_version must be an integer'}, status=400)
+    
+    try:
+        operations = validate_operations(payload.get('operations'))
+        version = append_operations(pk, operations, base_version=base_version)
+    except InvalidDesign as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Design.DoesNotExist:
+        return JsonResponse({'error': 'design not found'}, status=404)
+    except VersionConflict as e:
+        return JsonResponse({'error': str(e), 'version': e.current_version}, status=409)
+    
+    return JsonResponse({'version': version})
+
 def get_resource_templates(request):
     """Zwróć gotowe szablony infrastruktury"""
-    templates = [
-        {
-            'name': 'web_app_basic',
-            'display': 'Web App + Database',
-            'description': 'Simple web application with PostgreSQL database',
-            'icon': '🌐',
-            'resources': [
-                'azurerm_resource_group',
-                'azurerm_service_plan',
-                'azurerm_linux_web_app',
-                'azurerm_postgresql_server',
-                'azurerm_postgresql_database'
-            ]
-        },
-        {
-            'name': 'vm_with_network',
-            'display': 'Virtual Machine Setup',
-            'description': 'Windows VM with complete networking setup',
-            'icon': '🖥️',
-            'resources': [
-                'azurerm_resource_group',
-                'azurerm_virtual_network',
-                'azurerm_subnet',
-                'azurerm_network_security_group',
-                'azurerm_public_ip',
-                'azurerm_network_interface',
-                'azurerm_windows_virtual_machine'
-            ]
-        },
-        {
-            'name': 'secure_storage',
-            'display': 'Secure Storage Solution',
-            'description': 'Storage account with backup and security',
-            'icon': '💾',
-            'resources': [
-                'azurerm_resource_group',
-                'azurerm_storage_account',
-                'azurerm_key_vault',
-                'azurerm_recovery_services_vault'
-            ]
-        }
-    ]
-    
-    return JsonResponse({'templates': templates})
\ No newline at end of file
+    return JsonResponse({'templates': RESOURCE_TEMPLATES})
+
+def get_icon_manifest(request):
+    """resource_type -> arkusz#symbol; arkusze mają hash w nazwie, manifest rewalidowany ETagiem"""
+    return _catalog_response(request, get_sprite_bundle().manifest_entry)
+
+def get_icon_sprite(request, name):
+    """Arkusz SVG - treść niezmienna dla danej nazwy, cache bez końca"""
+    entry = get_sprite_bundle().sheet_entry(name)
+    if entry is None:
+        return JsonResponse({'error': f'unknown sprite sheet: {name}'}, status=404)
+    return _catalog_response(request, entry, cache_control='public, max-age=31536000, immutable')
+
+def get_icon_lookup(request):
+    """Ikona dla typu zasobu Terraform: ?resource=azurerm_key_vault"""
+    resource = request.GET.get('resource', '').strip()
+    if not resource:
+        return JsonResponse({'error': 'resource parameter is required'}, status=400)
+    return JsonResponse({'resource': resource, **lookup_icon(resource)})
+
+def get_metrics(request):
+    """Metryki tego workera w formacie tekstowym Prometheusa"""
+    response = HttpResponse(render_prometheus(registry), content_type=PROMETHEUS_TYPE)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@staff_member_required
+def list_profiles(request):
+    """Zapisane profile requestów - filtr po widoku, sortowanie po czasie trwania"""
+    config = profiling_settings()
+    profiles = [profile.as_dict() for profile in get_profile_store().list()]
+    views = sorted({profile['view'] for profile in profiles})
+    selected_view = request.GET.get('view', '')
+    if selected_view:
+        profiles = [profile for profile in profiles if profile['view'] == selected_view]
+    sort = 'duration' if request.GET.get('sort') == 'duration' else 'recent'
+    key = 'duration_ms' if sort == 'duration' else 'created_at'
+    profiles.sort(key=lambda profile: profile[key], reverse=True)
+    for profile in profiles:
+        profile['recorded'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile['created_at']))
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'profiles': profiles, 'count': len(profiles)})
+    return render(request, 'profiles.html', {
+        'profiles': profiles,
+        'views': views,
+        'selected_view': selected_view,
+        'sort': sort,
+        'sample_rate': config['sample_rate'],
+        'max_files': config['max_files'],
+    })
+
+@staff_member_required
+def get_profile(request, name):
+    """Podsumowanie tekstowe profilu albo plik pstats (?download=1)"""
+    path = get_profile_store().path(name)
+    if path is None:
+        return JsonResponse({'error': f'unknown profile: {name}'}, status=404)
+    if request.GET.get('download'):
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name,
+                            content_type='application/octet-stream')
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        sort = 'cumulative'
+    return HttpResponse(profile_summary(path, sort=sort), content_type='text/plain; charset=utf-8')